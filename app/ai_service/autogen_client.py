@@ -0,0 +1,141 @@
+import time
+import uuid
+from typing import Any, Dict, List, Tuple
+import autogen
+from openai.types.chat import ChatCompletion, ChatCompletionMessage
+from openai.types.chat.chat_completion import Choice
+from openai.types.completion_usage import CompletionUsage
+from ai_service.llm_client import gemini_client
+from app_logger.metrics import metrics
+from app_logger.tracing import tracer
+
+agent_turn_seconds = metrics.histogram("lawgpt_agent_turn_seconds", "Time an autogen agent spent generating one reply by agent and outcome (cache hits included)")
+
+# Autogen request parameters with a Gemini generation config equivalent
+GENERATION_PARAMS = {
+    "temperature": "temperature",
+    "top_p": "top_p",
+    "top_k": "top_k",
+    "max_tokens": "max_output_tokens",
+    "stop": "stop_sequences",
+    "seed": "seed",
+}
+
+
+def _text(content: Any) -> str:
+    """Text of an OpenAI-style message content (a string or a list of parts)"""
+    if isinstance(content, list):
+        return "\n".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content or ""
+
+
+def to_gemini_request(params: Dict[str, Any]) -> Tuple[List[Dict], Dict]:
+    """
+    Convert autogen's OpenAI-style create() parameters into Gemini contents and config.
+
+    System messages become the system instruction, assistant turns the model
+    role, and a pydantic response_format the response schema.
+    """
+    system, contents = [], []
+    for message in params.get("messages", []):
+        text = _text(message.get("content"))
+        if message.get("role") == "system":
+            system.append(text)
+            continue
+        role = "model" if message.get("role") == "assistant" else "user"
+        contents.append({"role": role, "parts": [{"text": text}]})
+    if not contents:
+        contents.append({"role": "user", "parts": [{"text": ""}]})
+
+    config = {gemini: params[name] for name, gemini in GENERATION_PARAMS.items() if params.get(name) is not None}
+    if system:
+        config["system_instruction"] = "\n\n".join(system)
+    if params.get("response_format") is not None:
+        config["response_mime_type"] = "application/json"
+        config["response_schema"] = params["response_format"]
+    return contents, config
+
+
+class SharedGeminiModelClient:
+    """
+    Autogen model client that sends agent turns through the shared gemini_client.
+
+    Without it every OpenAIWrapper config builds its own google-genai client
+    and connection per call. Registered on the wrappers in paralegals/tax.py
+    (config entries carry model_client_cls="SharedGeminiModelClient"), so
+    agent turns share the connection pool, concurrency slots, hedging,
+    retries and circuit breaker with the tools and pipeline stages.
+    """
+
+    RESPONSE_USAGE_KEYS = ["prompt_tokens", "completion_tokens", "total_tokens", "cost", "model"]
+
+    def __init__(self, config: Dict[str, Any], **kwargs: Any):
+        self.model = config.get("model")
+
+    def create(self, params: Dict[str, Any]) -> ChatCompletion:
+        # Autogen runs this in an executor thread; the call itself runs on the serving event loop
+        model = params.get("model") or self.model
+        contents, config = to_gemini_request(params)
+        response = gemini_client.generate_from_thread(contents, model=model, config=config)
+        usage = response.usage_metadata
+        prompt_tokens = (usage.prompt_token_count or 0) if usage else 0
+        completion_tokens = (usage.candidates_token_count or 0) if usage else 0
+        return ChatCompletion(
+            id=f"gemini-{uuid.uuid4().hex}",
+            model=model,
+            created=int(time.time()),
+            object="chat.completion",
+            choices=[Choice(
+                index=0,
+                finish_reason="stop",
+                message=ChatCompletionMessage(role="assistant", content=response.text or ""),
+            )],
+            usage=CompletionUsage(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=prompt_tokens + completion_tokens,
+            ),
+        )
+
+    def message_retrieval(self, response: ChatCompletion) -> List[str]:
+        return [choice.message.content for choice in response.choices]
+
+    def cost(self, response: ChatCompletion) -> float:
+        return 0.0
+
+    @staticmethod
+    def get_usage(response: ChatCompletion) -> Dict[str, Any]:
+        return {
+            "prompt_tokens": response.usage.prompt_tokens,
+            "completion_tokens": response.usage.completion_tokens,
+            "total_tokens": response.usage.total_tokens,
+            "cost": 0.0,
+            "model": response.model,
+        }
+
+
+class TimedOpenAIWrapper(autogen.OpenAIWrapper):
+    """OpenAIWrapper that records how long each agent's reply took"""
+
+    def create(self, **config: Any):
+        # Agents pass themselves as `agent`; the wrapper is shared by every agent on a tier
+        agent = getattr(config.get("agent"), "name", None) or "unknown"
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            # Runs in autogen's executor thread; the span's LLM call is submitted back to the loop under it
+            with tracer.span("agent.turn", attributes={"agent": agent}):
+                response = super().create(**config)
+            outcome = "ok"
+            return response
+        finally:
+            agent_turn_seconds.observe(time.perf_counter() - started, agent=agent, outcome=outcome)
+
+
+def shared_llm_client(llm_config: Dict[str, Any]) -> autogen.OpenAIWrapper:
+    """Autogen client for an llm_config whose calls go through the shared gemini_client"""
+    wrapper = TimedOpenAIWrapper(**llm_config)
+    # Each call activates one config_list entry
+    for _ in llm_config["config_list"]:
+        wrapper.register_model_client(model_client_cls=SharedGeminiModelClient)
+    return wrapper
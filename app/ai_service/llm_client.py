@@ -0,0 +1,353 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Set, TypeVar
+import httpx
+from google import genai
+from config import settings
+from app_logger.ai_service_logger import setup_logger
+from app_logger.metrics import metrics
+from app_logger.tracing import Span, tracer
+from ai_service.resilience import (
+    CircuitBreaker,
+    DeadlineExceeded,
+    LatencyTracker,
+    hedged,
+    is_retryable,
+    remaining_budget,
+    retries_total,
+)
+
+logger = setup_logger("llm_client")
+
+T = TypeVar("T")
+
+llm_calls_total = metrics.counter("lawgpt_llm_calls_total", "Gemini calls by operation, model and outcome (ok, error, timeout, circuit_open, cancelled)")
+llm_call_seconds = metrics.histogram("lawgpt_llm_call_seconds", "Gemini call latency per model including hedges and retries")
+llm_attempt_seconds = metrics.histogram("lawgpt_llm_attempt_seconds", "Latency of one HTTP attempt to Gemini per model, excluding time queued for a slot")
+llm_queue_seconds = metrics.histogram("lawgpt_llm_queue_seconds", "Time an LLM attempt waited for one of the LLM_MAX_CONCURRENCY slots")
+llm_in_flight = metrics.gauge("lawgpt_llm_in_flight", "Gemini requests currently in flight on the shared client")
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 65536)
+llm_prompt_tokens = metrics.histogram("lawgpt_llm_prompt_tokens", "Prompt tokens per Gemini call by operation and model", buckets=TOKEN_BUCKETS)
+llm_completion_tokens = metrics.histogram("lawgpt_llm_completion_tokens", "Completion tokens per Gemini call by operation and model", buckets=TOKEN_BUCKETS)
+
+
+class ThreadCalls:
+    """
+    generate_from_thread() calls made on behalf of one async caller.
+
+    Cancelling the caller's task does not stop the executor threads it
+    started (autogen agent turns), nor the calls those threads are blocked
+    on; cancel() does, and fails any further call from those threads.
+    """
+
+    def __init__(self):
+        self.futures: Set[concurrent.futures.Future] = set()
+        self.cancelled = False
+        self._lock = threading.Lock()
+
+    def add(self, future: concurrent.futures.Future) -> None:
+        with self._lock:
+            if self.cancelled:
+                future.cancel()
+            else:
+                self.futures.add(future)
+
+    def discard(self, future: concurrent.futures.Future) -> None:
+        with self._lock:
+            self.futures.discard(future)
+
+    def cancel(self) -> None:
+        with self._lock:
+            self.cancelled = True
+            futures, self.futures = self.futures, set()
+        for future in futures:
+            # Cancels the coroutine on the serving loop too, so its slot and HTTP request are released
+            future.cancel()
+
+
+# Set by thread_call_scope(); executor threads inherit it (see tracing.ContextThreadPoolExecutor)
+thread_calls: ContextVar[Optional[ThreadCalls]] = ContextVar("thread_calls", default=None)
+
+
+@contextmanager
+def thread_call_scope():
+    """Cancel every generate_from_thread() call started inside the block when it exits"""
+    calls = ThreadCalls()
+    token = thread_calls.set(calls)
+    try:
+        yield calls
+    finally:
+        calls.cancel()
+        thread_calls.reset(token)
+
+
+class GeminiClient:
+    """
+    Async wrapper around google-genai shared by every tool, pipeline stage and agent.
+
+    One instance (gemini_client) owns the process's Gemini HTTP connection
+    pool, so connections are kept alive and reused across requests instead of
+    each caller opening its own. At most LLM_MAX_CONCURRENCY attempts are in
+    flight at once; the rest queue for a slot. Every attempt is timed (queue
+    wait, upstream latency) into metrics and the per-model latency trackers.
+
+    Every call is bounded by the request's remaining budget (see
+    resilience.deadline_scope) and LLM_CALL_TIMEOUT_SECONDS, is hedged with a
+    duplicate request once it runs past the observed LLM_HEDGE_QUANTILE
+    latency, retries transient errors with backoff while budget remains, and
+    fails fast while the circuit breaker is open.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, model: str = "gemini-2.0-flash", base_url: Optional[str] = None, max_concurrency: Optional[int] = None):
+        base_url = base_url or settings.GEMINI_BASE_URL
+        self.client = genai.Client(
+            api_key=api_key or settings.GEMENI_API_KEY,
+            http_options={"base_url": base_url} if base_url else None,
+        )
+        self.__pool_connections()
+        self.model = model
+        self.calls = 0
+        self.in_flight = 0
+        self.slots = asyncio.Semaphore(max_concurrency or settings.LLM_MAX_CONCURRENCY)
+        # Event loop the HTTP pool lives on; synchronous callers (autogen) submit their calls to it
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        # Per model, since the cascade tiers have very different latency profiles
+        self.latency: Dict[str, LatencyTracker] = {}
+        self.breaker = CircuitBreaker()
+
+    def __pool_connections(self) -> None:
+        """Size google-genai's async HTTP client: bounded pool, idle connections kept alive"""
+        api_client = getattr(self.client, "_api_client", None)
+        if api_client is None or not hasattr(api_client, "_async_httpx_client"):
+            logger.warning("google-genai internals changed, using its default HTTP connection pool")
+            return
+        api_client._async_httpx_client = type(api_client._async_httpx_client)(
+            limits=httpx.Limits(
+                max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+                keepalive_expiry=settings.LLM_HTTP_KEEPALIVE_SECONDS,
+            ),
+        )
+
+    def attach(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """Bind the client to the serving event loop (the running one by default)"""
+        self.loop = loop or asyncio.get_running_loop()
+
+    def stats(self) -> Dict[str, Any]:
+        """In-flight requests and recent attempt latency per model"""
+        return {
+            "calls": self.calls,
+            "in_flight": self.in_flight,
+            "latency": {
+                model: {
+                    "p50_seconds": tracker.quantile(0.5, 0.0),
+                    "p95_seconds": tracker.quantile(0.95, 0.0),
+                    "samples": len(tracker.samples),
+                }
+                for model, tracker in self.latency.items()
+            },
+        }
+
+    def hedge_delay(self, model: str) -> float:
+        """Seconds to wait for an attempt on `model` before sending a duplicate"""
+        tracker = self.latency.setdefault(model, LatencyTracker())
+        delay = tracker.quantile(settings.LLM_HEDGE_QUANTILE, settings.LLM_HEDGE_INITIAL_DELAY_SECONDS)
+        return max(delay, settings.LLM_HEDGE_MIN_DELAY_SECONDS)
+
+    async def _timed_attempt(self, model: str, attempt: Callable[[], Awaitable[T]]) -> T:
+        queued = time.monotonic()
+        async with self.slots:
+            started = time.monotonic()
+            llm_queue_seconds.observe(started - queued, model=model)
+            self.in_flight += 1
+            llm_in_flight.set(self.in_flight)
+            try:
+                result = await attempt()
+            finally:
+                self.in_flight -= 1
+                llm_in_flight.set(self.in_flight)
+        elapsed = time.monotonic() - started
+        self.latency.setdefault(model, LatencyTracker()).observe(elapsed)
+        llm_attempt_seconds.observe(elapsed, model=model)
+        logger.debug(f"Gemini attempt on {model}: queued {started - queued:.3f}s, took {elapsed:.3f}s")
+        return result
+
+    async def _call(self, operation: str, model: str, attempt: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run one logical Gemini call with the deadline, hedging, retry and breaker policy.
+
+        Raises:
+            DeadlineExceeded: The call did not finish within its budget
+            CircuitOpenError: Gemini is failing and the breaker is open
+        """
+        self.loop = self.loop or asyncio.get_running_loop()
+        deadline = time.monotonic() + remaining_budget(settings.LLM_CALL_TIMEOUT_SECONDS)
+        started = time.monotonic()
+        max_attempts = 2 if settings.LLM_HEDGE_ENABLED else 1
+        retry = 0
+        while True:
+            try:
+                probe = self.breaker.before_call()
+            except Exception:
+                llm_calls_total.inc(operation=operation, model=model, outcome="circuit_open")
+                raise
+            try:
+                result = await asyncio.wait_for(
+                    hedged(lambda: self._timed_attempt(model, attempt), self.hedge_delay(model), max_attempts),
+                    deadline - time.monotonic(),
+                )
+            except asyncio.CancelledError:
+                # The run was cancelled (client gone or superseded): says nothing about Gemini's health
+                self.breaker.abandon(probe)
+                llm_calls_total.inc(operation=operation, model=model, outcome="cancelled")
+                raise
+            except asyncio.TimeoutError as e:
+                self.breaker.record(False, probe)
+                llm_calls_total.inc(operation=operation, model=model, outcome="timeout")
+                raise DeadlineExceeded(f"Gemini {operation} did not finish within {deadline - started:.1f}s") from e
+            except Exception as e:
+                if not is_retryable(e):
+                    # Gemini answered (e.g. a bad request): not a sign of an unhealthy upstream
+                    self.breaker.record(True, probe)
+                    llm_calls_total.inc(operation=operation, model=model, outcome="error")
+                    raise
+                self.breaker.record(False, probe)
+                backoff = min(0.5 * 2 ** retry, 4.0)
+                if retry >= settings.LLM_MAX_RETRIES or time.monotonic() + backoff >= deadline:
+                    llm_calls_total.inc(operation=operation, model=model, outcome="error")
+                    raise
+                logger.warning(f"Gemini {operation} failed ({str(e)[:100]}), retrying in {backoff:.1f}s")
+                retries_total.inc(operation=operation)
+                retry += 1
+                await asyncio.sleep(backoff)
+                continue
+
+            self.breaker.record(True, probe)
+            llm_calls_total.inc(operation=operation, model=model, outcome="ok")
+            llm_call_seconds.observe(time.monotonic() - started, operation=operation, model=model)
+            return result
+
+    def _record_usage(self, operation: str, model: str, usage: Any, span: Span) -> None:
+        """Token counts of one call, from the response's usage_metadata"""
+        if usage is None:
+            return
+        llm_prompt_tokens.observe(usage.prompt_token_count or 0, operation=operation, model=model)
+        llm_completion_tokens.observe(usage.candidates_token_count or 0, operation=operation, model=model)
+        span.set_attribute("llm.prompt_tokens", usage.prompt_token_count or 0)
+        span.set_attribute("llm.completion_tokens", usage.candidates_token_count or 0)
+
+    async def generate(self, contents: Any, model: Optional[str] = None, config: Optional[Dict] = None):
+        """
+        Generate content without blocking the event loop.
+
+        Args:
+            contents: Prompt or list of contents
+            model: Model name (defaults to the client's model)
+            config: google-genai GenerateContentConfig as a dict (response_schema, system_instruction, ...)
+
+        Returns:
+            The google-genai response
+        """
+        self.calls += 1
+        model = model or self.model
+        with tracer.span("llm.generate", kind="client", attributes={"llm.model": model}) as span:
+            response = await self._call("generate", model, lambda: self.client.aio.models.generate_content(
+                model=model,
+                contents=contents,
+                config=config,
+            ))
+            usage = getattr(response, "usage_metadata", None)
+            self._record_usage("generate", model, usage, span)
+        return response
+
+    def generate_from_thread(self, contents: Any, model: Optional[str] = None, config: Optional[Dict] = None):
+        """
+        Blocking generate() for synchronous callers running in worker threads.
+
+        Autogen calls its model clients synchronously from executor threads;
+        this submits the call to the serving event loop so it shares the
+        connection pool, concurrency slots and resilience policy, while only
+        the worker thread waits.
+
+        Raises:
+            RuntimeError: Called on the event loop itself (it would block it), or before attach()
+            concurrent.futures.CancelledError: The enclosing thread_call_scope() has exited
+        """
+        if self.loop is None or self.loop.is_closed():
+            raise RuntimeError("gemini_client is not attached to an event loop")
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            raise RuntimeError("generate_from_thread() would block the event loop, await generate() instead")
+        calls = thread_calls.get()
+        if calls is not None and calls.cancelled:
+            raise concurrent.futures.CancelledError("The caller of this agent turn is gone")
+        future = asyncio.run_coroutine_threadsafe(self.generate(contents, model=model, config=config), self.loop)
+        if calls is None:
+            return future.result()
+        calls.add(future)
+        try:
+            return future.result()
+        finally:
+            calls.discard(future)
+
+    async def stream(self, contents: Any, model: Optional[str] = None, config: Optional[Dict] = None) -> AsyncIterator[str]:
+        """
+        Stream generated text as Gemini produces it.
+
+        Opening the stream (up to the first chunk) is hedged and retried like
+        generate(); after that each chunk must arrive within the remaining budget.
+
+        Yields:
+            Text fragments in generation order
+        """
+        self.calls += 1
+        model = model or self.model
+
+        async def open_stream():
+            chunks = await self.client.aio.models.generate_content_stream(
+                model=model,
+                contents=contents,
+                config=config,
+            )
+            iterator = chunks.__aiter__()
+            try:
+                return iterator, await iterator.__anext__()
+            except StopAsyncIteration:
+                return iterator, None
+
+        # Not the current span: it stays open across yields to the consumer
+        span = tracer.start_span("llm.stream", kind="client", attributes={"llm.model": model})
+        try:
+            iterator, chunk = await self._call("stream", model, open_stream)
+            usage = None
+            while chunk is not None:
+                # Chunks carry running totals; the last one has the call's usage
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                if chunk.text:
+                    yield chunk.text
+                try:
+                    chunk = await asyncio.wait_for(iterator.__anext__(), remaining_budget(settings.LLM_CALL_TIMEOUT_SECONDS))
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError as e:
+                    llm_calls_total.inc(operation="stream", model=model, outcome="timeout")
+                    raise DeadlineExceeded("Gemini stream stalled past the request deadline") from e
+            self._record_usage("stream", model, usage, span)
+        except (asyncio.CancelledError, GeneratorExit):
+            span.status = "cancelled"
+            raise
+        except Exception as e:
+            span.record_exception(e)
+            raise
+        finally:
+            tracer.finish(span)
+
+
+gemini_client = GeminiClient()
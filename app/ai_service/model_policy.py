@@ -0,0 +1,115 @@
+import time
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, TypeVar
+from config import settings
+from app_logger.ai_service_logger import setup_logger
+from app_logger.metrics import metrics
+
+logger = setup_logger("model_policy")
+
+T = TypeVar("T")
+
+cascade_total = metrics.counter("lawgpt_llm_cascade_total", "Cascaded LLM attempts per stage and model by outcome (accepted, escalated, exhausted)")
+stage_seconds = metrics.histogram("lawgpt_llm_stage_seconds", "Latency of one cascaded LLM attempt per stage and model")
+
+
+def parse_stage_tiers(spec: str) -> Dict[str, int]:
+    """Parse "route:0,answer:1" into a stage -> starting tier map"""
+    tiers = {}
+    for item in filter(None, (part.strip() for part in (spec or "").split(","))):
+        stage, _, tier = item.partition(":")
+        tiers[stage.strip()] = int(tier or 0)
+    return tiers
+
+
+class Cascaded(NamedTuple):
+    result: Any
+    model: str
+    attempts: int
+
+
+class ModelPolicy:
+    """
+    Which Gemini model each stage uses, cheapest adequate model first.
+
+    Models are ordered into tiers (LLM_MODEL_TIERS, cheapest first) and each
+    stage starts at its own tier (LLM_STAGE_TIERS): routing, reformulation and
+    summaries on the lite model, answers on flash. cascade() runs a stage on
+    its starting model and re-runs it one tier up when the caller's confidence
+    check rejects the result (schema validation failure, the model reporting
+    the query unsolved), at most LLM_CASCADE_MAX_ESCALATIONS times. Escalation
+    counts and per-tier latency are exported as metrics.
+    """
+
+    def __init__(self, tiers: Optional[List[str]] = None, stage_tiers: Optional[Dict[str, int]] = None, max_escalations: Optional[int] = None):
+        self.tiers = tiers or [model.strip() for model in settings.LLM_MODEL_TIERS.split(",") if model.strip()]
+        self.stage_tiers = stage_tiers if stage_tiers is not None else parse_stage_tiers(settings.LLM_STAGE_TIERS)
+        self.max_escalations = max_escalations if max_escalations is not None else settings.LLM_CASCADE_MAX_ESCALATIONS
+
+    def tier_of(self, stage: str) -> int:
+        return min(self.stage_tiers.get(stage, len(self.tiers) - 1), len(self.tiers) - 1)
+
+    def model(self, stage: str, tier: Optional[int] = None) -> str:
+        """Model for a stage, at its starting tier unless another tier is given"""
+        tier = self.tier_of(stage) if tier is None else tier
+        return self.tiers[max(0, min(tier, len(self.tiers) - 1))]
+
+    def llm_config(self, stage: str, **extra: Any) -> Dict:
+        """
+        Autogen llm_config for a stage.
+
+        The config list starts at the stage's tier and continues with the
+        stronger tiers it may escalate to, which autogen uses as fallbacks when
+        a model errors. Calls go through the shared gemini_client (see
+        ai_service.autogen_client), so build clients with shared_llm_client().
+        """
+        start = self.tier_of(stage)
+        models = self.tiers[start:start + self.max_escalations + 1]
+        return {
+            "config_list": [
+                {"model": model, "model_client_cls": "SharedGeminiModelClient", **extra}
+                for model in models
+            ],
+            # No per-seed disk cache; completions are cached in cache_store (see paralegals/tax.py)
+            "cache_seed": None,
+        }
+
+    async def cascade(
+        self,
+        stage: str,
+        call: Callable[[str], Awaitable[T]],
+        accept: Callable[[T], bool],
+        start_tier: Optional[int] = None,
+    ) -> Cascaded:
+        """
+        Run a stage on its cheapest model and escalate while the result is rejected.
+
+        Args:
+            stage: Stage name (route, reformulate, answer, ...)
+            call: Runs the stage on the given model
+            accept: Confidence check; False escalates to the next tier
+            start_tier: Tier to start at (e.g. one up when retrieval is weak)
+
+        Returns:
+            The last result with the model that produced it and the number of LLM attempts
+        """
+        tier = self.tier_of(stage) if start_tier is None else min(start_tier, len(self.tiers) - 1)
+        last_tier = min(tier + self.max_escalations, len(self.tiers) - 1)
+        attempts = 0
+        while True:
+            model = self.tiers[tier]
+            started = time.monotonic()
+            result = await call(model)
+            attempts += 1
+            stage_seconds.observe(time.monotonic() - started, stage=stage, model=model)
+            if accept(result):
+                cascade_total.inc(stage=stage, model=model, outcome="accepted")
+                return Cascaded(result, model, attempts)
+            if tier >= last_tier:
+                cascade_total.inc(stage=stage, model=model, outcome="exhausted")
+                return Cascaded(result, model, attempts)
+            cascade_total.inc(stage=stage, model=model, outcome="escalated")
+            logger.info(f"Escalating {stage} from {model} to {self.tiers[tier + 1]}")
+            tier += 1
+
+
+model_policy = ModelPolicy()
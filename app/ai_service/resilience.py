@@ -0,0 +1,201 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Deque, Optional, Tuple, TypeVar
+import httpx
+from config import settings
+from app_logger.ai_service_logger import setup_logger
+from app_logger.metrics import metrics
+
+logger = setup_logger("llm_resilience")
+
+T = TypeVar("T")
+
+hedges_total = metrics.counter("lawgpt_llm_hedges_total", "Hedged duplicate LLM requests by which attempt won (primary, hedge)")
+retries_total = metrics.counter("lawgpt_llm_retries_total", "LLM attempts retried after a transient error")
+circuit_state = metrics.gauge("lawgpt_llm_circuit_open", "1 while the LLM circuit breaker is open")
+circuit_rejections_total = metrics.counter("lawgpt_llm_circuit_rejections_total", "LLM calls failed fast by the open circuit breaker")
+
+# Absolute time.monotonic() by which the current request must finish; set per request by the scheduler
+request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+# HTTP status codes worth retrying or hedging (rate limited, overloaded, upstream timeouts)
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class DeadlineExceeded(Exception):
+    """Raised when an LLM call cannot finish within the request's remaining budget"""
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling Gemini while the circuit breaker is open"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Gemini unavailable: circuit open, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+@contextmanager
+def deadline_scope(seconds: float):
+    """Bound every LLM call in the block (and tasks started from it) by `seconds` from now"""
+    deadline = time.monotonic() + seconds
+    outer = request_deadline.get()
+    token = request_deadline.set(min(deadline, outer) if outer is not None else deadline)
+    try:
+        yield
+    finally:
+        request_deadline.reset(token)
+
+
+def remaining_budget(cap: Optional[float] = None) -> float:
+    """
+    Seconds left for one call: the request's remaining budget, capped at `cap`.
+
+    Raises:
+        DeadlineExceeded: The request deadline has already passed
+    """
+    deadline = request_deadline.get()
+    budget = cap if cap is not None else float("inf")
+    if deadline is not None:
+        left = deadline - time.monotonic()
+        if left <= 0:
+            raise DeadlineExceeded("Request deadline exceeded before the LLM call started")
+        budget = min(budget, left)
+    return budget
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Transient failures: throttling, 5xx, timeouts and dropped connections (not bad requests)"""
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError, httpx.TransportError)):
+        return True
+    return getattr(error, "code", None) in RETRYABLE_CODES
+
+
+class LatencyTracker:
+    """Sliding window of recent call latencies, used to pick the hedge delay"""
+
+    def __init__(self, window: int = 200):
+        self.samples: Deque[float] = deque(maxlen=window)
+
+    def observe(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def quantile(self, q: float, default: float) -> float:
+        if len(self.samples) < 20:
+            return default
+        ordered = sorted(self.samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class CircuitBreaker:
+    """
+    Fails LLM calls fast while Gemini is failing.
+
+    The breaker opens when at least `failure_ratio` of the calls in the last
+    `window` seconds failed with a transient error (and there were at least
+    `min_calls` of them). While open every call raises CircuitOpenError at
+    once instead of holding a worker until its timeout. After `cooldown`
+    seconds one probe call is let through (half open); its outcome closes the
+    breaker or opens it again. Outcomes of calls started before the breaker
+    opened are ignored while it is open.
+    """
+
+    def __init__(self, failure_ratio: Optional[float] = None, min_calls: Optional[int] = None, window: Optional[float] = None, cooldown: Optional[float] = None):
+        self.failure_ratio = failure_ratio or settings.LLM_BREAKER_FAILURE_RATIO
+        self.min_calls = min_calls or settings.LLM_BREAKER_MIN_CALLS
+        self.window = window or settings.LLM_BREAKER_WINDOW_SECONDS
+        self.cooldown = cooldown or settings.LLM_BREAKER_COOLDOWN_SECONDS
+        self.outcomes: Deque[Tuple[float, bool]] = deque()
+        self.opened_at: Optional[float] = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def before_call(self) -> bool:
+        """
+        Returns:
+            Whether the call is the half-open probe (pass it back to record/abandon)
+
+        Raises:
+            CircuitOpenError: The breaker is open, or half open with its probe already in flight
+        """
+        state = self.state
+        if state == "closed":
+            return False
+        if state == "half_open" and not self.probing:
+            self.probing = True
+            return True
+        circuit_rejections_total.inc()
+        raise CircuitOpenError(max(self.cooldown - (time.monotonic() - self.opened_at), 0.0))
+
+    def record(self, success: bool, probe: bool = False) -> None:
+        now = time.monotonic()
+        if self.opened_at is not None:
+            if not probe:
+                # A call from before the breaker opened says nothing about the probe
+                return
+            self.probing = False
+            if success:
+                self._close()
+            else:
+                self.opened_at = now
+            return
+
+        self.outcomes.append((now, success))
+        while self.outcomes and self.outcomes[0][0] < now - self.window:
+            self.outcomes.popleft()
+        failures = sum(1 for _, ok in self.outcomes if not ok)
+        if len(self.outcomes) >= self.min_calls and failures / len(self.outcomes) >= self.failure_ratio:
+            logger.error(f"Opening LLM circuit breaker: {failures}/{len(self.outcomes)} calls failed in {self.window:.0f}s")
+            self.opened_at = now
+            circuit_state.set(1)
+
+    def abandon(self, probe: bool = False) -> None:
+        """A call was cancelled before it had an outcome; if it was the probe, the next call probes instead"""
+        if probe:
+            self.probing = False
+
+    def _close(self) -> None:
+        logger.info("Closing LLM circuit breaker: probe call succeeded")
+        self.opened_at = None
+        self.outcomes.clear()
+        circuit_state.set(0)
+
+
+async def hedged(attempt: Callable[[], Awaitable[T]], hedge_delay: float, max_attempts: int = 2) -> T:
+    """
+    Run `attempt`, starting a duplicate if it has not finished after `hedge_delay`.
+
+    The first attempt to succeed wins and the others are cancelled. An attempt
+    that fails does not fail the call while another is still running, and a
+    transient failure starts the next attempt at once instead of after the delay.
+    """
+    primary = asyncio.ensure_future(attempt())
+    pending = {primary}
+    launched = 1
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            can_hedge = launched < max_attempts
+            done, pending = await asyncio.wait(pending, timeout=hedge_delay if can_hedge else None, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if launched > 1:
+                        hedges_total.inc(winner="primary" if task is primary else "hedge")
+                    return task.result()
+                error = task.exception()
+            if can_hedge and (not done or is_retryable(error)):
+                pending.add(asyncio.ensure_future(attempt()))
+                launched += 1
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,162 @@
+import re
+from typing import Optional, Tuple, Type, TypeVar, Union
+from pydantic import BaseModel, ValidationError
+from app_logger.ai_service_logger import setup_logger
+from ai_service.llm_client import gemini_client
+from ai_service.model_policy import model_policy
+
+logger = setup_logger("structured_output")
+
+T = TypeVar("T", bound=BaseModel)
+
+_CODE_FENCE = re.compile(r"```(?:json)?\s*(.*?)\s*```", re.DOTALL)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+
+def _extract_json_object(text: str) -> str:
+    """Take the first JSON object out of surrounding prose or a markdown code fence"""
+    fenced = _CODE_FENCE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    start = text.find("{")
+    if start == -1:
+        return text.strip()
+
+    depth = 0
+    in_string = escaped = False
+    for index in range(start, len(text)):
+        char = text[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:index + 1]
+    # Unbalanced: keep everything, _close_truncated will finish it
+    return text[start:]
+
+
+def _escape_control_characters(text: str) -> str:
+    """Escape raw newlines/tabs that LLMs put inside JSON strings"""
+    out = []
+    in_string = escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            elif char == "\n":
+                char = "\\n"
+            elif char == "\t":
+                char = "\\t"
+            elif char == "\r":
+                continue
+        elif char == '"':
+            in_string = True
+        out.append(char)
+    return "".join(out)
+
+
+def _close_truncated(text: str) -> str:
+    """Close an unterminated string and any unbalanced brackets (truncated output)"""
+    stack = []
+    in_string = escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]" and stack:
+            stack.pop()
+    if in_string:
+        text += '"'
+    return text + "".join(reversed(stack))
+
+
+def repair_json(text: str) -> str:
+    """
+    Best-effort repair of almost-valid JSON produced by an LLM.
+
+    Handles code fences and surrounding prose, raw control characters inside
+    strings, trailing commas, Python literals and truncated output.
+    """
+    text = _extract_json_object(text)
+    text = _escape_control_characters(text)
+    text = _TRAILING_COMMA.sub(r"\1", text)
+    text = re.sub(r"(?<=[:\[,\s])(True|False|None)(?=\s*[,}\]])", lambda m: _PYTHON_LITERALS[m.group(1)], text)
+    return _TRAILING_COMMA.sub(r"\1", _close_truncated(text))
+
+
+def parse_structured(content: Union[str, dict, None], schema: Type[T]) -> Optional[T]:
+    """
+    Validate agent output against a schema, repairing the JSON locally if needed.
+
+    Args:
+        content: Raw agent output (JSON string, dict or prose containing JSON)
+        schema: Pydantic model to validate against
+
+    Returns:
+        The validated model, or None if the output cannot be repaired
+    """
+    if content is None:
+        return None
+    if isinstance(content, dict):
+        try:
+            return schema(**content)
+        except ValidationError:
+            return None
+
+    for candidate in (content, repair_json(content)):
+        try:
+            return schema.model_validate_json(candidate)
+        except ValidationError:
+            continue
+    logger.debug(f"Could not repair structured output: {content[:200]}")
+    return None
+
+
+async def parse_structured_or_reformat(content: Union[str, dict, None], schema: Type[T]) -> Tuple[Optional[T], bool]:
+    """
+    Parse locally first; ask Gemini to reformat the content only as a last resort.
+
+    Returns:
+        Tuple of (validated model or None, whether an LLM reformat call was made)
+    """
+    parsed = parse_structured(content, schema)
+    if parsed is not None or not content:
+        return parsed, False
+
+    logger.warning("Local structured output repair failed, falling back to an LLM reformat call")
+    try:
+        response = await gemini_client.generate(
+            f"format the content according to the provided response_schema + {content}",
+            model=model_policy.model("reformat"),
+            config={
+                "response_mime_type": "application/json",
+                "response_schema": schema,
+            },
+        )
+        return response.parsed, True
+    except Exception as e:
+        logger.error(f"Reformat call failed: {str(e)}")
+        return None, True
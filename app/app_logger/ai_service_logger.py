@@ -6,6 +6,7 @@ from functools import wraps
 import re
 from datetime import datetime, timezone
 from pythonjsonlogger import jsonlogger
+from config import settings
 
 # Create logs directory if it doesn't exist
 LOGS_DIR = "autogen_logs"
@@ -30,6 +31,11 @@ class CustomJsonFormatter(jsonlogger.JsonFormatter):
             log_record["level"] = record.levelname.upper()
 
 
+def rotating_file_handler(path: str) -> RotatingFileHandler:
+    """File handler that rotates at LOG_MAX_BYTES and keeps LOG_BACKUP_COUNT backups"""
+    return RotatingFileHandler(path, maxBytes=settings.LOG_MAX_BYTES, backupCount=settings.LOG_BACKUP_COUNT)
+
+
 def setup_logger(module_name: str) -> logging.Logger:
     """
     Setup a logger for a specific module with both file and console handlers
@@ -39,12 +45,8 @@ def setup_logger(module_name: str) -> logging.Logger:
 
     # Prevent adding handlers multiple times
     if not logger.handlers:
-        from logging.handlers import RotatingFileHandler
-
         # File handler with rotation
-        file_handler = RotatingFileHandler(
-            os.path.join(LOGS_DIR, f"{module_name}.log"), maxBytes=10 * 1024 * 1024, backupCount=5  # 10MB
-        )
+        file_handler = rotating_file_handler(os.path.join(LOGS_DIR, f"{module_name}.log"))
         file_handler.setLevel(logging.DEBUG)
 
         # Console handler
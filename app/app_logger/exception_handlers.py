@@ -8,39 +8,26 @@ from fastapi.exception_handlers import (
 from fastapi.responses import JSONResponse
 from fastapi.responses import PlainTextResponse
 from fastapi.responses import Response
-from opencensus.ext.azure.trace_exporter import AzureExporter
-from opencensus.trace.tracer import Tracer
-from opencensus.trace.samplers import ProbabilitySampler
-from opencensus.trace.span import SpanKind
-from opencensus.trace.attributes_helper import COMMON_ATTRIBUTES
 import traceback
 
 # ---
 
 # --- User Imports ---
-from app.config.env import env
-from app.utils.app_logger.logger import logger
+from app_logger.ai_service_logger import setup_logger
+from app_logger.tracing import current_span
 
 # ---
 
-# --- Constants ---
-OPENAI_TRACER = Tracer(
-    exporter=AzureExporter(connection_string=env.APPLICATIONINSIGHTS_CONNECTION_STRING), sampler=ProbabilitySampler(1.0)
-)
-HTTP_URL = COMMON_ATTRIBUTES["HTTP_URL"]
-HTTP_STATUS_CODE = COMMON_ATTRIBUTES["HTTP_STATUS_CODE"]
-ERROR_NAME = COMMON_ATTRIBUTES["ERROR_NAME"]
-ERROR_MESSAGE = COMMON_ATTRIBUTES["ERROR_MESSAGE"]
-HTTP_METHOD = COMMON_ATTRIBUTES["HTTP_METHOD"]
-HTTP_PATH = COMMON_ATTRIBUTES["HTTP_PATH"]
-STACKTRACE = COMMON_ATTRIBUTES["STACKTRACE"]
-# ---
+logger = setup_logger("http")
 
 
-def add_trace_to_azure_appinsight(request: Request, exc: HTTPException):
+def add_trace_to_current_span(request: Request, exc: Exception):
     """
-    This function adds required traces to azure app insight logs for proper identification and dashboarding
+    This function records the error on the request's span for proper identification in the trace
     """
+    span = current_span()
+    if span is None:
+        return
     exception_traceback = traceback.format_exc(limit=2)
     error_message_args = getattr(exc, "args", None)
     error_message_details = getattr(exc, "detail", None)
@@ -50,17 +37,17 @@ def add_trace_to_azure_appinsight(request: Request, exc: HTTPException):
             error_message = error_message_args[0]
         else:
             error_message = "Something went wrong"
-    with OPENAI_TRACER.span("main") as span:
-        span.span_kind = SpanKind.SERVER
-        OPENAI_TRACER.add_attribute_to_current_span(
-            attribute_key=HTTP_STATUS_CODE, attribute_value=getattr(exc, "status_code", 500)
-        )
-        OPENAI_TRACER.add_attribute_to_current_span(attribute_key=HTTP_URL, attribute_value=str(request.url))
-        OPENAI_TRACER.add_attribute_to_current_span(attribute_key=ERROR_NAME, attribute_value=str(type(exc).__name__))
-        OPENAI_TRACER.add_attribute_to_current_span(attribute_key=ERROR_MESSAGE, attribute_value=error_message)
-        OPENAI_TRACER.add_attribute_to_current_span(attribute_key=HTTP_METHOD, attribute_value=str(request.method))
-        OPENAI_TRACER.add_attribute_to_current_span(attribute_key=HTTP_PATH, attribute_value=str(request.url.path))
-        OPENAI_TRACER.add_attribute_to_current_span(attribute_key=STACKTRACE, attribute_value=str(exception_traceback))
+    status_code = getattr(exc, "status_code", 500)
+    if status_code >= 500:
+        span.status = "error"
+        span.error = f"{type(exc).__name__}: {error_message}"
+    span.set_attribute("http.status_code", status_code)
+    span.set_attribute("http.url", str(request.url))
+    span.set_attribute("error.name", str(type(exc).__name__))
+    span.set_attribute("error.message", str(error_message))
+    span.set_attribute("http.method", str(request.method))
+    span.set_attribute("http.path", str(request.url.path))
+    span.set_attribute("error.stacktrace", str(exception_traceback))
 
 
 async def request_validation_exception_handler(request: Request, exc: RequestValidationError) -> JSONResponse:
@@ -92,7 +79,7 @@ async def http_exception_handler(request: Request, exc: HTTPException) -> Union[
             "trace": exception_traceback,
         }
     )
-    add_trace_to_azure_appinsight(request, exc)
+    add_trace_to_current_span(request, exc)
     return JSONResponse(
         status_code=exc.status_code,
         content={"status": exc.status_code, "message": exc.detail, "success": False},
@@ -115,7 +102,7 @@ async def unhandled_exception_handler(request: Request, exc: Exception) -> Plain
             "trace": exception_traceback,
         }
     )
-    add_trace_to_azure_appinsight(request, exc)
+    add_trace_to_current_span(request, exc)
     return JSONResponse(
         status_code=500,
         content={"status": 500, "message": str(exc), "success": False},
@@ -3,7 +3,36 @@ import time
 
 from fastapi import Request
 
-from app.utils.app_logger.logger import logger
+from app_logger.ai_service_logger import setup_logger
+from app_logger.tracing import SpanContext, tracer
+
+logger = setup_logger("http")
+
+
+async def trace_request_middleware(request: Request, call_next):
+    """
+    This middleware runs every request as the root span of a trace.
+    An incoming W3C traceparent header continues the caller's trace; the
+    response carries traceparent and x-trace-id so clients can quote it.
+    """
+    parent = SpanContext.from_traceparent(request.headers.get("traceparent"))
+    with tracer.span(f"HTTP {request.method}", kind="server", parent=parent, root=True) as span:
+        span.set_attribute("http.method", request.method)
+        span.set_attribute("http.target", request.url.path)
+        try:
+            response = await call_next(request)
+        finally:
+            # The route template is only known once the router has matched
+            route = getattr(request.scope.get("route"), "path", None)
+            if route is not None:
+                span.name = f"HTTP {request.method} {route}"
+                span.set_attribute("http.route", route)
+        span.set_attribute("http.status_code", response.status_code)
+        if response.status_code >= 500:
+            span.status = "error"
+        response.headers["traceparent"] = span.context.traceparent()
+        response.headers["x-trace-id"] = span.trace_id
+        return response
 
 
 async def log_request_middleware(request: Request, call_next):
@@ -24,7 +53,8 @@ async def log_request_middleware(request: Request, call_next):
         status_phrase = http.HTTPStatus(response.status_code).phrase
     except ValueError:
         status_phrase = ""
+    trace_id = response.headers.get("x-trace-id", "-")
     logger.info(
-        f'{host}:{port} - "{request.method} {url}" {response.status_code} {status_phrase} {formatted_process_time}ms'
+        f'{host}:{port} - "{request.method} {url}" {response.status_code} {status_phrase} {formatted_process_time}ms trace={trace_id}'
     )
     return response
@@ -0,0 +1,293 @@
+import asyncio
+import contextvars
+import json
+import logging
+import random
+import re
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Dict, Iterator, Optional
+from config import settings
+from app_logger.ai_service_logger import rotating_file_handler, setup_logger
+from app_logger.metrics import metrics
+
+logger = setup_logger("tracing")
+
+spans_exported_total = metrics.counter("lawgpt_trace_spans_exported_total", "Sampled spans handed to the trace exporter by outcome (ok, error)")
+
+# W3C trace context: version-trace_id-parent_id-flags
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+class SpanContext:
+    """What a child span (or a downstream service) needs from its parent"""
+
+    __slots__ = ("trace_id", "span_id", "sampled")
+
+    def __init__(self, trace_id: str, span_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.sampled = sampled
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    @classmethod
+    def from_traceparent(cls, header: Optional[str]) -> Optional["SpanContext"]:
+        match = TRACEPARENT.match((header or "").strip().lower())
+        if match is None or match.group(1) == "0" * 32:
+            return None
+        return cls(match.group(1), match.group(2), bool(int(match.group(3), 16) & 1))
+
+
+class Span:
+    """
+    One timed operation of a trace, OpenTelemetry style.
+
+    Unsampled spans still carry their context (so the trace ID reaches logs
+    and clients) but record no attributes and are never exported.
+    """
+
+    __slots__ = ("name", "kind", "context", "parent_id", "attributes", "start_time", "started", "duration_ms", "status", "error")
+
+    def __init__(self, name: str, kind: str, context: SpanContext, parent_id: Optional[str], attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.kind = kind
+        self.context = context
+        self.parent_id = parent_id
+        self.attributes = dict(attributes) if attributes and context.sampled else {}
+        self.start_time = time.time()
+        self.started = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.status = "ok"
+        self.error: Optional[str] = None
+
+    @property
+    def trace_id(self) -> str:
+        return self.context.trace_id
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        if self.context.sampled:
+            self.attributes[key] = value
+
+    def record_exception(self, exc: BaseException) -> None:
+        self.status = "error"
+        self.error = f"{type(exc).__name__}: {str(exc)[:500]}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.context.trace_id,
+            "span_id": self.context.span_id,
+            "parent_span_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_time": self.start_time,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class SpanExporter:
+    """Receives every finished, sampled span; subclass to send spans elsewhere"""
+
+    def export(self, span: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def shutdown(self) -> None:
+        pass
+
+
+class NoopExporter(SpanExporter):
+    def export(self, span: Dict[str, Any]) -> None:
+        pass
+
+
+class JsonFileExporter(SpanExporter):
+    """
+    Writes one JSON object per span to a local file (TRACE_FILE), rotated like the logs.
+
+    Works offline; `jq 'select(.trace_id == "...")'` reassembles a trace.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or settings.TRACE_FILE
+        self.logger = logging.getLogger("lawgpt.traces")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        if not self.logger.handlers:
+            handler = rotating_file_handler(self.path)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self.logger.addHandler(handler)
+
+    def export(self, span: Dict[str, Any]) -> None:
+        self.logger.info(json.dumps(span, default=str))
+
+    def shutdown(self) -> None:
+        for handler in self.logger.handlers:
+            handler.flush()
+
+
+# TRACE_EXPORTER values
+EXPORTERS = {
+    "file": JsonFileExporter,
+    "none": NoopExporter,
+}
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("lawgpt_current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def current_context() -> Optional[SpanContext]:
+    span = _current_span.get()
+    return span.context if span is not None else None
+
+
+def current_trace_id() -> Optional[str]:
+    span = _current_span.get()
+    return span.context.trace_id if span is not None else None
+
+
+class Tracer:
+    """
+    Spans across request -> paralegal run -> agent turn -> tool -> embed/search -> LLM call.
+
+    The current span lives in a contextvar, so it follows awaits, tasks and
+    asyncio.to_thread; propagate_to_executor() extends that to the loop's
+    default executor, where autogen runs agent turns. Only root spans (HTTP
+    requests, websocket questions, jobs) start traces; other spans without a
+    parent are not recorded, so startup work and background jobs do not
+    create stray traces.
+
+    Sampling is decided once per trace (TRACE_SAMPLE_RATE, or the caller's
+    traceparent flag) and inherited by every span in it; unsampled spans
+    only cost an object and a contextvar switch.
+    """
+
+    def __init__(self, exporter: Optional[SpanExporter] = None, sample_rate: Optional[float] = None):
+        self.exporter = exporter
+        self.sample_rate = sample_rate if sample_rate is not None else settings.TRACE_SAMPLE_RATE
+        self._executor_loops = weakref.WeakSet()
+
+    def set_exporter(self, exporter: SpanExporter) -> None:
+        """Plug in a different exporter (e.g. an OTLP bridge)"""
+        if self.exporter is not None:
+            self.exporter.shutdown()
+        self.exporter = exporter
+
+    def _exporter(self) -> SpanExporter:
+        if self.exporter is None:
+            self.exporter = EXPORTERS.get(settings.TRACE_EXPORTER, NoopExporter)()
+        return self.exporter
+
+    def start_span(self, name: str, kind: str = "internal", attributes: Optional[Dict[str, Any]] = None, parent: Optional[SpanContext] = None, root: bool = False) -> Span:
+        """
+        Start a span without making it current (for async generators and streams).
+
+        Args:
+            name: Operation name, e.g. "llm.generate"
+            kind: server, client or internal
+            attributes: Recorded only when the trace is sampled
+            parent: Parent context (defaults to the current span)
+            root: Start a new trace when there is no parent
+
+        Returns:
+            The span; end it with finish()
+        """
+        parent = parent or current_context()
+        if parent is None:
+            sampled = root and random.random() < self.sample_rate
+            context = SpanContext(f"{random.getrandbits(128):032x}", f"{random.getrandbits(64):016x}", sampled)
+            return Span(name, kind, context, None, attributes)
+        context = SpanContext(parent.trace_id, f"{random.getrandbits(64):016x}", parent.sampled)
+        return Span(name, kind, context, parent.span_id, attributes)
+
+    def finish(self, span: Span) -> None:
+        if span.duration_ms is not None:
+            return
+        span.duration_ms = round((time.perf_counter() - span.started) * 1000, 3)
+        if not span.context.sampled:
+            return
+        try:
+            self._exporter().export(span.to_dict())
+            spans_exported_total.inc(outcome="ok")
+        except Exception as e:
+            spans_exported_total.inc(outcome="error")
+            logger.warning(f"Failed to export span {span.name}: {str(e)}")
+
+    @contextmanager
+    def span(self, name: str, kind: str = "internal", attributes: Optional[Dict[str, Any]] = None, parent: Optional[SpanContext] = None, root: bool = False) -> Iterator[Span]:
+        """Run a block as a span (the current span inside it); exceptions mark it failed"""
+        span = self.start_span(name, kind=kind, attributes=attributes, parent=parent, root=root)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except asyncio.CancelledError:
+            span.status = "cancelled"
+            raise
+        except BaseException as e:
+            span.record_exception(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            self.finish(span)
+
+    def propagate_to_executor(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """
+        Make loop.run_in_executor(None, ...) carry the caller's span into the worker thread.
+
+        Autogen runs agent turns that way, and run_in_executor (unlike
+        asyncio.to_thread) does not copy contextvars. Idempotent per loop.
+        """
+        loop = loop or asyncio.get_running_loop()
+        if loop not in self._executor_loops:
+            loop.set_default_executor(ContextThreadPoolExecutor(thread_name_prefix="lawgpt-executor"))
+            self._executor_loops.add(loop)
+
+    def shutdown(self) -> None:
+        if self.exporter is not None:
+            self.exporter.shutdown()
+
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor that runs each task in a copy of the submitter's contextvars"""
+
+    def submit(self, fn, /, *args, **kwargs):
+        context = contextvars.copy_context()
+        return super().submit(context.run, fn, *args, **kwargs)
+
+
+def traced(name: Optional[str] = None, kind: str = "internal"):
+    """
+    Decorator running a function (sync or async) as a span of the current trace.
+    """
+
+    def decorator(func):
+        span_name = name or func.__qualname__
+        if asyncio.iscoroutinefunction(func):
+
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.span(span_name, kind=kind):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @wraps(func)
+        def sync_wrapper(*args, **kwargs):
+            with tracer.span(span_name, kind=kind):
+                return func(*args, **kwargs)
+
+        return sync_wrapper
+
+    return decorator
+
+
+tracer = Tracer()
@@ -0,0 +1,124 @@
+import asyncio
+import time
+from typing import Any, Dict, Optional
+import diskcache
+from config import settings
+from app_logger.ai_service_logger import setup_logger
+from app_logger.metrics import metrics
+
+logger = setup_logger("cache_store")
+
+cache_requests_total = metrics.counter("lawgpt_cache_requests_total", "Conversation/LLM cache lookups by store and outcome (hit, miss)")
+cache_bytes = metrics.gauge("lawgpt_cache_bytes", "Disk space used by the conversation and LLM completion cache")
+cache_entries = metrics.gauge("lawgpt_cache_entries", "Entries in the conversation and LLM completion cache")
+cache_removed_total = metrics.counter("lawgpt_cache_removed_total", "Cache entries removed by compaction by reason (expired, quota)")
+
+
+class CacheNamespace:
+    """
+    One store's view of the shared cache (e.g. one client's conversation, or LLM completions).
+
+    Keys are prefixed with the namespace and written with the store's TTL.
+    Implements autogen's cache protocol (get/set/close, context manager), so it
+    can be passed wherever an autogen Cache was used.
+    """
+
+    def __init__(self, store: "CacheStore", kind: str, scope: str, ttl: float):
+        self.store = store
+        self.kind = kind
+        self.prefix = f"{kind}:{scope}:" if scope else f"{kind}:"
+        self.ttl = ttl
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self.store.cache.get(self.prefix + key, default=None)
+        cache_requests_total.inc(store=self.kind, outcome="miss" if value is None else "hit")
+        return default if value is None else value
+
+    def set(self, key: str, value: Any) -> None:
+        self.store.cache.set(self.prefix + key, value, expire=self.ttl)
+
+    def close(self) -> None:
+        # The underlying cache is shared and stays open
+        pass
+
+    def __enter__(self) -> "CacheNamespace":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        pass
+
+
+class CacheStore:
+    """
+    Single size-capped disk cache for conversation memory and LLM completions.
+
+    Replaces autogen.Cache.disk(cache_seed=chat_id), which opened one cache
+    directory per chat and never expired anything. Every entry is written with
+    its store's TTL (CACHE_CONVERSATION_TTL_SECONDS for conversation memory,
+    CACHE_LLM_TTL_SECONDS for completions) and the whole cache is capped at
+    CACHE_DISK_QUOTA_MB: writes past the quota evict the least recently used
+    entries. A background task periodically drops expired entries, culls back
+    under the quota and publishes the footprint; hit rates are counted per store.
+    """
+
+    def __init__(self, directory: Optional[str] = None, quota_mb: Optional[float] = None):
+        self.directory = directory or settings.CACHE_DIR
+        self.quota_bytes = int((quota_mb or settings.CACHE_DISK_QUOTA_MB) * 1024 * 1024)
+        self.cache = diskcache.Cache(self.directory, size_limit=self.quota_bytes, eviction_policy="least-recently-used")
+        self.compactor: Optional[asyncio.Task] = None
+
+    def conversation(self, session_id: str) -> CacheNamespace:
+        """Where one client's conversation memory is persisted"""
+        return CacheNamespace(self, "conversation", session_id, settings.CACHE_CONVERSATION_TTL_SECONDS)
+
+    def llm(self) -> CacheNamespace:
+        """Completion cache for autogen agent turns"""
+        return CacheNamespace(self, "llm", "", settings.CACHE_LLM_TTL_SECONDS)
+
+    def compact(self) -> Dict[str, int]:
+        """Drop expired entries, evict down to the quota and refresh the footprint gauges"""
+        started = time.perf_counter()
+        expired = self.cache.expire()
+        culled = self.cache.cull()
+        cache_removed_total.inc(expired, reason="expired")
+        cache_removed_total.inc(culled, reason="quota")
+        stats = self.stats()
+        cache_bytes.set(stats["bytes"])
+        cache_entries.set(stats["entries"])
+        logger.info(f"Compacted cache in {(time.perf_counter() - started) * 1000:.1f}ms: {expired} expired, {culled} over quota, {stats['bytes']} bytes in {stats['entries']} entries")
+        return {"expired": expired, "culled": culled}
+
+    async def run_compaction(self, interval: Optional[float] = None) -> None:
+        """Compact every `interval` seconds until cancelled (disk work runs off the event loop)"""
+        interval = interval or settings.CACHE_COMPACT_INTERVAL_SECONDS
+        while True:
+            try:
+                await asyncio.to_thread(self.compact)
+            except Exception as e:
+                logger.warning(f"Cache compaction failed: {str(e)}")
+            await asyncio.sleep(interval)
+
+    def start(self) -> None:
+        """Start background compaction on the running event loop"""
+        if self.compactor is None or self.compactor.done():
+            self.compactor = asyncio.get_running_loop().create_task(self.run_compaction())
+
+    async def stop(self) -> None:
+        if self.compactor is not None:
+            self.compactor.cancel()
+            try:
+                await self.compactor
+            except asyncio.CancelledError:
+                pass
+            self.compactor = None
+        self.cache.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "bytes": self.cache.volume(),
+            "entries": len(self.cache),
+            "quota_bytes": self.quota_bytes,
+        }
+
+
+cache_store = CacheStore()
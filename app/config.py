@@ -14,4 +14,113 @@ class Settings:
     GEMENI_API_KEY: str = os.getenv("GEMENI_API_KEY")
     TAX_PARALEGAL_MODEL: str = os.getenv("TAX_PARALEGAL_MODEL")
     TAX_PARALEGAL_VECTOR_STORE: str = os.getenv("TAX_PARALEGAL_VECTOR_STORE")
+    # Retrieval: "chunk" returns the matched chunks, "small_to_big" returns their enclosing sections
+    RETRIEVAL_MODE: str = os.getenv("RETRIEVAL_MODE", "chunk")
+    PARENT_STORE_PATH: str = os.getenv("PARENT_STORE_PATH", "vector_data/parents.json")
+    SMALL_TO_BIG_MAX_TOKENS: int = int(os.getenv("SMALL_TO_BIG_MAX_TOKENS", "3000"))
+    # Vector backend: "pinecone" or "local" (compressed on-disk store)
+    VECTOR_BACKEND: str = os.getenv("VECTOR_BACKEND", "pinecone")
+    LOCAL_VECTOR_STORE_PATH: str = os.getenv("LOCAL_VECTOR_STORE_PATH", "vector_data/local")
+    VECTOR_COMPRESSION: str = os.getenv("VECTOR_COMPRESSION", "int8")  # none | int8 | pq
+    PQ_SUBVECTORS: int = int(os.getenv("PQ_SUBVECTORS", "64"))
+    VECTOR_RESCORE_FACTOR: int = int(os.getenv("VECTOR_RESCORE_FACTOR", "4"))
+    # Corpus shards (one namespace per corpus); the tax corpus uses PINECONE_NAMESPACE
+    ACTIVE_CORPORA: str = os.getenv("ACTIVE_CORPORA", "tax")
+    COMPANY_LAW_NAMESPACE: str = os.getenv("COMPANY_LAW_NAMESPACE", "company-law")
+    CRIMINAL_LAW_NAMESPACE: str = os.getenv("CRIMINAL_LAW_NAMESPACE", "criminal-law")
+    FAMILY_LAW_NAMESPACE: str = os.getenv("FAMILY_LAW_NAMESPACE", "hindu-marriage")
+    SEARCH_ROUTER_CONFIDENCE: float = float(os.getenv("SEARCH_ROUTER_CONFIDENCE", "0.6"))
+    SHARD_SEARCH_TIMEOUT: float = float(os.getenv("SHARD_SEARCH_TIMEOUT", "5"))
+    # Pre-built agent graphs (one per concurrent conversation)
+    AGENT_POOL_SIZE: int = int(os.getenv("AGENT_POOL_SIZE", "4"))
+    AGENT_POOL_WARM_SIZE: int = int(os.getenv("AGENT_POOL_WARM_SIZE", "1"))
+    # "pipeline" (staged, 2-3 LLM calls) or "group_chat" (open-ended Autogen orchestration)
+    PARALEGAL_MODE: str = os.getenv("PARALEGAL_MODE", "group_chat")
+    # Semantic answer cache: paraphrased questions above the cosine threshold reuse a cached answer
+    SEMANTIC_CACHE_ENABLED: bool = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+    SEMANTIC_CACHE_THRESHOLD: float = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+    SEMANTIC_CACHE_MAX_MB: int = int(os.getenv("SEMANTIC_CACHE_MAX_MB", "64"))
+    # Cached answers are invalidated when the index version changes
+    INDEX_VERSION: str = os.getenv("INDEX_VERSION", "1")
+    INDEX_VERSION_PATH: str = os.getenv("INDEX_VERSION_PATH", "vector_data/index_version")
+    # Admission control / weighted-fair scheduling of paralegal runs
+    SCHEDULER_MAX_CONCURRENCY: int = int(os.getenv("SCHEDULER_MAX_CONCURRENCY", "8"))
+    SCHEDULER_PER_CLIENT_LIMIT: int = int(os.getenv("SCHEDULER_PER_CLIENT_LIMIT", "2"))
+    SCHEDULER_MAX_QUEUE_DEPTH: int = int(os.getenv("SCHEDULER_MAX_QUEUE_DEPTH", "64"))
+    SCHEDULER_CLIENT_WEIGHTS: str = os.getenv("SCHEDULER_CLIENT_WEIGHTS", "")  # e.g. "premium:3,batch:0.5"
+    SCHEDULER_INITIAL_SERVICE_SECONDS: float = float(os.getenv("SCHEDULER_INITIAL_SERVICE_SECONDS", "10"))
+    REQUEST_DEADLINE_SECONDS: float = float(os.getenv("REQUEST_DEADLINE_SECONDS", "120"))
+    # Conversation memory: recent turns verbatim, older ones folded into a rolling summary
+    CONVERSATION_TOKEN_BUDGET: int = int(os.getenv("CONVERSATION_TOKEN_BUDGET", "1500"))
+    CONVERSATION_RECENT_TURNS: int = int(os.getenv("CONVERSATION_RECENT_TURNS", "3"))
+    # Context packing for the answer prompt
+    CONTEXT_MAX_TOKENS: int = int(os.getenv("CONTEXT_MAX_TOKENS", "1800"))
+    CONTEXT_SENTENCES_PER_CHUNK: int = int(os.getenv("CONTEXT_SENTENCES_PER_CHUNK", "6"))
+    # Multi-query retrieval: sub-queries per question and the reciprocal rank fusion constant
+    MULTI_QUERY_MAX: int = int(os.getenv("MULTI_QUERY_MAX", "3"))
+    RRF_K: int = int(os.getenv("RRF_K", "60"))
+    SEARCH_TOP_K: int = int(os.getenv("SEARCH_TOP_K", "12"))
+    # Speculative retrieval on the raw question: discarded if the reformulation keeps fewer
+    # than this share of its terms, otherwise fused in at SPECULATIVE_WEIGHT
+    SPECULATIVE_MIN_OVERLAP: float = float(os.getenv("SPECULATIVE_MIN_OVERLAP", "0.3"))
+    SPECULATIVE_WEIGHT: float = float(os.getenv("SPECULATIVE_WEIGHT", "0.5"))
+    # Local embedding domain router (centroids built from domain_examples.json and section titles)
+    DOMAIN_ROUTER_PATH: str = os.getenv("DOMAIN_ROUTER_PATH", "vector_data/domain_router.npz")
+    DOMAIN_ROUTER_CONFIDENCE: float = float(os.getenv("DOMAIN_ROUTER_CONFIDENCE", "0.7"))
+    DOMAIN_ROUTER_TEMPERATURE: float = float(os.getenv("DOMAIN_ROUTER_TEMPERATURE", "0.02"))
+    # Dictionary query rewriting (mined from the Act by mine_terms.py); the LLM reformulation is
+    # skipped when the dictionary explains at least this share of the question's content words
+    TERM_DICTIONARY_PATH: str = os.getenv("TERM_DICTIONARY_PATH", "term_dictionary.json")
+    QUERY_REWRITE_CONFIDENCE: float = float(os.getenv("QUERY_REWRITE_CONFIDENCE", "0.5"))
+    # Gemini call protection: per-call timeout (capped by the request's remaining budget), a hedged
+    # duplicate after the observed latency quantile, retries of transient errors and a circuit breaker
+    GEMINI_BASE_URL: str = os.getenv("GEMINI_BASE_URL", "")  # e.g. http://localhost:8765 for fake_gemini.py
+    LLM_CALL_TIMEOUT_SECONDS: float = float(os.getenv("LLM_CALL_TIMEOUT_SECONDS", "60"))
+    LLM_HEDGE_ENABLED: bool = os.getenv("LLM_HEDGE_ENABLED", "true").lower() == "true"
+    LLM_HEDGE_QUANTILE: float = float(os.getenv("LLM_HEDGE_QUANTILE", "0.95"))
+    LLM_HEDGE_INITIAL_DELAY_SECONDS: float = float(os.getenv("LLM_HEDGE_INITIAL_DELAY_SECONDS", "5"))
+    LLM_HEDGE_MIN_DELAY_SECONDS: float = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "0.5"))
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", "2"))
+    LLM_BREAKER_FAILURE_RATIO: float = float(os.getenv("LLM_BREAKER_FAILURE_RATIO", "0.5"))
+    LLM_BREAKER_MIN_CALLS: int = int(os.getenv("LLM_BREAKER_MIN_CALLS", "10"))
+    LLM_BREAKER_WINDOW_SECONDS: float = float(os.getenv("LLM_BREAKER_WINDOW_SECONDS", "30"))
+    LLM_BREAKER_COOLDOWN_SECONDS: float = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "15"))
+    # Model cascade: tiers cheapest first, the tier each stage starts at, and how far a stage may
+    # escalate when its result is rejected; answers over weak retrieval start one tier up
+    LLM_MODEL_TIERS: str = os.getenv("LLM_MODEL_TIERS", "gemini-2.0-flash-lite,gemini-2.0-flash,gemini-2.5-pro")
+    LLM_STAGE_TIERS: str = os.getenv("LLM_STAGE_TIERS", "route:0,reformulate:0,summarize:0,reformat:0,manager:0,agent:1,answer:1")
+    LLM_CASCADE_MAX_ESCALATIONS: int = int(os.getenv("LLM_CASCADE_MAX_ESCALATIONS", "1"))
+    LLM_CASCADE_MIN_RETRIEVAL_SCORE: float = float(os.getenv("LLM_CASCADE_MIN_RETRIEVAL_SCORE", "0.6"))
+    # Shared Gemini client: at most this many requests in flight process-wide (hedges included),
+    # over one keep-alive HTTP connection pool
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+    LLM_HTTP_MAX_CONNECTIONS: int = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "32"))
+    LLM_HTTP_KEEPALIVE_SECONDS: float = float(os.getenv("LLM_HTTP_KEEPALIVE_SECONDS", "60"))
+    # How often a request/response endpoint checks whether its client went away (runs are then cancelled)
+    DISCONNECT_POLL_SECONDS: float = float(os.getenv("DISCONNECT_POLL_SECONDS", "1"))
+    # Questions one websocket connection may have in flight at once (tagged with request IDs)
+    WS_MAX_CONCURRENT_QUERIES: int = int(os.getenv("WS_MAX_CONCURRENT_QUERIES", "4"))
+    # Per-client sessions kept in memory (conversation memory is restored from the cache after eviction)
+    SESSION_MAX_COUNT: int = int(os.getenv("SESSION_MAX_COUNT", "1000"))
+    SESSION_IDLE_TTL_SECONDS: float = float(os.getenv("SESSION_IDLE_TTL_SECONDS", "1800"))
+    # Signs the session IDs the server issues; empty uses a random key per process (sessions end on restart)
+    SESSION_SECRET: str = os.getenv("SESSION_SECRET", "")
+    # Shared disk cache for conversation memory and LLM completions: one quota, per-store TTLs,
+    # expired and over-quota entries compacted in the background
+    CACHE_DIR: str = os.getenv("CACHE_DIR", ".cache/lawgpt")
+    CACHE_DISK_QUOTA_MB: float = float(os.getenv("CACHE_DISK_QUOTA_MB", "512"))
+    CACHE_CONVERSATION_TTL_SECONDS: float = float(os.getenv("CACHE_CONVERSATION_TTL_SECONDS", "604800"))
+    CACHE_LLM_TTL_SECONDS: float = float(os.getenv("CACHE_LLM_TTL_SECONDS", "86400"))
+    CACHE_COMPACT_INTERVAL_SECONDS: float = float(os.getenv("CACHE_COMPACT_INTERVAL_SECONDS", "600"))
+    # Log files (module logs and the autogen runtime log) rotate at this size, keeping this many backups
+    LOG_MAX_BYTES: int = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+    LOG_BACKUP_COUNT: int = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+    # Background job API (POST /jobs): worker pool size, queued jobs before rejecting, how long finished jobs are kept
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "4"))
+    JOB_QUEUE_MAX_DEPTH: int = int(os.getenv("JOB_QUEUE_MAX_DEPTH", "100"))
+    JOB_RESULT_TTL_SECONDS: float = float(os.getenv("JOB_RESULT_TTL_SECONDS", "3600"))
+    # Request tracing: share of traces recorded, and where finished spans go ("file" writes JSON lines to TRACE_FILE, "none")
+    TRACE_SAMPLE_RATE: float = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+    TRACE_EXPORTER: str = os.getenv("TRACE_EXPORTER", "file")
+    TRACE_FILE: str = os.getenv("TRACE_FILE", "autogen_logs/traces.jsonl")
 settings = Settings()
\ No newline at end of file
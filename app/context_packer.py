@@ -0,0 +1,180 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Set
+from pydantic import BaseModel, Field
+from config import settings
+from token_counter import count_tokens, truncate_to_tokens
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.;:?!])\s+(?=[(\"'A-Z0-9])|\n{2,}")
+WORD = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    "a", "an", "and", "any", "are", "as", "at", "be", "by", "can", "for", "from", "how", "i", "in", "is", "it",
+    "its", "may", "me", "my", "of", "on", "or", "shall", "such", "that", "the", "this", "to", "under", "what",
+    "when", "where", "which", "who", "will", "with",
+}
+
+
+class Citation(BaseModel):
+    tag: str
+    corpus: str = ""
+    section_id: str = ""
+    section_title: str = ""
+    page_id: str = ""
+    score: float = 0.0
+
+
+class PackedContext(BaseModel):
+    text: str
+    citations: List[Citation] = Field(default_factory=list)
+    tokens: int = 0
+    input_results: int = 0
+
+
+def _terms(text: str) -> List[str]:
+    return [word for word in WORD.findall(text.lower()) if word not in STOPWORDS]
+
+
+def _shingles(text: str, size: int = 5) -> Set[str]:
+    words = WORD.findall(text.lower())
+    return {" ".join(words[i:i + size]) for i in range(max(len(words) - size + 1, 1))}
+
+
+def _score(result: Dict) -> float:
+    return result.get("calibrated_score", result.get("similarity_score", 0.0))
+
+
+class ContextPacker:
+    """
+    Turns ranked search results into a compact, citable prompt context.
+
+    1. Near-duplicate chunks (overlapping windows, the same section reached via
+       several children) are merged, keeping the best score.
+    2. Chunks are grouped by section; sections are ordered by their best score
+       and chunks within a section keep document order.
+    3. Each chunk is trimmed to the sentences that share the most (IDF
+       weighted) terms with the query, kept in original order.
+    4. Blocks are added with short citation tags ([1], [2] ...) until the token
+       budget is full; metadata such as image paths stays out of the prompt.
+    """
+
+    def __init__(self, max_tokens: Optional[int] = None, sentences_per_chunk: Optional[int] = None, overlap_threshold: float = 0.6):
+        self.max_tokens = max_tokens or settings.CONTEXT_MAX_TOKENS
+        self.sentences_per_chunk = sentences_per_chunk or settings.CONTEXT_SENTENCES_PER_CHUNK
+        self.overlap_threshold = overlap_threshold
+
+    def _dedupe(self, results: List[Dict]) -> List[Dict]:
+        kept: List[Dict] = []
+        shingles: List[Set[str]] = []
+        for result in sorted(results, key=_score, reverse=True):
+            candidate = _shingles(result.get("content", ""))
+            duplicate = False
+            for index, existing in enumerate(shingles):
+                overlap = len(candidate & existing) / max(min(len(candidate), len(existing)), 1)
+                if overlap >= self.overlap_threshold:
+                    duplicate = True
+                    if len(candidate) > len(existing):
+                        # Same passage, but this copy is the longer window: keep its text at the better rank
+                        kept[index] = {**kept[index], "content": result.get("content", "")}
+                        shingles[index] = candidate
+                    break
+            if not duplicate:
+                kept.append(result)
+                shingles.append(candidate)
+        return kept
+
+    def _order(self, results: List[Dict]) -> List[Dict]:
+        sections: Dict[object, List[Dict]] = {}
+        for result in results:
+            # Only real sections group chunks; anything else (e.g. plain legal chunks) stands alone at its own rank
+            key = result.get("parent_id") or result.get("section_id") or id(result)
+            sections.setdefault(key, []).append(result)
+        groups = sorted(sections.values(), key=lambda group: max(_score(r) for r in group), reverse=True)
+        ordered = []
+        for group in groups:
+            ordered.extend(sorted(group, key=lambda r: int(r.get("chunk_number") or 0)))
+        return ordered
+
+    def _trim(self, content: str, query_weights: Dict[str, float], seen: Set[str]) -> List[str]:
+        # Sentences already packed from an overlapping chunk are not repeated
+        sentences, keys = [], set(seen)
+        for sentence in SENTENCE_BOUNDARY.split(content):
+            sentence = (sentence or "").strip()
+            if sentence and sentence.lower() not in keys:
+                keys.add(sentence.lower())
+                sentences.append(sentence)
+        if len(sentences) > self.sentences_per_chunk:
+            sentences = self._select(sentences, query_weights)
+        return sentences
+
+    def _select(self, sentences: List[str], query_weights: Dict[str, float]) -> List[str]:
+        scored = []
+        for position, sentence in enumerate(sentences):
+            terms = set(_terms(sentence))
+            scored.append((sum(query_weights.get(term, 0.0) for term in terms), -position))
+        best = sorted(range(len(sentences)), key=lambda i: scored[i], reverse=True)[: self.sentences_per_chunk]
+        if all(scored[i][0] == 0 for i in best):
+            best = range(self.sentences_per_chunk)
+        return [sentences[i] for i in sorted(best)]
+
+    def _query_weights(self, query: str, results: List[Dict]) -> Dict[str, float]:
+        """IDF of each query term over the retrieved chunks, so rare terms (80GG, HRA) outweigh common ones (income)"""
+        query_terms = set(_terms(query))
+        document_frequency = Counter()
+        for result in results:
+            document_frequency.update(query_terms & set(_terms(result.get("content", ""))))
+        total = max(len(results), 1)
+        return {term: math.log(1 + total / (1 + document_frequency[term])) for term in query_terms}
+
+    def pack(self, query: str, results: List[Dict], max_tokens: Optional[int] = None) -> PackedContext:
+        """
+        Pack search results into a prompt context under a token budget.
+
+        Args:
+            query: The question the context is for
+            results: Search results (as returned by the search router)
+            max_tokens: Token budget (defaults to CONTEXT_MAX_TOKENS)
+
+        Returns:
+            The context text with its citation table and token count
+        """
+        budget = max_tokens or self.max_tokens
+        candidates = self._order(self._dedupe(results))
+        weights = self._query_weights(query, candidates)
+
+        blocks: List[str] = []
+        citations: List[Citation] = []
+        seen: Set[str] = set()
+        used = 0
+        for result in candidates:
+            tag = f"[{len(citations) + 1}]"
+            section = result.get("section_id", "")
+            title = result.get("section_title", "")
+            header = f"{tag} {'s. ' + section if section else result.get('corpus', '')} {title}".rstrip()
+            sentences = self._trim(result.get("content", ""), weights, seen)
+            body = " ".join(sentences)
+            if not body:
+                continue
+            block_tokens = count_tokens(header) + count_tokens(body)
+            if used + block_tokens > budget:
+                if blocks:
+                    continue
+                body = truncate_to_tokens(body, budget - count_tokens(header))
+                block_tokens = count_tokens(header) + count_tokens(body)
+            blocks.append(f"{header}\n{body}")
+            # Only what was actually packed: a skipped or cut block leaves its sentences to later chunks
+            seen.update(sentence.lower() for sentence in sentences if sentence in body)
+            citations.append(Citation(
+                tag=tag,
+                corpus=result.get("corpus", ""),
+                section_id=section,
+                section_title=title,
+                page_id=result.get("page_id", ""),
+                score=_score(result),
+            ))
+            used += block_tokens
+
+        return PackedContext(text="\n\n".join(blocks), citations=citations, tokens=used, input_results=len(results))
+
+
+context_packer = ContextPacker()
@@ -0,0 +1,68 @@
+from typing import Dict, List, Optional
+from pydantic import BaseModel, Field
+from config import settings
+
+
+class Corpus(BaseModel):
+    """A legal corpus (one or more Acts) stored in its own vector store namespace."""
+    name: str
+    namespace: Optional[str] = Field(description="Vector store namespace (shard); None is the default namespace")
+    agent: str = Field(description="Name of the specialised agent that answers questions on this corpus")
+    description: str
+    keywords: List[str] = Field(default_factory=list, description="Lower-case terms that hint a question belongs to this corpus")
+    documents: List[str] = Field(default_factory=list, description="Ids of the documents ingested into this corpus")
+
+
+CORPORA: Dict[str, Corpus] = {
+    "tax": Corpus(
+        name="tax",
+        # The Income-tax Act was ingested before namespaces existed; keep it where PINECONE_NAMESPACE points
+        namespace=settings.PINECONE_NAMESPACE or None,
+        agent="tax_paralegal_agent",
+        description="Indian tax law: Income-tax Act, 1961",
+        keywords=[
+            "tax", "income", "deduction", "exemption", "tds", "tcs", "80c", "hra", "salary", "assessee",
+            "assessment", "return", "capital gain", "depreciation", "rebate", "surcharge", "cess", "pan",
+            "advance tax", "refund", "gst", "itr", "previous year", "house property",
+        ],
+        documents=["income_tax_act_1961"],
+    ),
+    "company": Corpus(
+        name="company",
+        namespace=settings.COMPANY_LAW_NAMESPACE,
+        agent="company_law_agent",
+        description="Company law and corporate governance: Companies Act, 2013",
+        keywords=[
+            "company", "companies act", "director", "shareholder", "board", "incorporation", "llp",
+            "memorandum", "articles of association", "auditor", "dividend", "winding up", "merger",
+            "private limited", "public limited", "annual general meeting", "agm", "roc", "csr",
+        ],
+    ),
+    "criminal": Corpus(
+        name="criminal",
+        namespace=settings.CRIMINAL_LAW_NAMESPACE,
+        agent="criminal_law_agent",
+        description="Criminal law, procedure and evidence",
+        keywords=[
+            "crime", "criminal", "offence", "ipc", "bns", "crpc", "bail", "fir", "arrest", "police",
+            "murder", "theft", "cheating", "punishment", "imprisonment", "cognizable", "accused",
+            "charge sheet", "warrant", "fraud", "assault",
+        ],
+    ),
+    "family": Corpus(
+        name="family",
+        namespace=settings.FAMILY_LAW_NAMESPACE,
+        agent="family_law_agent",
+        description="Family law: Hindu Marriage Act, 1955",
+        keywords=[
+            "marriage", "divorce", "hindu", "spouse", "husband", "wife", "alimony", "maintenance",
+            "custody", "restitution of conjugal rights", "judicial separation", "void marriage", "adoption",
+        ],
+    ),
+}
+
+
+def active_corpora() -> List[Corpus]:
+    """Corpora that have been ingested and should be searched (ACTIVE_CORPORA)"""
+    names = [name.strip() for name in settings.ACTIVE_CORPORA.split(",") if name.strip()]
+    return [CORPORA[name] for name in names if name in CORPORA]
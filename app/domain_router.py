@@ -0,0 +1,201 @@
+import argparse
+import json
+import os
+import re
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+import numpy as np
+from pydantic import BaseModel, Field
+from config import settings
+from corpora import CORPORA
+from parent_store import parent_store
+from app_logger.ai_service_logger import setup_logger
+
+logger = setup_logger("domain_router")
+
+EXAMPLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "domain_examples.json")
+# Section titles per corpus used as extra training text (the headings are a dense summary of each Act)
+MAX_TITLES_PER_CORPUS = 300
+
+
+class DomainPrediction(BaseModel):
+    domain: str
+    confidence: float = Field(description="Softmax probability of the chosen domain")
+    scores: Dict[str, float] = Field(default_factory=dict, description="Cosine similarity to each domain centroid")
+
+
+class DomainRouter:
+    """
+    Routes a question to its legal domain from the query embedding.
+
+    Each domain is represented by the normalised centroid of the embeddings of
+    its labelled example questions, its description and keywords, and the
+    section titles of its ingested Acts. Routing is one small matrix-vector
+    product over the embedding the pipeline already computes, so it takes
+    microseconds; the LLM router is only needed when the softmax confidence is
+    below DOMAIN_ROUTER_CONFIDENCE.
+    """
+
+    def __init__(self, path: Optional[str] = None, temperature: Optional[float] = None):
+        self.path = path or settings.DOMAIN_ROUTER_PATH
+        self.temperature = temperature or settings.DOMAIN_ROUTER_TEMPERATURE
+        self.domains: List[str] = []
+        self.centroids: Optional[np.ndarray] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.centroids is not None
+
+    @staticmethod
+    def load_examples(path: str = EXAMPLES_PATH) -> Dict:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    @staticmethod
+    def training_texts(examples: Dict[str, List[str]]) -> Dict[str, List[str]]:
+        """Labelled questions plus corpus metadata and section titles for every known domain"""
+        titles_by_document: Dict[str, List[str]] = {}
+        for parent in parent_store.parents.values():
+            if parent.get("title"):
+                titles_by_document.setdefault(parent["document_id"], []).append(parent["title"])
+
+        texts = {}
+        for name, corpus in CORPORA.items():
+            domain_texts = list(examples.get(name, []))
+            domain_texts.append(corpus.description)
+            domain_texts.extend(f"{keyword} under {corpus.description}" for keyword in corpus.keywords)
+            for document_id in corpus.documents:
+                domain_texts.extend(titles_by_document.get(document_id, [])[:MAX_TITLES_PER_CORPUS])
+            texts[name] = domain_texts
+        return texts
+
+    def build(self, embed_documents: Callable[[List[str]], List[List[float]]], examples: Optional[Dict[str, List[str]]] = None) -> None:
+        """
+        Compute and persist the domain centroids.
+
+        Args:
+            embed_documents: Batch embedding function (the search embedding model)
+            examples: Labelled questions per domain (defaults to domain_examples.json)
+        """
+        examples = examples if examples is not None else self.load_examples()["train"]
+        texts = self.training_texts(examples)
+        self.domains = list(texts)
+        centroids = []
+        for domain in self.domains:
+            vectors = np.asarray(embed_documents(texts[domain]), dtype=np.float32)
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            centroid = vectors.mean(axis=0)
+            centroids.append(centroid / max(np.linalg.norm(centroid), 1e-12))
+        self.centroids = np.stack(centroids)
+        self.save()
+        logger.info(f"Built domain centroids for {self.domains} from {sum(len(t) for t in texts.values())} texts")
+
+    def save(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        np.savez(self.path, centroids=self.centroids, domains=np.array(self.domains))
+
+    def load(self) -> bool:
+        """Load persisted centroids; returns False if they have not been built yet"""
+        if not os.path.exists(self.path):
+            return False
+        data = np.load(self.path)
+        self.centroids = data["centroids"]
+        self.domains = [str(domain) for domain in data["domains"]]
+        return True
+
+    def load_or_build(self, embed_documents: Callable[[List[str]], List[List[float]]]) -> None:
+        if not self.load():
+            self.build(embed_documents)
+
+    def route(self, embedding: List[float]) -> Optional[DomainPrediction]:
+        """
+        Predict the domain of a query from its embedding.
+
+        Returns:
+            The prediction, or None if the router has not been built
+        """
+        if self.centroids is None:
+            return None
+        vector = np.asarray(embedding, dtype=np.float32)
+        similarities = self.centroids @ (vector / max(float(np.linalg.norm(vector)), 1e-12))
+        logits = (similarities - similarities.max()) / self.temperature
+        probabilities = np.exp(logits) / np.exp(logits).sum()
+        best = int(probabilities.argmax())
+        return DomainPrediction(
+            domain=self.domains[best],
+            confidence=float(probabilities[best]),
+            scores={domain: round(float(score), 4) for domain, score in zip(self.domains, similarities)},
+        )
+
+    def evaluate(self, embed_documents: Callable[[List[str]], List[List[float]]], eval_examples: List[Dict[str, str]], threshold: Optional[float] = None) -> Dict:
+        """
+        Offline accuracy report on held-out labelled questions.
+
+        Reports overall accuracy, accuracy and coverage above the confidence
+        threshold (the share of questions that skip the LLM), a confusion
+        matrix, the keyword router as a baseline and the routing latency.
+        """
+        threshold = threshold if threshold is not None else settings.DOMAIN_ROUTER_CONFIDENCE
+        queries = [example["query"] for example in eval_examples]
+        embeddings = embed_documents(queries)
+
+        start = time.perf_counter()
+        predictions = [self.route(embedding) for embedding in embeddings]
+        route_us = (time.perf_counter() - start) / max(len(queries), 1) * 1e6
+
+        confusion: Dict[str, Counter] = {domain: Counter() for domain in self.domains}
+        correct = confident = confident_correct = keyword_correct = 0
+        errors = []
+        for example, prediction in zip(eval_examples, predictions):
+            expected = example["domain"]
+            confusion.setdefault(expected, Counter())[prediction.domain] += 1
+            hit = prediction.domain == expected
+            correct += hit
+            if prediction.confidence >= threshold:
+                confident += 1
+                confident_correct += hit
+            if not hit:
+                errors.append({"query": example["query"], "expected": expected, "predicted": prediction.domain, "confidence": round(prediction.confidence, 3)})
+            keyword_correct += _keyword_route(example["query"]) == expected
+
+        total = max(len(eval_examples), 1)
+        return {
+            "examples": len(eval_examples),
+            "accuracy": round(correct / total, 4),
+            "threshold": threshold,
+            "coverage_above_threshold": round(confident / total, 4),
+            "accuracy_above_threshold": round(confident_correct / max(confident, 1), 4),
+            "keyword_baseline_accuracy": round(keyword_correct / total, 4),
+            "route_latency_us": round(route_us, 2),
+            "confusion": {expected: dict(predicted) for expected, predicted in confusion.items()},
+            "errors": errors,
+        }
+
+
+def _keyword_route(query: str) -> Optional[str]:
+    """Best corpus by keyword hits over all corpora (baseline for the report)"""
+    text = f" {re.sub(r'[^a-z0-9]+', ' ', query.lower())} "
+    hits = {name: sum(1 for keyword in corpus.keywords if f" {keyword} " in text) for name, corpus in CORPORA.items()}
+    best = max(hits, key=hits.get)
+    return best if hits[best] else None
+
+
+domain_router = DomainRouter()
+
+
+if __name__ == "__main__":
+    from pinecone_service import pinecone_service
+
+    parser = argparse.ArgumentParser(description="Build the domain router centroids and report its accuracy")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute centroids even if they exist")
+    parser.add_argument("--threshold", type=float, default=None, help="Confidence threshold to report coverage at")
+    args = parser.parse_args()
+
+    examples = DomainRouter.load_examples()
+    if args.rebuild or not domain_router.load():
+        domain_router.build(pinecone_service.embeddings.embed_documents, examples["train"])
+    report = domain_router.evaluate(pinecone_service.embeddings.embed_documents, examples["eval"], args.threshold)
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,181 @@
+"""
+Local fake of the Gemini generateContent API with injectable latency and errors.
+
+Point the app at it with GEMINI_BASE_URL=http://localhost:8765 to exercise
+deadlines, hedging, retries and the circuit breaker without spending quota.
+
+Usage:
+  python fake_gemini.py serve [--port 8765] [--latency-ms 300] [--tail-prob 0.03] [--tail-ms 8000] [--error-rate 0.02]
+  python fake_gemini.py bench [--requests 300] [--concurrency 16] [same fault options]
+
+Faults can be changed while serving: curl -X POST localhost:8765/faults -d '{"error_rate": 0.9}'
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+
+
+class Faults(BaseModel):
+    latency_ms: float = 300.0
+    jitter_ms: float = 100.0
+    tail_prob: float = 0.03
+    tail_ms: float = 8000.0
+    error_rate: float = 0.0
+    error_code: int = 503
+    stream_chunks: int = 8
+    chunk_ms: float = 40.0
+
+
+faults = Faults()
+app = FastAPI()
+
+
+def _latency() -> float:
+    seconds = max(faults.latency_ms + random.uniform(-faults.jitter_ms, faults.jitter_ms), 0) / 1000
+    if random.random() < faults.tail_prob:
+        seconds += faults.tail_ms / 1000
+    return seconds
+
+
+def _sample(schema: Optional[Dict[str, Any]]) -> Any:
+    """Minimal value of a Gemini response schema so structured-output callers get valid JSON"""
+    kind = (schema or {}).get("type", "STRING").upper()
+    if kind == "OBJECT":
+        return {name: _sample(prop) for name, prop in (schema.get("properties") or {}).items()}
+    if kind == "ARRAY":
+        return []
+    if kind == "BOOLEAN":
+        return True
+    if kind in ("INTEGER", "NUMBER"):
+        return 0
+    return "fake"
+
+
+def _prompt_text(body: Dict) -> str:
+    parts = [part.get("text", "") for content in body.get("contents", []) for part in content.get("parts", [])]
+    return " ".join(parts).strip()
+
+
+def _answer_text(body: Dict) -> str:
+    generation_config = body.get("generationConfig") or {}
+    if generation_config.get("responseMimeType") == "application/json":
+        return json.dumps(_sample(generation_config.get("responseSchema")))
+    return f"Fake answer to: {_prompt_text(body)[:80]}"
+
+
+def _response(text: str, finished: bool = True) -> Dict:
+    candidate = {"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}
+    if finished:
+        candidate["finishReason"] = "STOP"
+    return {"candidates": [candidate], "usageMetadata": {"promptTokenCount": 10, "candidatesTokenCount": 10, "totalTokenCount": 20}}
+
+
+def _error() -> JSONResponse:
+    return JSONResponse(
+        status_code=faults.error_code,
+        content={"error": {"code": faults.error_code, "message": "Injected fault", "status": "UNAVAILABLE"}},
+    )
+
+
+@app.get("/faults")
+async def get_faults():
+    return faults
+
+
+@app.post("/faults")
+async def set_faults(request: Request):
+    global faults
+    faults = faults.model_copy(update=await request.json())
+    return faults
+
+
+@app.post("/{api_version}/models/{target}")
+async def generate(api_version: str, target: str, request: Request):
+    body = await request.json()
+    await asyncio.sleep(_latency())
+    if random.random() < faults.error_rate:
+        return _error()
+    text = _answer_text(body)
+    if not target.endswith(":streamGenerateContent"):
+        return _response(text)
+
+    async def events():
+        size = max(len(text) // max(faults.stream_chunks, 1), 1)
+        pieces = [text[i:i + size] for i in range(0, len(text), size)]
+        for index, piece in enumerate(pieces):
+            yield f"data: {json.dumps(_response(piece, finished=index == len(pieces) - 1))}\r\n\r\n"
+            await asyncio.sleep(faults.chunk_ms / 1000)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def serve(port: int) -> None:
+    import uvicorn
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def _percentiles(latencies: List[float]) -> Dict[str, float]:
+    ordered = sorted(latencies)
+    if not ordered:
+        return {}
+    pick = lambda q: round(ordered[min(int(q * len(ordered)), len(ordered) - 1)] * 1000, 1)
+    return {"p50_ms": pick(0.5), "p95_ms": pick(0.95), "p99_ms": pick(0.99), "max_ms": round(ordered[-1] * 1000, 1)}
+
+
+async def _bench_run(base_url: str, requests: int, concurrency: int, hedge: bool) -> Dict:
+    from config import settings
+    from ai_service.llm_client import GeminiClient
+
+    settings.LLM_HEDGE_ENABLED = hedge
+    # Leave slots for the hedges, as LLM_MAX_CONCURRENCY does above SCHEDULER_MAX_CONCURRENCY
+    client = GeminiClient(api_key="fake", base_url=base_url, max_concurrency=2 * concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(index: int):
+        nonlocal errors
+        async with semaphore:
+            started = time.monotonic()
+            try:
+                await client.generate(f"Question {index}: what is section 80C?")
+                latencies.append(time.monotonic() - started)
+            except Exception:
+                errors += 1
+
+    await asyncio.gather(*(one(index) for index in range(requests)))
+    return {"hedging": hedge, "requests": requests, "errors": errors, **_percentiles(latencies)}
+
+
+def bench(port: int, requests: int, concurrency: int) -> None:
+    threading.Thread(target=serve, args=(port,), daemon=True).start()
+    time.sleep(1.0)
+    base_url = f"http://127.0.0.1:{port}"
+    for hedge in (False, True):
+        print(json.dumps(asyncio.run(_bench_run(base_url, requests, concurrency, hedge))))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Gemini API with latency and error injection")
+    parser.add_argument("command", choices=["serve", "bench"])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=faults.latency_ms)
+    parser.add_argument("--tail-prob", type=float, default=faults.tail_prob)
+    parser.add_argument("--tail-ms", type=float, default=faults.tail_ms)
+    parser.add_argument("--error-rate", type=float, default=faults.error_rate)
+    parser.add_argument("--requests", type=int, default=300, help="bench: calls per run")
+    parser.add_argument("--concurrency", type=int, default=16, help="bench: concurrent calls")
+    args = parser.parse_args()
+
+    faults = Faults(latency_ms=args.latency_ms, tail_prob=args.tail_prob, tail_ms=args.tail_ms, error_rate=args.error_rate)
+    if args.command == "serve":
+        serve(args.port)
+    else:
+        bench(args.port, args.requests, args.concurrency)
@@ -0,0 +1,271 @@
+import asyncio
+import time
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from config import settings
+from app_logger.ai_service_logger import setup_logger
+from app_logger.metrics import metrics
+from app_logger.tracing import current_context, tracer
+from run_registry import run_registry
+
+logger = setup_logger("job_queue")
+
+# Runs one job to its final answer, publishing progress events on the job
+JobRunner = Callable[["Job"], Awaitable[Any]]
+
+# (client_id, session_id, mode, normalized query) of a question still waiting for its answer
+DedupKey = Tuple[str, Optional[str], Optional[str], str]
+
+FINISHED = ("done", "failed", "cancelled")
+
+submitted_total = metrics.counter("lawgpt_jobs_submitted_total", "Job submissions by outcome (accepted, deduplicated, rejected)")
+finished_total = metrics.counter("lawgpt_jobs_finished_total", "Jobs finished by status (done, failed, cancelled)")
+job_wait_seconds = metrics.histogram("lawgpt_jobs_wait_seconds", "Time jobs spent queued before a worker picked them up")
+job_run_seconds = metrics.histogram("lawgpt_jobs_run_seconds", "Time workers spent running a job")
+jobs_queued = metrics.gauge("lawgpt_jobs_queued", "Jobs waiting for a worker")
+jobs_retained = metrics.gauge("lawgpt_jobs_retained", "Jobs held in memory (pending and finished within their retention)")
+
+
+class JobRejected(Exception):
+    """Raised when a job cannot be queued (queue full)"""
+
+    def __init__(self, reason: str, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def dedup_key(client_id: str, session_id: Optional[str], query: str, mode: Optional[str]) -> DedupKey:
+    # Within a conversation the same words can be a different question, so sessions never share a job
+    return (client_id, session_id, mode, " ".join(query.lower().split()))
+
+
+class Job:
+    """
+    One legal question answered in the background.
+
+    Keeps every event of the run (stage, token, result, error, cancelled) so a
+    subscriber that connects late replays what it missed, and wakes the
+    subscribers on each new event.
+    """
+
+    def __init__(self, client_id: str, query: str, mode: Optional[str] = None, session_id: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.client_id = client_id
+        # Never part of the snapshot: anyone with the job ID may read that
+        self.session_id = session_id
+        self.query = query
+        self.mode = mode
+        self.status = "queued"
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.events: List[Dict[str, Any]] = []
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.expires_at: Optional[float] = None
+        self.changed = asyncio.Event()
+        # The run continues the trace of the request that submitted it
+        self.trace_context = current_context()
+        self.trace_id = self.trace_context.trace_id if self.trace_context is not None else None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    async def publish(self, event: Dict[str, Any]) -> None:
+        self.events.append(event)
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    async def follow(self, start: int = 0) -> AsyncIterator[Dict[str, Any]]:
+        """Events from index `start` on, live until the job finishes"""
+        index = start
+        while True:
+            changed = self.changed
+            while index < len(self.events):
+                yield self.events[index]
+                index += 1
+            if self.finished:
+                return
+            await changed.wait()
+
+    def snapshot(self) -> Dict[str, Any]:
+        stages = [event for event in self.events if event.get("type") == "stage"]
+        return {
+            "id": self.id,
+            "status": self.status,
+            "trace_id": self.trace_id,
+            "mode": self.mode,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "stage": stages[-1] if stages else None,
+            "events": len(self.events),
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobQueue:
+    """
+    Bounded in-process job queue with a worker pool for long-running questions.
+
+    Submitting returns a job at once; max_workers workers take jobs in FIFO
+    order and run them (through the request scheduler, as cancellable runs of
+    the run registry), recording stage events and the answer on the job.
+    At most max_queue_depth jobs wait; more are rejected. A question identical
+    to one the same client still has queued or running in the same session
+    returns that job instead of spending a second run on it. Finished jobs are kept for
+    result_ttl seconds, then dropped on the next access.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_queue_depth: Optional[int] = None, result_ttl: Optional[float] = None):
+        self.max_workers = max(1, max_workers or settings.JOB_WORKERS)
+        self.max_queue_depth = max(1, max_queue_depth or settings.JOB_QUEUE_MAX_DEPTH)
+        self.result_ttl = result_ttl or settings.JOB_RESULT_TTL_SECONDS
+        self.jobs: Dict[str, Job] = {}
+        self.pending: Dict[DedupKey, Job] = {}
+        self.queue: Optional[asyncio.Queue] = None
+        self.workers: List[asyncio.Task] = []
+        self.runner: Optional[JobRunner] = None
+
+    def start(self, runner: JobRunner) -> None:
+        """Start the worker pool on the running event loop"""
+        self.runner = runner
+        if self.queue is None:
+            self.queue = asyncio.Queue()
+        self.workers = [w for w in self.workers if not w.done()]
+        while len(self.workers) < self.max_workers:
+            self.workers.append(asyncio.get_running_loop().create_task(self._work()))
+
+    async def stop(self) -> None:
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    def submit(self, client_id: str, query: str, mode: Optional[str] = None, session_id: Optional[str] = None) -> Tuple[Job, bool]:
+        """
+        Queue a question, or return the client's identical one still pending.
+
+        Returns:
+            The job and whether it was newly queued
+
+        Raises:
+            JobRejected: The queue is full
+        """
+        self._sweep()
+        key = dedup_key(client_id, session_id, query, mode)
+        job = self.pending.get(key)
+        if job is not None and not job.finished:
+            submitted_total.inc(outcome="deduplicated")
+            return job, False
+        if self.queue is None:
+            raise JobRejected("unavailable", "Job workers are not running")
+        if self.queue.qsize() >= self.max_queue_depth:
+            submitted_total.inc(outcome="rejected")
+            raise JobRejected("queue_full", f"Job queue is full ({self.max_queue_depth} waiting)", retry_after=settings.REQUEST_DEADLINE_SECONDS / self.max_workers)
+        job = Job(client_id, query, mode, session_id=session_id)
+        self.jobs[job.id] = job
+        self.pending[key] = job
+        self.queue.put_nowait(job)
+        submitted_total.inc(outcome="accepted")
+        jobs_queued.set(self.queue.qsize())
+        jobs_retained.set(len(self.jobs))
+        logger.info(f"Queued job {job.id} for {client_id} ({self.queue.qsize()} waiting)")
+        return job, True
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._sweep()
+        return self.jobs.get(job_id)
+
+    async def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job; returns whether it was still pending"""
+        job = self.jobs.get(job_id)
+        if job is None or job.finished:
+            return False
+        if job.status == "queued":
+            # The worker skips it when it comes up
+            await self._finish(job, "cancelled", error="client_cancel")
+            return True
+        return run_registry.cancel(job.client_id, "client_cancel", request_id=job.id)
+
+    async def _work(self) -> None:
+        while True:
+            job = await self.queue.get()
+            jobs_queued.set(self.queue.qsize())
+            try:
+                if not job.finished:
+                    await self._run(job)
+            except asyncio.CancelledError:
+                if not job.finished:
+                    await self._finish(job, "cancelled", error="shutdown")
+                raise
+            except Exception as e:
+                logger.error(f"Job {job.id} failed in its worker: {str(e)}")
+            finally:
+                self.queue.task_done()
+
+    async def _run(self, job: Job) -> None:
+        job.status = "running"
+        job.started_at = time.time()
+        job_wait_seconds.observe(job.started_at - job.created_at)
+        with tracer.span("job", parent=job.trace_context, root=True, attributes={"job.id": job.id, "client_id": job.client_id, "mode": job.mode}) as span:
+            span.set_attribute("job.wait_ms", round((job.started_at - job.created_at) * 1000, 2))
+            job.trace_id = span.trace_id
+            await job.publish({"type": "processing", "trace_id": job.trace_id, "message": "Processing your legal question..."})
+            run = run_registry.start(job.client_id, self.runner(job), request_id=job.id)
+            try:
+                result = await asyncio.shield(run)
+            except asyncio.CancelledError:
+                if not run.cancelled():
+                    # The worker itself is being cancelled; take the run down with it
+                    run.cancel()
+                    raise
+                span.status = "cancelled"
+                await self._finish(job, "cancelled", error="client_cancel")
+            except Exception as e:
+                span.record_exception(e)
+                await self._finish(job, "failed", error=str(e))
+            else:
+                await self._finish(job, "done", result=result)
+
+    async def _finish(self, job: Job, status: str, result: Any = None, error: Optional[str] = None) -> None:
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = time.time()
+        job.expires_at = time.monotonic() + self.result_ttl
+        key = dedup_key(job.client_id, job.session_id, job.query, job.mode)
+        if self.pending.get(key) is job:
+            del self.pending[key]
+        if job.started_at is not None:
+            job_run_seconds.observe(job.finished_at - job.started_at)
+        finished_total.inc(status=status)
+        if status == "done":
+            await job.publish({"type": "result", "response": result})
+        elif status == "failed":
+            await job.publish({"type": "error", "message": f"Error processing request: {error}"})
+        else:
+            await job.publish({"type": "cancelled", "reason": error})
+        logger.info(f"Job {job.id} {status}")
+
+    def _sweep(self) -> None:
+        """Drop finished jobs past their retention"""
+        now = time.monotonic()
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.expires_at is not None and job.expires_at <= now]:
+            del self.jobs[job_id]
+        jobs_retained.set(len(self.jobs))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+            "running": sum(1 for job in self.jobs.values() if job.status == "running"),
+            "retained": len(self.jobs),
+            "max_workers": self.max_workers,
+            "max_queue_depth": self.max_queue_depth,
+        }
+
+
+job_queue = JobQueue()
@@ -1,20 +1,33 @@
 import re
 import spacy
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
+
+# Matches the opening line of a section in the Act, e.g.
+# "# 10. Incomes not included in total income.—In computing ..." or
+# "4[80C. Deduction in respect of life insurance premia, ... (title may wrap)
+#  ... etc.—(1) ..." while skipping amendment footnotes ("1. Ins. by Act ...")
+SECTION_HEADING_PATTERN = re.compile(
+    r"^(?:#\s*)?(?:\d+\[)?(?P<section>\d+[A-Z]*(?:-[A-Z]+)?)\.\s+"
+    r"(?!(?:Ins|Subs|Omitted|Restored|Section \d+|The (?:letter|heading|sub-heading|word))\b)"
+    r"(?P<title>[^\n]{3,300}?(?:\n[^\n]{0,200}?)?)\.\s?[—–-]",
+    re.MULTILINE,
+)
 
 class LegalDocumentChunker:
-    def __init__(self, window_size=3, overlap=1, max_chunk_size=500):
+    def __init__(self, window_size=3, overlap=1, max_chunk_size=500, child_max_chunk_size=128):
         """
         Initialize the chunker with spaCy model and configuration
         window_size: Number of sentences to include in each chunk
         overlap: Number of sentences to overlap between chunks
         max_chunk_size: Maximum number of tokens in a chunk
+        child_max_chunk_size: Maximum number of tokens in a child chunk (small-to-big mode)
         """
         self.nlp = spacy.load("en_core_web_lg")
         self.nlp.max_length = 100000  # Set a reasonable chunk size for spaCy
         self.window_size = window_size
         self.overlap = overlap
         self.max_chunk_size = max_chunk_size
+        self.child_max_chunk_size = child_max_chunk_size
 
     def initial_split(self, content: str, max_length=90000) -> List[str]:
         """Split content into processable chunks based on paragraphs.
@@ -77,12 +90,13 @@ class LegalDocumentChunker:
         
         return chunks
 
-    def _split_oversized_sentence(self, sentence: str) -> List[str]:
+    def _split_oversized_sentence(self, sentence: str, max_chunk_size: Optional[int] = None) -> List[str]:
         """Split a single sentence that exceeds max chunk size"""
+        max_chunk_size = max_chunk_size or self.max_chunk_size
         chunks = []
         words = sentence.split()
-        for i in range(0, len(words), self.max_chunk_size):
-            chunks.append(' '.join(words[i:i+self.max_chunk_size]))
+        for i in range(0, len(words), max_chunk_size):
+            chunks.append(' '.join(words[i:i+max_chunk_size]))
         return chunks
 
     def _find_optimal_split(self, window: List[str]) -> int:
@@ -105,8 +119,9 @@ class LegalDocumentChunker:
         
         return self._postprocess_chunks(final_chunks)
 
-    def _postprocess_chunks(self, chunks: List[str]) -> List[str]:
+    def _postprocess_chunks(self, chunks: List[str], max_chunk_size: Optional[int] = None) -> List[str]:
         # Improved merging logic
+        max_chunk_size = max_chunk_size or self.max_chunk_size
         merged = []
         current_chunk = []
         current_token_count = 0
@@ -115,7 +130,7 @@ class LegalDocumentChunker:
             chunk_tokens = chunk.split()
             chunk_token_count = len(chunk_tokens)
             
-            if current_token_count + chunk_token_count <= self.max_chunk_size:
+            if current_token_count + chunk_token_count <= max_chunk_size:
                 current_chunk.append(chunk)
                 current_token_count += chunk_token_count
             else:
@@ -126,13 +141,70 @@ class LegalDocumentChunker:
         
         if current_chunk:
             final_chunk = ' '.join(current_chunk)
-            if len(final_chunk.split()) > self.max_chunk_size:
-                merged.extend(self._split_oversized_sentence(final_chunk))
+            if len(final_chunk.split()) > max_chunk_size:
+                merged.extend(self._split_oversized_sentence(final_chunk, max_chunk_size))
             else:
                 merged.append(final_chunk)
                 
         return merged
 
+    def split_sections(self, content: str, document_id: str) -> List[Dict[str, str]]:
+        """
+        Split the Act into its sections using the section headings.
+
+        Text before the first heading (arrangement of sections, preamble) is kept
+        as a "preamble" section so that nothing is dropped from the parent store.
+
+        Returns:
+            List of sections with parent_id, section_id, title and text
+        """
+        matches = list(SECTION_HEADING_PATTERN.finditer(content))
+        sections = []
+        boundaries = [0] + [m.start() for m in matches] + [len(content)]
+        labels = [("preamble", "Preamble")] + [(m.group("section"), " ".join(m.group("title").split())) for m in matches]
+
+        seen: Dict[str, int] = {}
+        for (section_id, title), start, end in zip(labels, boundaries[:-1], boundaries[1:]):
+            text = content[start:end].strip()
+            if not text:
+                continue
+            # Sections are sometimes re-numbered or repeated (omitted/inserted), keep ids unique
+            seen[section_id] = seen.get(section_id, 0) + 1
+            suffix = f"-{seen[section_id]}" if seen[section_id] > 1 else ""
+            sections.append({
+                "parent_id": f"{document_id}-section-{section_id}{suffix}",
+                "section_id": section_id,
+                "title": title,
+                "text": text,
+            })
+        return sections
+
+    def chunk_document_hierarchical(self, content: str, document_id: str) -> Tuple[List[Dict[str, str]], List[Dict[str, str]]]:
+        """
+        Chunk a document for small-to-big retrieval.
+
+        Sections become parents; each section is split into small child chunks
+        (at most child_max_chunk_size tokens) that carry the id of their parent.
+
+        Returns:
+            Tuple of (parents, children)
+        """
+        parents = self.split_sections(content, document_id)
+        children = []
+        for parent in parents:
+            window_chunks = []
+            for block in self.initial_split(parent["text"]):
+                window_chunks.extend(self.process_chunk(block))
+            for chunk in self._postprocess_chunks(window_chunks, self.child_max_chunk_size):
+                if not chunk.strip():
+                    continue
+                children.append({
+                    "text": chunk,
+                    "parent_id": parent["parent_id"],
+                    "section_id": parent["section_id"],
+                })
+        return parents, children
+
     def save_chunks(self, chunks: List[str], filename: str):
         """Save chunks to file with separation boundaries"""
         with open(filename, 'w') as f:
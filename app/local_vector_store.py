@@ -0,0 +1,242 @@
+import argparse
+import json
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from config import settings
+from vector_quantization import create_quantizer
+
+
+class LocalVectorStore:
+    """
+    On-disk vector store used when VECTOR_BACKEND=local.
+
+    Exposes the subset of the LangChain vector store interface PineconeService
+    relies on (add_documents / similarity_search_with_score). Full float32
+    vectors are kept in a .npy file that is memory-mapped, never loaded; only
+    the compressed codes (int8 or product-quantized) are held in memory.
+
+    Search runs in two phases: an approximate scan over the codes picks a
+    shortlist of top_k * rescore_factor candidates, which are then re-scored
+    exactly against their full vectors read from the memory map.
+    """
+
+    def __init__(self, embedding, path: Optional[str] = None, compression: Optional[str] = None, pq_subvectors: Optional[int] = None, rescore_factor: Optional[int] = None):
+        self.embedding = embedding
+        self.path = path or settings.LOCAL_VECTOR_STORE_PATH
+        self.compression = compression if compression is not None else settings.VECTOR_COMPRESSION
+        self.rescore_factor = rescore_factor or settings.VECTOR_RESCORE_FACTOR
+        self.quantizer = create_quantizer(self.compression, pq_subvectors or settings.PQ_SUBVECTORS)
+
+        self.documents: List[Dict] = []
+        self.vectors: Optional[np.ndarray] = None  # memory-mapped float32 vectors
+        self.codes: Optional[np.ndarray] = None
+        self._load()
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.path, "vectors.npy")
+
+    @property
+    def _documents_path(self) -> str:
+        return os.path.join(self.path, "documents.json")
+
+    @property
+    def _codes_path(self) -> str:
+        return os.path.join(self.path, f"codes_{self.compression}.npz")
+
+    def _load(self) -> None:
+        """Load documents, memory-map full vectors and load (or build) the codes"""
+        if not os.path.exists(self._documents_path):
+            return
+        with open(self._documents_path, "r", encoding="utf-8") as f:
+            self.documents = json.load(f)
+        self.vectors = np.load(self._vectors_path, mmap_mode="r")
+
+        if self.quantizer is None:
+            return
+        if os.path.exists(self._codes_path):
+            state = dict(np.load(self._codes_path))
+            self.codes = state.pop("codes")
+            self.quantizer.load_state(state)
+        else:
+            self._build_codes()
+
+    def _build_codes(self) -> None:
+        """Train the quantizer on the stored vectors and persist the codes"""
+        vectors = np.asarray(self.vectors, dtype=np.float32)
+        self.quantizer.train(vectors)
+        self.codes = self.quantizer.encode(vectors)
+        np.savez(self._codes_path, codes=self.codes, **self.quantizer.state())
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1.0)
+
+    def add_documents(self, documents: List[Document]) -> List[str]:
+        """Embed and append documents, then rebuild the compressed codes"""
+        os.makedirs(self.path, exist_ok=True)
+        new_vectors = self._normalize(np.asarray(
+            self.embedding.embed_documents([doc.page_content for doc in documents]), dtype=np.float32
+        ))
+        vectors = new_vectors if self.vectors is None else np.concatenate([np.asarray(self.vectors), new_vectors])
+
+        ids = []
+        for doc in documents:
+            doc_id = str(len(self.documents))
+            self.documents.append({"id": doc_id, "page_content": doc.page_content, "metadata": doc.metadata})
+            ids.append(doc_id)
+
+        np.save(self._vectors_path, vectors)
+        with open(self._documents_path, "w", encoding="utf-8") as f:
+            json.dump(self.documents, f, ensure_ascii=False)
+        # Stale codes for every compression mode are invalid now
+        for name in os.listdir(self.path):
+            if name.startswith("codes_"):
+                os.remove(os.path.join(self.path, name))
+
+        self.vectors = np.load(self._vectors_path, mmap_mode="r")
+        if self.quantizer is not None:
+            self._build_codes()
+        return ids
+
+    def search_by_vector(self, query_vector: List[float], k: int = 12) -> List[Tuple[int, float]]:
+        """
+        Two-phase search for the k most similar vectors.
+
+        Returns:
+            List of (row, cosine similarity) in descending order of similarity
+        """
+        if self.vectors is None or not len(self.documents):
+            return []
+        query = self._normalize(np.asarray(query_vector, dtype=np.float32))
+        k = min(k, len(self.documents))
+
+        if self.quantizer is None:
+            candidates = np.arange(len(self.documents))
+        else:
+            approximate = self.quantizer.inner_product(self.codes, query)
+            shortlist = min(len(approximate), k * self.rescore_factor)
+            candidates = np.argpartition(-approximate, shortlist - 1)[:shortlist]
+
+        # Exact re-scoring; sorted indices keep memory-map reads sequential
+        candidates = np.sort(candidates)
+        exact = np.asarray(self.vectors[candidates], dtype=np.float32) @ query
+        order = np.argsort(-exact)[:k]
+        return [(int(candidates[i]), float(exact[i])) for i in order]
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 12) -> List[Tuple[Document, float]]:
+        """
+        Search by a precomputed query embedding.
+
+        Returns:
+            List of (Document, cosine similarity), most similar first, like Pinecone on a cosine index
+        """
+        return [
+            (Document(page_content=self.documents[row]["page_content"], metadata=self.documents[row]["metadata"]), score)
+            for row, score in self.search_by_vector(embedding, k)
+        ]
+
+    def similarity_search_with_score(self, query: str, k: int = 12) -> List[Tuple[Document, float]]:
+        """Search by query text (see similarity_search_by_vector_with_score)"""
+        return self.similarity_search_by_vector_with_score(self.embedding.embed_query(query), k)
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Bytes held in memory for search versus the uncompressed float32 baseline"""
+        count = len(self.documents)
+        dimension = self.vectors.shape[1] if self.vectors is not None else 0
+        baseline = count * dimension * 4
+        in_memory = baseline if self.quantizer is None else int(self.codes.nbytes + self.quantizer.nbytes())
+        return {
+            "vectors": count,
+            "dimension": dimension,
+            "float32_bytes": baseline,
+            "in_memory_bytes": in_memory,
+            "compression_ratio": round(baseline / in_memory, 2) if in_memory else 0.0,
+        }
+
+    def evaluate(self, queries: List[str], k: int = 12) -> Dict[str, float]:
+        """
+        Report recall@k and latency against exact search over the uncompressed vectors.
+
+        Args:
+            queries: Sample queries to evaluate with
+            k: Number of results per query
+
+        Returns:
+            Recall, mean latencies and memory figures
+        """
+        query_vectors = [self.embedding.embed_query(q) for q in queries]
+        full = np.asarray(self.vectors, dtype=np.float32)
+        recall_total = 0.0
+        exact_time = approximate_time = 0.0
+
+        for query_vector in query_vectors:
+            query = self._normalize(np.asarray(query_vector, dtype=np.float32))
+            start = time.perf_counter()
+            truth = set(np.argsort(-(full @ query))[:k].tolist())
+            exact_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            found = {row for row, _ in self.search_by_vector(query_vector, k)}
+            approximate_time += time.perf_counter() - start
+            recall_total += len(truth & found) / max(len(truth), 1)
+
+        count = max(len(query_vectors), 1)
+        return {
+            "compression": self.compression or "none",
+            f"recall@{k}": round(recall_total / count, 4),
+            "exact_ms": round(exact_time / count * 1000, 3),
+            "two_phase_ms": round(approximate_time / count * 1000, 3),
+            **self.memory_usage(),
+        }
+
+
+class NamespacedLocalVectorStore:
+    """
+    Local counterpart of Pinecone namespaces: one LocalVectorStore (shard) per
+    namespace, each in its own sub-directory of LOCAL_VECTOR_STORE_PATH.
+    """
+
+    DEFAULT_NAMESPACE = "__default__"
+
+    def __init__(self, embedding, path: Optional[str] = None):
+        self.embedding = embedding
+        self.path = path or settings.LOCAL_VECTOR_STORE_PATH
+        self.shards: Dict[str, LocalVectorStore] = {}
+
+    def shard(self, namespace: Optional[str] = None) -> LocalVectorStore:
+        name = namespace or self.DEFAULT_NAMESPACE
+        if name not in self.shards:
+            self.shards[name] = LocalVectorStore(self.embedding, path=os.path.join(self.path, name))
+        return self.shards[name]
+
+    def add_documents(self, documents: List[Document], namespace: Optional[str] = None) -> List[str]:
+        return self.shard(namespace).add_documents(documents)
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 12, namespace: Optional[str] = None) -> List[Tuple[Document, float]]:
+        return self.shard(namespace).similarity_search_by_vector_with_score(embedding, k)
+
+    def similarity_search_with_score(self, query: str, k: int = 12, namespace: Optional[str] = None) -> List[Tuple[Document, float]]:
+        return self.shard(namespace).similarity_search_with_score(query, k)
+
+
+if __name__ == "__main__":
+    from pinecone_service import pinecone_service
+
+    parser = argparse.ArgumentParser(description="Report recall and memory of compressed local vectors against float32")
+    parser.add_argument("-q", "--queries", required=True, help="Text file with one sample query per line")
+    parser.add_argument("-k", "--top-k", type=int, default=12)
+    parser.add_argument("-c", "--compression", nargs="+", default=["int8", "pq"], help="Compression modes to compare")
+    parser.add_argument("-n", "--namespace", default=NamespacedLocalVectorStore.DEFAULT_NAMESPACE, help="Shard to evaluate")
+    args = parser.parse_args()
+
+    with open(args.queries, "r", encoding="utf-8") as f:
+        sample_queries = [line.strip() for line in f if line.strip()]
+
+    for mode in args.compression:
+        store = LocalVectorStore(pinecone_service.embeddings, path=os.path.join(settings.LOCAL_VECTOR_STORE_PATH, args.namespace), compression=mode)
+        print(json.dumps(store.evaluate(sample_queries, args.top_k)))
@@ -1,11 +1,26 @@
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi import websockets
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from pinecone_service import pinecone_service
-from paralegals.tax import legal_paralegal
+from search_router import search_router
+from paralegals.tax import PARALEGAL_MODES, legal_paralegal, stop_runtime_logging
+from paralegals.session_store import issue_session_id, verify_session_id
+from request_scheduler import AdmissionRejected, parse_deadline, request_scheduler
+from run_registry import run_registry
+from cache_store import cache_store
+from job_queue import Job, JobRejected, job_queue
+from config import settings
+from app_logger.metrics import metrics
+from app_logger.middleware import trace_request_middleware
+from app_logger.exception_handlers import request_validation_exception_handler, unhandled_exception_handler
+from app_logger.tracing import tracer
 from ai_service.agent_schema import AgentResponse
+import asyncio
+import functools
 import os
-from typing import Dict
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
 import uuid
 import json
 from fastapi.middleware.cors import CORSMiddleware
@@ -21,6 +36,52 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def start_cache_compaction():
+    # Expired and over-quota cache entries are dropped in the background
+    cache_store.start()
+
+@app.on_event("shutdown")
+async def stop_cache_compaction():
+    await cache_store.stop()
+
+@app.on_event("startup")
+async def start_job_workers():
+    job_queue.start(run_job)
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    await job_queue.stop()
+
+http_request_seconds = metrics.histogram("lawgpt_http_request_seconds", "HTTP request latency by method, route and status (streamed bodies count until the headers are sent)")
+websockets_active = metrics.gauge("lawgpt_websockets_active", "Open /ws/legal websocket connections")
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label with the route template, not the path, so job IDs do not explode the series
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        http_request_seconds.observe(time.perf_counter() - started, method=request.method, route=route, status=status)
+
+# Every request is the root span of a trace (added last, so it wraps the other middleware)
+app.middleware("http")(trace_request_middleware)
+app.add_exception_handler(RequestValidationError, request_validation_exception_handler)
+app.add_exception_handler(Exception, unhandled_exception_handler)
+
+@app.on_event("shutdown")
+async def flush_traces():
+    tracer.shutdown()
+
+@app.on_event("shutdown")
+async def stop_agent_logging():
+    stop_runtime_logging()
+
 # Store active websocket connections
 active_connections: Dict[str, WebSocket] = {}
 
@@ -28,9 +89,14 @@ class ChatMessage(BaseModel):
     content: str
     user_id: str
 
+class JobRequest(BaseModel):
+    query: str
+    mode: Optional[str] = None
+
 class VectorQuery(BaseModel):
     query: str
     top_k: int = 12
+    domains: Optional[List[str]] = None
 
 @app.post("/chat")
 async def chat_endpoint(message: ChatMessage):
@@ -41,31 +107,237 @@ async def chat_endpoint(message: ChatMessage):
 async def vector_search(query: VectorQuery):
     try:
         print(query.query)
-        results = pinecone_service.semantic_search(query.query, query.top_k)
+        results = await search_router.search(query.query, query.top_k, domains=query.domains)
         print("results=====================================================================================", results)
         return results
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) 
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.post("/ask")
-async def ask_endpoint(query: str) -> AgentResponse:
-    """Endpoint for any legal questions (handles all domains)"""
+async def ask_endpoint(request: Request, response: Response, query: str, mode: Optional[str] = None) -> AgentResponse:
+    """
+    Endpoint for any legal questions (handles all domains).
+
+    The conversation continues under the session ID sent back in the
+    x-session-id header and session cookie; a request without one starts a
+    new conversation.
+    """
+    check_mode(mode)
+    client_id = request_client_id(request)
+    session_id = request_session_id(request) or issue_session_id()
+    attach_session(response, session_id)
+    async def answer():
+        async with request_scheduler.slot(client_id):
+            return await legal_paralegal.ask_legal_paralegal(query, mode=mode, session_id=session_id)
+
     try:
-        response = await legal_paralegal.ask_legal_paralegal(query)
-        return response.message
+        # Stop spending LLM quota on the answer as soon as the caller hangs up
+        answered = await run_registry.run_until_disconnected(client_id, answer(), request.is_disconnected)
+        return answered.message
+    except AdmissionRejected as e:
+        headers = {"Retry-After": str(int(e.retry_after) + 1)} if e.retry_after is not None else None
+        raise HTTPException(status_code=503, detail=str(e), headers=headers)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+def check_mode(mode: Optional[str]) -> None:
+    if mode is not None and mode not in PARALEGAL_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown mode {mode!r}: expected one of {', '.join(PARALEGAL_MODES)}")
+
+def request_client_id(request: Request) -> str:
+    """Who the scheduler queues the request under (fairness only, never conversation state)"""
+    return request.headers.get("x-client-id") or (request.client.host if request.client else "anonymous")
+
+SESSION_COOKIE = "lawgpt_session"
+
+def request_session_id(request: Request) -> Optional[str]:
+    """The server-issued session ID the caller sent back (header or cookie), if valid"""
+    return verify_session_id(request.headers.get("x-session-id") or request.cookies.get(SESSION_COOKIE))
+
+def attach_session(response: Response, session_id: str) -> None:
+    response.headers["x-session-id"] = session_id
+    response.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite="lax")
+
+async def run_job(job: Job):
+    """Answer one background job, its stage events and tokens recorded on the job"""
+    async with request_scheduler.slot(job.client_id):
+        response = await legal_paralegal.ask_legal_paralegal(
+            job.query, mode=job.mode, on_event=job.publish, session_id=job.session_id
+        )
+    # ask_legal_paralegal reports failures as an apology answer; the job must still end as failed
+    error = (getattr(response, "agent_history", None) or {}).get("error")
+    if error:
+        raise RuntimeError(error)
+    return response.message if hasattr(response, "message") else response
+
+@app.post("/jobs", status_code=202)
+async def submit_job(request: Request, job_request: JobRequest):
+    """
+    Queue a legal question and return its job ID at once.
+
+    Poll GET /jobs/{id} or subscribe to GET /jobs/{id}/events for stage
+    updates and the answer. An identical question the client still has
+    pending in the same session returns the existing job (200 instead of
+    202). Sessions work as for /ask.
+    """
+    if not job_request.query:
+        raise HTTPException(status_code=400, detail="No query provided")
+    check_mode(job_request.mode)
+    session_id = request_session_id(request) or issue_session_id()
+    try:
+        job, created = job_queue.submit(request_client_id(request), job_request.query, mode=job_request.mode, session_id=session_id)
+    except JobRejected as e:
+        headers = {"Retry-After": str(int(e.retry_after) + 1)} if e.retry_after is not None else None
+        raise HTTPException(status_code=503, detail=str(e), headers=headers)
+    response = JSONResponse(
+        {"id": job.id, "status": job.status, "deduplicated": not created},
+        status_code=202 if created else 200,
+        headers={"Location": f"/jobs/{job.id}"},
+    )
+    attach_session(response, session_id)
+    return response
+
+def find_job(job_id: str) -> Job:
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found or expired")
+    return job
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status, latest stage and (once finished) the answer or error of a job"""
+    return find_job(job_id).snapshot()
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(request: Request, job_id: str):
+    """
+    Server-sent events of a job: past events first, then live ones until it finishes.
+
+    Each event's id is its index, so a reconnecting client resumes with Last-Event-ID.
+    """
+    job = find_job(job_id)
+    last_event_id = request.headers.get("last-event-id")
+    start = int(last_event_id) + 1 if last_event_id and last_event_id.isdigit() else 0
+
+    async def stream():
+        index = start
+        async for event in job.follow(start):
+            yield f"id: {index}\nevent: {event.get('type', 'message')}\ndata: {json.dumps(event)}\n\n"
+            index += 1
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job"""
+    job = find_job(job_id)
+    cancelled = await job_queue.cancel(job_id)
+    return {"id": job.id, "status": job.status, "cancelled": cancelled}
+
+async def answer_query(send: Callable[[dict], Awaitable[None]], client_id: str, session_id: str, request_data: dict):
+    """Answer one websocket question; runs as a cancellable run, its events sent through `send`"""
+    # Each question is its own trace; the client gets its ID to quote in bug reports
+    with tracer.span("WS question", kind="server", root=True, attributes={"client_id": client_id, "mode": request_data.get("mode")}) as span:
+        await answer_traced_query(send, client_id, session_id, request_data, span.trace_id)
+
+async def answer_traced_query(send: Callable[[dict], Awaitable[None]], client_id: str, session_id: str, request_data: dict, trace_id: str):
+    query = request_data["query"]
+    try:
+        # Send acknowledgment that processing has started
+        await send({
+            "type": "processing",
+            "trace_id": trace_id,
+            "message": "Processing your legal question..."
+        })
+
+        # Tell the client where it is in the queue when the server is busy
+        async def send_queued(position: int, estimated_wait: float):
+            await send({
+                "type": "queued",
+                "position": position,
+                "estimated_wait_s": round(estimated_wait, 1)
+            })
+
+        # Process the query once the scheduler admits it, streaming stage events and answer tokens
+        try:
+            async with request_scheduler.slot(client_id, deadline=parse_deadline(request_data.get("deadline")), on_queued=send_queued):
+                response = await legal_paralegal.ask_legal_paralegal(
+                    query, mode=request_data.get("mode"), on_event=send, session_id=session_id
+                )
+        except AdmissionRejected as e:
+            await send({
+                "type": "error",
+                "reason": e.reason,
+                "retry_after": e.retry_after,
+                "message": str(e)
+            })
+            return
+
+        # Handle either string or AgentResponse
+        response_content = response
+        if hasattr(response, "message"):
+            response_content = response.message
+
+        # Send the final response
+        await send({
+            "type": "result",
+            "trace_id": trace_id,
+            "response": response_content
+        })
+    except Exception as e:
+        print(f"Error processing request: {str(e)}")
+        try:
+            await send({
+                "type": "error",
+                "trace_id": trace_id,
+                "message": f"Error processing request: {str(e)}"
+            })
+        except Exception:
+            pass
+
 @app.websocket("/ws/legal/{client_id}")
 async def legal_websocket_endpoint(websocket: WebSocket, client_id: str):
-    """WebSocket endpoint for legal questions with real-time responses"""
+    """
+    WebSocket endpoint for legal questions with real-time responses.
+
+    Each question runs as its own cancellable run while this loop keeps
+    reading the socket. Questions carrying a "request_id" run concurrently, up
+    to WS_MAX_CONCURRENT_QUERIES per connection, and every event of a run
+    (processing, queued, stage, token, result, error, cancelled) is tagged
+    with its request_id; processing, result and error events also carry the
+    question's trace_id. {"type": "cancel", "request_id": ...} cancels one run
+    (all of them without an ID), a question reusing a running ID (or any new
+    question from a client without IDs) supersedes it, and a disconnect
+    cancels everything, freeing scheduler slots and LLM calls at once.
+
+    The conversation lives in a server-issued session announced in
+    connection_established; reconnecting with ?session_id=... resumes it.
+    """
+    session_id = verify_session_id(websocket.query_params.get("session_id")) or issue_session_id()
     await websocket.accept()
     active_connections[client_id] = websocket
+    websockets_active.inc()
+    runs: Dict[Optional[str], asyncio.Task] = {}
+    send_lock = asyncio.Lock()
+
+    async def send(message: dict, request_id: Optional[str] = None):
+        # Runs share the socket: tag their events and never interleave two frames
+        if request_id is not None:
+            message = {**message, "request_id": request_id}
+        async with send_lock:
+            await websocket.send_json(message)
     
     try:
         # Send initial connection confirmation
-        await websocket.send_json({
+        await send({
             "type": "connection_established",
             "client_id": client_id,
+            "session_id": session_id,
             "message": "Connected to legal paralegal service"
         })
         
@@ -73,50 +345,70 @@ async def legal_websocket_endpoint(websocket: WebSocket, client_id: str):
             data = await websocket.receive_text()
             try:
                 request_data = json.loads(data)
+                request_id = request_data.get("request_id")
+                request_id = str(request_id) if request_id is not None else None
+                for finished in [rid for rid, task in runs.items() if task.done()]:
+                    del runs[finished]
+
+                if request_data.get("type") == "cancel":
+                    targets = [request_id] if "request_id" in request_data else list(runs)
+                    for rid in targets:
+                        task = runs.pop(rid, None)
+                        if task is not None and run_registry.cancel(client_id, "client_cancel", request_id=rid, task=task):
+                            await send({"type": "cancelled", "reason": "client_cancel"}, rid)
+                    continue
+
                 query = request_data.get("query", "")
                 print(f"Received query from client {client_id}: {query}")
                 
                 if not query:
-                    await websocket.send_json({
+                    await send({
                         "type": "error",
                         "message": "No query provided"
-                    })
+                    }, request_id)
                     continue
-                
-                # Send acknowledgment that processing has started
-                await websocket.send_json({
-                    "type": "processing",
-                    "message": "Processing your legal question..."
-                })
-                
-                # Initialize context variables with client_id for session tracking
-                context_variables = {"chat_id": client_id}
-                
-                # Process the query
-                response = await legal_paralegal.ask_legal_paralegal(query)
-                
-                # Handle either string or AgentResponse
-                response_content = response
-                if hasattr(response, "message"):
-                    response_content = response.message
-                
-                # Send the final response
-                await websocket.send_json({
-                    "type": "result",
-                    "response": response_content
-                })
+
+                try:
+                    parse_deadline(request_data.get("deadline"))
+                except ValueError as e:
+                    await send({
+                        "type": "error",
+                        "reason": "invalid_deadline",
+                        "message": str(e)
+                    }, request_id)
+                    continue
+
+                mode = request_data.get("mode")
+                if mode is not None and mode not in PARALEGAL_MODES:
+                    await send({
+                        "type": "error",
+                        "reason": "invalid_mode",
+                        "message": f"Unknown mode {mode!r}: expected one of {', '.join(PARALEGAL_MODES)}"
+                    }, request_id)
+                    continue
+
+                if request_id not in runs and len(runs) >= settings.WS_MAX_CONCURRENT_QUERIES:
+                    await send({
+                        "type": "error",
+                        "reason": "too_many_queries",
+                        "message": f"At most {settings.WS_MAX_CONCURRENT_QUERIES} questions can run at once on one connection"
+                    }, request_id)
+                    continue
+
+                # A newer question under the same ID supersedes the one still being answered
+                if request_id in runs and run_registry.cancel(client_id, "superseded", request_id=request_id, task=runs[request_id]):
+                    await send({"type": "cancelled", "reason": "superseded"}, request_id)
+                runs[request_id] = run_registry.start(
+                    client_id,
+                    answer_query(functools.partial(send, request_id=request_id), client_id, session_id, request_data),
+                    request_id=request_id,
+                )
                 
             except json.JSONDecodeError:
-                await websocket.send_json({
+                await send({
                     "type": "error",
                     "message": "Invalid JSON format"
                 })
-            except Exception as e:
-                print(f"Error processing request: {str(e)}")
-                await websocket.send_json({
-                    "type": "error",
-                    "message": f"Error processing request: {str(e)}"
-                })
                 
     except WebSocketDisconnect:
         if client_id in active_connections:
@@ -130,6 +422,11 @@ async def legal_websocket_endpoint(websocket: WebSocket, client_id: str):
                 "message": f"Server error: {str(e)}"
             })
             del active_connections[client_id]
+    finally:
+        websockets_active.dec()
+        # Nobody is left to read the answers
+        for request_id, task in runs.items():
+            run_registry.cancel(client_id, "disconnect", request_id=request_id, task=task)
 
 # Commented out POST endpoints as they are replaced by WebSocket
 # @app.post("/ask")
@@ -0,0 +1,187 @@
+"""
+Offline job: mine the Income-tax Act into the term dictionary used by query_rewriter.
+
+Sources in the Act:
+  * the arrangement of sections (section titles) -> phrase -> section hints, and the
+    section numbers themselves
+  * section 2 definitions -> defined term -> section 2(clause)
+  * acronyms written out in the Act ("Electronic Hardware Technology Park (EHTP)")
+    plus a curated list of common tax acronyms, kept only if their expansion
+    actually occurs in the Act; they carry no section hints, since the titles
+    mentioning an expansion are rarely about it ("tax deducted at source" is
+    in the title of 200A, on processing TDS statements)
+
+Usage: python mine_terms.py [--source income_tax_act_1961.md] [--output term_dictionary.json]
+"""
+import argparse
+import json
+import re
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+from config import settings
+from query_rewriter import STOPWORDS, normalize_tokens
+
+# Acronyms users type that the Act itself spells out in full
+SEED_ACRONYMS = {
+    "tds": "tax deducted at source",
+    "tcs": "tax collected at source",
+    "pan": "permanent account number",
+    "tan": "tax deduction and collection account number",
+    "hra": "house rent allowance",
+    "lta": "leave travel concession",
+    "huf": "hindu undivided family",
+    "ay": "assessment year",
+    "py": "previous year",
+    "ao": "assessing officer",
+    "cbdt": "central board of direct taxes",
+    "itat": "appellate tribunal",
+    "ltcg": "long-term capital gains",
+    "stcg": "short-term capital gains",
+    "elss": "equity linked savings scheme",
+    "nsc": "national savings certificates",
+    "ppf": "public provident fund",
+    "epf": "employees' provident fund",
+    "nps": "national pension system",
+    "nri": "non-resident",
+    "sez": "special economic zone",
+    "mat": "minimum alternate tax",
+    "amt": "alternate minimum tax",
+    "dtaa": "avoidance of double taxation",
+    "ulip": "unit linked insurance plan",
+    "gst": "goods and services tax",
+    "itr": "return of income",
+}
+
+# Boilerplate that starts many titles and carries no topical meaning
+TITLE_PREFIXES = re.compile(
+    r"^(?:special provisions? (?:in respect of|for|relating to)|deductions? (?:in respect of|for|to be made (?:in|with reference to))|"
+    r"provisions? relating to|exemption of|tax on|income from|rate of tax on|procedure for|power to|power of)\s+",
+    re.IGNORECASE,
+)
+PHRASE_SPLIT = re.compile(r",|;|\band\b|\bor\b|\betc\b\.?")
+TITLE_LINE = re.compile(r"^(\d+[A-Z]*)\.\s+(.*)$")
+DEFINITION = re.compile(r"\((\d+[A-Z]*)\)\]?\s*(?:\d+\[)*\s*“([^”]{2,60})”[^“]{0,80}?\b(?:means|includes|shall have)")
+INLINE_ACRONYM = re.compile(r"((?:[A-Z][a-z]+\s+){1,6})\(([A-Z]{2,6})\)")
+# A phrase that hints more sections than this is too generic to be a useful hint
+MAX_SECTIONS_PER_PHRASE = 3
+# Single words used more often than this in the Act ("income", "deductions") say nothing about the topic
+MAX_SINGLE_WORD_FREQUENCY = 150
+
+
+def parse_titles(lines: List[str]) -> Dict[str, str]:
+    """Section titles from the arrangement of sections at the start of the Act"""
+    titles: Dict[str, str] = {}
+    current = None
+    for raw in lines:
+        line = raw.lstrip("# ").strip()
+        if line.startswith("ACT NO."):
+            break
+        match = TITLE_LINE.match(line)
+        if match:
+            current = match.group(1)
+            titles[current] = match.group(2)
+        elif current and line and line[0].islower() and not titles[current].endswith("."):
+            titles[current] += " " + line
+    return {section: title.rstrip(". ") for section, title in titles.items() if "[Omitted" not in title}
+
+
+def title_phrases(title: str) -> List[str]:
+    title = re.sub(r"[“”\"]", "", title)
+    phrases = []
+    for part in PHRASE_SPLIT.split(title):
+        part = TITLE_PREFIXES.sub("", part.strip())
+        part = re.sub(r"^(?:certain|specified|the|of|in|on|for|to|by|from)\s+", "", part.strip(), flags=re.IGNORECASE)
+        if 1 <= len(normalize_tokens(part)) <= 6 and re.search(r"[a-z]{3}", part.lower()) and "[" not in part:
+            phrases.append(part.lower())
+    return phrases
+
+
+def parse_definitions(text: str) -> Dict[str, str]:
+    """Terms defined in section 2 mapped to their clause, e.g. "assessee" -> "2(7)" """
+    start = text.find("2. Definitions.—")
+    end = text.find("“Previous year” defined.—", start)
+    definitions = {}
+    for clause, term in DEFINITION.findall(text[start:end]):
+        term = re.sub(r"\s+", " ", term).strip().lower()
+        definitions.setdefault(term, f"2({clause})")
+    return definitions
+
+
+def parse_inline_acronyms(text: str) -> Dict[str, str]:
+    acronyms = {}
+    for phrase, acronym in INLINE_ACRONYM.findall(text):
+        words = phrase.split()[-len(acronym):]
+        if "".join(word[0] for word in words).upper() == acronym:
+            acronyms[acronym.lower()] = " ".join(words).lower()
+    return acronyms
+
+
+def mine(text: str) -> Tuple[List[Dict], Dict[str, int]]:
+    lines = text.splitlines()
+    titles = parse_titles(lines)
+    definitions = parse_definitions(text)
+    tokens = normalize_tokens(text)
+    normalized_text = " ".join(tokens)
+    frequency = Counter(tokens)
+
+    def specific(phrase: str) -> bool:
+        words = normalize_tokens(phrase)
+        return len(words) > 1 or frequency[words[0]] <= MAX_SINGLE_WORD_FREQUENCY
+
+    phrase_sections: Dict[str, List[str]] = defaultdict(list)
+    for section, title in titles.items():
+        for phrase in title_phrases(title):
+            if section not in phrase_sections[phrase]:
+                phrase_sections[phrase].append(section)
+
+    # Section numbers typed directly ("80C limit", "section 10"); bare numbers are too ambiguous
+    entries = []
+    for section, title in titles.items():
+        phrase = section.lower() if re.search(r"[A-Z]", section) else f"section {section}"
+        entries.append({"phrase": phrase, "kind": "section", "sections": [section], "title": title})
+
+    for phrase, sections in sorted(phrase_sections.items()):
+        if len(sections) <= MAX_SECTIONS_PER_PHRASE and specific(phrase):
+            entries.append({"phrase": phrase, "kind": "title", "sections": sections})
+
+    for term, clause in sorted(definitions.items()):
+        if specific(term):
+            entries.append({"phrase": term, "kind": "definition", "sections": [clause]})
+
+    acronyms = {acronym: (expansion, "act") for acronym, expansion in parse_inline_acronyms(text).items()}
+    for acronym, expansion in SEED_ACRONYMS.items():
+        if acronym not in acronyms and f" {' '.join(normalize_tokens(expansion))} " in f" {normalized_text} ":
+            acronyms[acronym] = (expansion, "seed")
+    for acronym, (expansion, source) in sorted(acronyms.items()):
+        if acronym in STOPWORDS:
+            # "IT" (information technology) would fire on every "is it"
+            continue
+        entries.append({"phrase": acronym, "kind": "acronym", "expansion": expansion, "sections": [], "source": source})
+
+    stats = {
+        "titles": len(titles),
+        "definitions": len(definitions),
+        "acronyms": len(acronyms),
+        "entries": len(entries),
+        "entries_by_kind": dict(Counter(entry["kind"] for entry in entries)),
+    }
+    return entries, stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mine the Act into the query rewrite dictionary")
+    parser.add_argument("--source", default="income_tax_act_1961.md", help="Markdown text of the Act")
+    parser.add_argument("--output", default=settings.TERM_DICTIONARY_PATH, help="Compiled dictionary path")
+    args = parser.parse_args()
+
+    with open(args.source, "r", encoding="utf-8") as f:
+        entries, stats = mine(f.read())
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({
+            "source": args.source.rsplit("/", 1)[-1],
+            "mined_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "stats": stats,
+            "entries": entries,
+        }, f, ensure_ascii=False, indent=1)
+    print(f"Wrote {stats['entries']} entries to {args.output}: {stats}")
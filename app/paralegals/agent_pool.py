@@ -0,0 +1,107 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, List, Optional
+import autogen
+from app_logger.ai_service_logger import setup_logger
+
+logger = setup_logger("agent_pool")
+
+
+class AgentGraph:
+    """
+    One fully wired set of paralegal agents with its GroupChat and manager.
+
+    Building a graph creates the AssistantAgents, their LLM clients and the
+    GroupChat; that is done once per pooled graph. Between conversations the
+    graph is only reset (message lists and reply counters cleared).
+    """
+
+    def __init__(self, agents: Dict[str, autogen.ConversableAgent], group_chat: autogen.GroupChat, manager: autogen.GroupChatManager):
+        self.agents = agents
+        self.group_chat = group_chat
+        self.manager = manager
+
+    def __getattr__(self, name: str):
+        # Allow graph.response_agent style access to the agents
+        agents = self.__dict__.get("agents", {})
+        if name in agents:
+            return agents[name]
+        raise AttributeError(name)
+
+    def reset(self) -> None:
+        """Clear all conversation state so the graph can serve a new conversation"""
+        for agent in self.agents.values():
+            agent.reset()
+        self.manager.reset()
+        self.group_chat.reset()
+
+
+class AgentGraphPool:
+    """
+    Pool of pre-built agent graphs.
+
+    A GroupChat holds per-conversation messages, so concurrent conversations
+    need separate graphs; the pool hands out up to max_size of them and makes
+    further callers wait. Graphs are built lazily (warm_size eagerly at start-up)
+    and re-used after a cheap reset.
+    """
+
+    def __init__(self, builder: Callable[[], AgentGraph], max_size: int = 4, warm_size: int = 1):
+        self.builder = builder
+        self.max_size = max(1, max_size)
+        self.idle: asyncio.Queue = asyncio.Queue()
+        self.size = 0
+        self.acquire_times: List[float] = []
+        for _ in range(min(warm_size, self.max_size)):
+            self.idle.put_nowait(self._build())
+
+    def _build(self) -> AgentGraph:
+        start = time.perf_counter()
+        graph = self.builder()
+        self.size += 1
+        logger.info(f"Built agent graph {self.size}/{self.max_size} in {(time.perf_counter() - start) * 1000:.1f}ms")
+        return graph
+
+    @asynccontextmanager
+    async def acquire(self):
+        """
+        Lease a reset graph for one conversation turn and return it to the pool afterwards.
+
+        A turn that was cancelled or timed out may still be running in
+        autogen's executor threads, so its graph is replaced, not reused.
+        """
+        start = time.perf_counter()
+        if self.idle.empty() and self.size < self.max_size:
+            graph = self._build()
+        else:
+            graph = await self.idle.get()
+        graph.reset()
+        setup_ms = (time.perf_counter() - start) * 1000
+        self.acquire_times.append(setup_ms)
+        self.acquire_times = self.acquire_times[-1000:]
+        logger.debug(f"Agent graph ready in {setup_ms:.3f}ms")
+        abandoned = False
+        try:
+            yield graph
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            abandoned = True
+            raise
+        finally:
+            if abandoned:
+                logger.warning("Discarding agent graph of a cancelled or timed out turn")
+                self.size -= 1
+                # Replace it at once: callers may already be waiting for an idle graph
+                graph = self._build()
+            self.idle.put_nowait(graph)
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        """Pool size and per-request setup overhead (includes waiting for a free graph)"""
+        times = sorted(self.acquire_times)
+        return {
+            "size": self.size,
+            "max_size": self.max_size,
+            "idle": self.idle.qsize(),
+            "setup_ms_p50": times[len(times) // 2] if times else None,
+            "setup_ms_max": times[-1] if times else None,
+        }
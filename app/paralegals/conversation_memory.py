@@ -0,0 +1,108 @@
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+from pydantic import BaseModel
+from config import settings
+from token_counter import count_tokens, truncate_to_tokens
+from app_logger.ai_service_logger import setup_logger
+
+logger = setup_logger("conversation_memory")
+
+
+class Turn(BaseModel):
+    question: str
+    answer: str
+
+    @property
+    def tokens(self) -> int:
+        return count_tokens(self.question) + count_tokens(self.answer)
+
+    def render(self) -> str:
+        return f"User: {self.question}\nAssistant: {self.answer}"
+
+
+# (previous summary, turns to fold in) -> updated summary
+Summarizer = Callable[[str, List[Turn]], Awaitable[str]]
+
+
+class ConversationMemory:
+    """
+    Token-budgeted memory of one conversation.
+
+    Only what the user asked and what they were finally told is remembered;
+    internal agent chatter (routing, reformulations, search results) never
+    enters memory. The last recent_turns turns are kept verbatim and everything
+    older is folded into a rolling summary, which is updated incrementally from
+    the previous summary and the turns leaving the window. The replayed context
+    therefore stays under token_budget however long the session runs.
+    """
+
+    def __init__(self, summarizer: Optional[Summarizer] = None, token_budget: Optional[int] = None, recent_turns: Optional[int] = None):
+        self.summarizer = summarizer
+        self.token_budget = token_budget or settings.CONVERSATION_TOKEN_BUDGET
+        self.recent_turns = recent_turns or settings.CONVERSATION_RECENT_TURNS
+        # A third of the budget for the summary, the rest shared by the verbatim turns
+        self.summary_budget = self.token_budget // 3
+        self.turn_budget = (self.token_budget - self.summary_budget) // max(self.recent_turns, 1)
+        self.summary = ""
+        self.turns: Deque[Turn] = deque()
+        self.turn_count = 0
+
+    @property
+    def tokens(self) -> int:
+        return count_tokens(self.summary) + sum(turn.tokens for turn in self.turns)
+
+    def add_turn(self, question: str, answer: str) -> None:
+        """Remember one question/answer pair (long answers are clipped to the per-turn share of the budget)"""
+        answer_budget = max(self.turn_budget - count_tokens(question), self.turn_budget // 2)
+        self.turns.append(Turn(question=question, answer=truncate_to_tokens(answer, answer_budget)))
+        self.turn_count += 1
+
+    async def compact(self) -> None:
+        """Fold turns that left the verbatim window (or overflow the budget) into the summary"""
+        folding: List[Turn] = []
+        while len(self.turns) > self.recent_turns or (self.tokens > self.token_budget and len(self.turns) > 1):
+            folding.append(self.turns.popleft())
+        if not folding:
+            return
+
+        summary = None
+        if self.summarizer is not None:
+            try:
+                summary = await self.summarizer(self.summary, folding)
+            except Exception as e:
+                logger.warning(f"Summarizer failed, keeping the questions only: {str(e)}")
+        if not summary:
+            # Extractive fallback: the questions asked carry most of the follow-up context
+            asked = "; ".join(turn.question for turn in folding)
+            summary = f"{self.summary} Earlier the user asked: {asked}".strip()
+        self.summary = truncate_to_tokens(summary, self.summary_budget)
+        logger.debug(f"Folded {len(folding)} turns into the summary; memory is {self.tokens} tokens")
+
+    def render(self) -> str:
+        """Conversation context as text for prompts"""
+        parts = []
+        if self.summary:
+            parts.append(f"Summary of earlier conversation: {self.summary}")
+        parts.extend(turn.render() for turn in self.turns)
+        return "\n\n".join(parts)
+
+    def replay_messages(self) -> List[Dict[str, str]]:
+        """Conversation context as GroupChat messages for manager.resume"""
+        messages = []
+        if self.summary:
+            messages.append({"content": f"Summary of earlier conversation: {self.summary}", "role": "user", "name": "user_proxy_agent"})
+        for turn in self.turns:
+            messages.append({"content": turn.question, "role": "user", "name": "user_proxy_agent"})
+            messages.append({"content": turn.answer, "role": "assistant", "name": "response_agent"})
+        return messages
+
+    def to_dict(self) -> Dict:
+        return {"summary": self.summary, "turns": [turn.model_dump() for turn in self.turns], "turn_count": self.turn_count}
+
+    def load(self, data: Optional[Dict]) -> None:
+        """Restore memory saved with to_dict (ignores anything else, e.g. legacy transcripts)"""
+        if not isinstance(data, dict):
+            return
+        self.summary = data.get("summary", "")
+        self.turns = deque(Turn(**turn) for turn in data.get("turns", []))
+        self.turn_count = data.get("turn_count", len(self.turns))
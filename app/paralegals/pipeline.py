@@ -0,0 +1,321 @@
+import asyncio
+import json
+import re
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from pydantic import BaseModel, Field
+from corpora import CORPORA
+from context_packer import PackedContext, context_packer
+from config import settings
+from search_router import fuse_ranked, search_router
+from domain_router import domain_router
+from query_rewriter import query_rewriter
+from paralegals import tax_paralegal_tools
+from app_logger.ai_service_logger import setup_logger
+from ai_service.agent_schema import IndividualAgentResponse
+from ai_service.structured_output import parse_structured
+from ai_service.model_policy import model_policy
+from app_logger.metrics import metrics
+from app_logger.tracing import tracer
+
+logger = setup_logger("legal_pipeline")
+
+speculative_outcomes = metrics.counter("lawgpt_speculative_retrieval_total", "Speculative raw-query searches by outcome (reused, merged, discarded)")
+
+# Receives progress events ({"type": "stage", ...} and {"type": "token", ...}) while a run is in flight
+EventSink = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class RouteResult(BaseModel):
+    domain: str = Field(description="Corpus name, e.g. tax")
+    agent: str = Field(description="Specialised agent for the corpus")
+    via_llm: bool = Field(description="True if the LLM had to be asked because local routing was not confident")
+    via: str = Field(default="keywords", description="Router that decided: embedding, keywords or llm")
+    confidence: Optional[float] = None
+    model: str = ""
+    llm_calls: int = 0
+
+
+class ReformulationResult(BaseModel):
+    query: str
+    reformulated_query: str
+    sub_queries: List[str] = Field(default_factory=list)
+    via: str = Field(default="llm", description="Rewriter that produced the search query: dictionary or llm")
+    model: str = ""
+    llm_calls: int = 0
+
+
+class RetrievalResult(BaseModel):
+    results: List[Dict[str, Any]]
+    speculative: str = Field(default="", description="What happened to the speculative raw-query search")
+
+
+class AnswerResult(BaseModel):
+    answer: str
+    query_solved: bool
+    context_tokens: int = 0
+    citations: List[Dict[str, Any]] = Field(default_factory=list)
+    model: str = ""
+    llm_calls: int = 0
+
+
+class PipelineRun(BaseModel):
+    query: str
+    route: RouteResult
+    reformulation: ReformulationResult
+    retrieval: RetrievalResult
+    answer: AnswerResult
+    timings_ms: Dict[str, float] = Field(default_factory=dict)
+    llm_calls: int = 0
+
+
+def _terms(text: str) -> set:
+    return set(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+def _parse_agent_response(text: str) -> Optional[IndividualAgentResponse]:
+    """Parse a tool's IndividualAgentResponse output, repairing almost-valid JSON locally"""
+    return parse_structured(text, IndividualAgentResponse)
+
+
+def retrieval_confidence(results: List[Dict[str, Any]]) -> float:
+    """Calibrated score of the best hit (scores are similarities: higher is better)"""
+    return max((r.get("calibrated_score", r.get("similarity_score", 0.0)) for r in results), default=0.0)
+
+
+def answer_start_tier(results: List[Dict[str, Any]]) -> int:
+    """Model tier the answer starts on; weak retrieval starts one tier up"""
+    tier = model_policy.tier_of("answer")
+    if retrieval_confidence(results) < settings.LLM_CASCADE_MIN_RETRIEVAL_SCORE:
+        # Thin evidence needs the stronger model's judgement from the start
+        tier += 1
+    return tier
+
+
+class LegalPipeline:
+    """
+    Deterministic staged pipeline: route -> reformulate -> retrieve -> answer.
+
+    Runs the same stages as the GroupChat, but as direct async calls with no
+    LLM-driven speaker selection. Routing is local unless the domain is unclear
+    and reformulation is local when the term dictionary explains the question,
+    so a question costs one to three LLM calls.
+    """
+
+    @contextmanager
+    def _timed(self, timings: Dict[str, float], stage: str):
+        start = time.perf_counter()
+        try:
+            with tracer.span(f"pipeline.{stage}"):
+                yield
+        finally:
+            timings[stage] = round((time.perf_counter() - start) * 1000, 2)
+
+    async def route(self, query: str, context_variables: Dict, query_embedding: Optional[List[float]] = None) -> RouteResult:
+        prediction = domain_router.route(query_embedding) if query_embedding is not None else None
+        if prediction is not None and prediction.confidence >= settings.DOMAIN_ROUTER_CONFIDENCE:
+            corpus = CORPORA[prediction.domain]
+            return RouteResult(domain=corpus.name, agent=corpus.agent, via_llm=False, via="embedding", confidence=prediction.confidence)
+
+        routes = search_router.route(query)
+        if len(routes) == 1:
+            corpus = routes[0][0]
+            return RouteResult(domain=corpus.name, agent=corpus.agent, via_llm=False)
+
+        agents = {corpus.agent: corpus for corpus in CORPORA.values()}
+
+        async def ask(model: str):
+            response = _parse_agent_response(await tax_paralegal_tools.route_legal_question(query, context_variables, model=model))
+            return agents.get(response.next_speaker) if response else None
+
+        # An unparsable or unknown routing answer escalates to the next model tier
+        corpus, model, attempts = await model_policy.cascade("route", ask, accept=lambda corpus: corpus is not None)
+        if corpus is None:
+            # Still unknown: fall back to the best local guess
+            corpus = max(routes, key=lambda route: route[1])[0] if routes else CORPORA["tax"]
+        return RouteResult(domain=corpus.name, agent=corpus.agent, via_llm=True, via="llm", model=model, llm_calls=attempts)
+
+    def rewrite(self, query: str, context_variables: Dict) -> Optional[ReformulationResult]:
+        """
+        Rewrite the query with the term dictionary mined from the Act.
+
+        Returns:
+            The reformulation if the dictionary explains the question well enough to skip
+            the LLM, otherwise None. Follow-ups in a conversation always go to the LLM,
+            which can resolve them against the earlier turns.
+        """
+        rewrite = query_rewriter.rewrite(query)
+        if not rewrite.confident or context_variables.get("conversation"):
+            return None
+        return ReformulationResult(query=query, reformulated_query=rewrite.rewritten, sub_queries=[rewrite.rewritten], via="dictionary")
+
+    async def reformulate(self, query: str, context_variables: Dict) -> ReformulationResult:
+        # The LLM starts from the dictionary rewrite so acronyms and section numbers are already expanded
+        rewritten = query_rewriter.rewrite(query).rewritten
+
+        async def ask(model: str) -> str:
+            response = _parse_agent_response(await tax_paralegal_tools.formulate_tax_questions(rewritten, context_variables, model=model))
+            return response.proposed_solve.strip() if response else ""
+
+        reformulated, model, attempts = await model_policy.cascade("reformulate", ask, accept=bool)
+        sub_queries = tax_paralegal_tools.split_sub_queries(reformulated or rewritten) or [query]
+        return ReformulationResult(query=query, reformulated_query="\n".join(sub_queries), sub_queries=sub_queries, model=model, llm_calls=attempts)
+
+    async def retrieve(self, reformulation: ReformulationResult, context_variables: Dict) -> RetrievalResult:
+        response = _parse_agent_response(await tax_paralegal_tools.semantic_search(reformulation.reformulated_query, context_variables))
+        results = json.loads(response.proposed_solve) if response and response.proposed_solve else []
+        return RetrievalResult(results=results)
+
+    async def retrieve_with_speculation(self, reformulation: ReformulationResult, speculative: "asyncio.Task", context_variables: Dict) -> RetrievalResult:
+        """
+        Finish retrieval given a search on the raw query that was started alongside reformulation.
+
+        If reformulation left the question as it was, the speculative results are the
+        answer. If it rewrote the question beyond recognition (e.g. a follow-up resolved
+        against the conversation) the speculative search is cancelled or ignored.
+        Otherwise both result lists are fused, the speculative one at a lower weight.
+        """
+        raw_terms = _terms(reformulation.query)
+        reformulated_terms = _terms(" ".join(reformulation.sub_queries))
+        if reformulated_terms == raw_terms:
+            try:
+                early = await speculative
+                speculative_outcomes.inc(outcome="reused")
+                return early.model_copy(update={"speculative": "reused"})
+            except Exception as e:
+                logger.warning(f"Speculative search failed, searching again: {str(e)}")
+                return await self.retrieve(reformulation, context_variables)
+
+        overlap = len(raw_terms & reformulated_terms) / max(len(raw_terms), 1)
+        if overlap < settings.SPECULATIVE_MIN_OVERLAP:
+            speculative.cancel()
+            speculative_outcomes.inc(outcome="discarded")
+            retrieval = await self.retrieve(reformulation, context_variables)
+            return retrieval.model_copy(update={"speculative": "discarded"})
+
+        retrieval = await self.retrieve(reformulation, context_variables)
+        try:
+            early = await speculative
+        except Exception as e:
+            logger.warning(f"Speculative search failed, using the reformulated search only: {str(e)}")
+            return retrieval
+        speculative_outcomes.inc(outcome="merged")
+        merged = fuse_ranked([retrieval.results, early.results], settings.SEARCH_TOP_K, weights=[1.0, settings.SPECULATIVE_WEIGHT])
+        return RetrievalResult(results=merged, speculative="merged")
+
+    def pack(self, query: str, retrieval: RetrievalResult) -> PackedContext:
+        """Compact the retrieved chunks into a token-budgeted, citable context"""
+        packed = context_packer.pack(query, retrieval.results)
+        logger.info(f"Packed {packed.input_results} results into {len(packed.citations)} blocks, {packed.tokens} tokens")
+        return packed
+
+    async def answer(self, query: str, retrieval: RetrievalResult, context_variables: Dict, on_event: Optional[EventSink] = None) -> AnswerResult:
+        packed = self.pack(query, retrieval)
+        citations = [citation.model_dump() for citation in packed.citations]
+        start_tier = answer_start_tier(retrieval.results)
+        if on_event is not None:
+            # Stream plain text so the client sees the answer as it is generated; a streamed
+            # answer cannot be retried on another model, so only the starting tier applies
+            model = model_policy.model("answer", start_tier)
+            text, sent = "", 0
+            async for fragment in tax_paralegal_tools.stream_tax_response(query, packed.text, context_variables, model=model):
+                text += fragment
+                # Hold back what may turn out to be the CONFIDENCE line
+                visible = tax_paralegal_tools.confidence_tail_start(text)
+                if visible > sent:
+                    await on_event({"type": "token", "text": text[sent:visible]})
+                    sent = visible
+            confidence = tax_paralegal_tools.CONFIDENCE_LINE.search(text)
+            text = tax_paralegal_tools.CONFIDENCE_LINE.sub("", text)
+            if len(text) > sent:
+                await on_event({"type": "token", "text": text[sent:]})
+            answer = text.strip()
+            # Only an answer the model vouches for counts as solved (and may be cached)
+            solved = bool(answer) and confidence is not None and confidence.group(1).lower() == "high"
+            return AnswerResult(answer=answer, query_solved=solved, context_tokens=packed.tokens, citations=citations, model=model, llm_calls=1)
+
+        async def ask(model: str) -> AnswerResult:
+            raw = await tax_paralegal_tools.generate_tax_response(query, packed.text, context_variables, model=model)
+            response = _parse_agent_response(raw)
+            if response is None:
+                return AnswerResult(answer=raw, query_solved=False, context_tokens=packed.tokens, citations=citations)
+            return AnswerResult(answer=response.proposed_solve, query_solved=response.query_solved, context_tokens=packed.tokens, citations=citations)
+
+        # A schema failure or the model reporting low confidence escalates to the next tier
+        answer, model, attempts = await model_policy.cascade("answer", ask, accept=lambda a: a.query_solved, start_tier=start_tier)
+        return answer.model_copy(update={"model": model, "llm_calls": attempts})
+
+    async def run(self, query: str, context_variables: Optional[Dict] = None, on_event: Optional[EventSink] = None, query_embedding: Optional[List[float]] = None) -> PipelineRun:
+        """
+        Answer a question with the staged pipeline.
+
+        Args:
+            query: The user's legal question
+            context_variables: Session context; the routed domain is added for the tools
+            on_event: Optional sink for stage events and answer tokens (enables streaming)
+            query_embedding: Embedding of the query if already computed (enables local domain routing)
+
+        Returns:
+            The typed output of every stage with per-stage timings and the LLM call count
+        """
+        context = dict(context_variables or {})
+        timings: Dict[str, float] = {}
+        llm_calls = 0
+
+        async def emit(stage: str, **data):
+            if on_event is not None:
+                await on_event({"type": "stage", "stage": stage, "elapsed_ms": round((time.perf_counter() - started) * 1000, 2), **data})
+
+        started = time.perf_counter()
+
+        with self._timed(timings, "total"):
+            with self._timed(timings, "route"):
+                route = await self.route(query, context, query_embedding)
+            llm_calls += route.llm_calls
+            context["domains"] = [route.domain]
+            await emit("routed", domain=route.domain, agent=route.agent, via=route.via)
+
+            with self._timed(timings, "rewrite"):
+                reformulation = self.rewrite(query, context)
+            speculative = None
+            try:
+                if reformulation is None:
+                    # Search on the raw question while the reformulation LLM call is in flight
+                    speculative = asyncio.create_task(self.retrieve(
+                        ReformulationResult(query=query, reformulated_query=query, sub_queries=[query]), context
+                    ))
+                    with self._timed(timings, "reformulate"):
+                        reformulation = await self.reformulate(query, context)
+                    llm_calls += reformulation.llm_calls
+                await emit("reformulated", query=reformulation.reformulated_query, sub_queries=reformulation.sub_queries, via=reformulation.via)
+
+                with self._timed(timings, "retrieve"):
+                    if reformulation.via == "dictionary":
+                        retrieval = await self.retrieve(reformulation, context)
+                    else:
+                        retrieval = await self.retrieve_with_speculation(reformulation, speculative, context)
+            finally:
+                # A failed or cancelled run must not leave the raw-query search running
+                if speculative is not None and not speculative.done():
+                    speculative.cancel()
+            await emit("retrieved", count=len(retrieval.results), ids=[r.get("page_id") for r in retrieval.results], speculative=retrieval.speculative)
+
+            await emit("answering")
+            with self._timed(timings, "answer"):
+                answer = await self.answer(query, retrieval, context, on_event)
+            llm_calls += answer.llm_calls
+
+        logger.info(f"Pipeline finished in {timings['total']}ms with {llm_calls} LLM calls: {timings}")
+        return PipelineRun(
+            query=query,
+            route=route,
+            reformulation=reformulation,
+            retrieval=retrieval,
+            answer=answer,
+            timings_ms=timings,
+            llm_calls=llm_calls,
+        )
+
+
+legal_pipeline = LegalPipeline()
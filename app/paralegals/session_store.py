@@ -0,0 +1,153 @@
+import asyncio
+import hashlib
+import hmac
+import secrets
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, Optional
+from config import settings
+from app_logger.ai_service_logger import setup_logger
+from app_logger.metrics import metrics
+from .conversation_memory import ConversationMemory
+
+logger = setup_logger("session_store")
+
+sessions_active = metrics.gauge("lawgpt_sessions_active", "Client sessions held in memory")
+sessions_created_total = metrics.counter("lawgpt_sessions_created_total", "Client sessions created or restored from the cache")
+sessions_evicted_total = metrics.counter("lawgpt_sessions_evicted_total", "Client sessions evicted from memory by reason (idle, lru)")
+
+_session_key = (settings.SESSION_SECRET or secrets.token_hex(32)).encode()
+
+
+def _sign(value: str) -> str:
+    return hmac.new(_session_key, value.encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def issue_session_id() -> str:
+    """A new, unguessable session ID signed by this server"""
+    value = secrets.token_hex(16)
+    return f"{value}.{_sign(value)}"
+
+
+def verify_session_id(token: Optional[str]) -> Optional[str]:
+    """The session ID if this server issued it, else None"""
+    value, _, signature = (token or "").strip().partition(".")
+    if not value or not hmac.compare_digest(signature, _sign(value)):
+        return None
+    return f"{value}.{signature}"
+
+
+class Session:
+    """
+    Conversation state of one client on top of the shared agent graphs.
+
+    Holds what used to live on the LegalParalegal singleton: the context
+    variables (chat_id, rendered conversation, session_established), the
+    token-budgeted memory and the cache it is persisted in. The lock
+    serialises memory updates when one client has several questions in flight.
+    A session without an ID (and cache) is transient: it lives for one
+    question and remembers nothing.
+    """
+
+    def __init__(self, session_id: Optional[str], memory: ConversationMemory, cache: Any = None):
+        self.session_id = session_id
+        self.memory = memory
+        self.cache = cache
+        if self.cache is not None:
+            self.memory.load(self.cache.get("conversation_memory"))
+        self.context_variables: Dict[str, Any] = {"chat_id": session_id, "conversation": self.memory.render()}
+        self.lock = asyncio.Lock()
+        self.leases = 0
+        self.last_used = time.monotonic()
+
+    def close(self) -> None:
+        close = getattr(self.cache, "close", None)
+        if close is not None:
+            close()
+
+
+class SessionStore:
+    """
+    Per-client sessions with LRU and idle-TTL eviction.
+
+    At most max_sessions sessions are held in memory; the least recently used
+    one is evicted to make room, and sessions idle for longer than idle_ttl
+    seconds are evicted on the next access. Sessions leased by a running
+    question are never evicted. An evicted client loses nothing: its memory is
+    persisted in its cache after every turn and restored when it returns.
+    """
+
+    def __init__(self, factory: Callable[[Optional[str]], Session], max_sessions: Optional[int] = None, idle_ttl: Optional[float] = None):
+        self.factory = factory
+        self.max_sessions = max(1, max_sessions or settings.SESSION_MAX_COUNT)
+        self.idle_ttl = idle_ttl or settings.SESSION_IDLE_TTL_SECONDS
+        self.sessions: "OrderedDict[str, Session]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def _evict(self, session_id: str, reason: str) -> None:
+        session = self.sessions.pop(session_id)
+        try:
+            session.close()
+        except Exception as e:
+            logger.warning(f"Failed to close session {session_id}: {str(e)}")
+        sessions_evicted_total.inc(reason=reason)
+        logger.debug(f"Evicted session {session_id} ({reason})")
+
+    def _sweep(self, keep: str) -> None:
+        """Evict idle sessions, then the least recently used ones beyond max_sessions (never `keep`)"""
+        now = time.monotonic()
+        # Ordered by last use, so the idle ones are at the front
+        for session_id, session in list(self.sessions.items()):
+            if now - session.last_used < self.idle_ttl:
+                break
+            if not session.leases and session_id != keep:
+                self._evict(session_id, "idle")
+        overflow = len(self.sessions) - self.max_sessions
+        for session_id, session in list(self.sessions.items()):
+            if overflow <= 0:
+                break
+            if not session.leases and session_id != keep:
+                self._evict(session_id, "lru")
+                overflow -= 1
+        sessions_active.set(len(self.sessions))
+
+    def get(self, session_id: str) -> Session:
+        """The client's session, created (or restored from its cache) on first use"""
+        session = self.sessions.get(session_id)
+        if session is None:
+            session = self.factory(session_id)
+            self.sessions[session_id] = session
+            sessions_created_total.inc()
+        session.last_used = time.monotonic()
+        self.sessions.move_to_end(session_id)
+        # Make room after inserting, so the new session counts towards max_sessions
+        self._sweep(keep=session_id)
+        return session
+
+    @asynccontextmanager
+    async def lease(self, session_id: Optional[str]):
+        """Use the client's session for one question; it cannot be evicted meanwhile"""
+        if session_id is None:
+            # No session: the question is answered without conversation memory
+            yield self.factory(None)
+            return
+        session = self.get(session_id)
+        session.leases += 1
+        try:
+            yield session
+        finally:
+            session.leases -= 1
+            session.last_used = time.monotonic()
+            if session_id in self.sessions:
+                self.sessions.move_to_end(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": len(self.sessions),
+            "leased": sum(1 for session in self.sessions.values() if session.leases),
+            "max_sessions": self.max_sessions,
+            "idle_ttl_s": self.idle_ttl,
+        }
@@ -1,70 +1,113 @@
 from config import settings
 from typing import List, Optional, Dict, Any, TypeVar, Callable, Union
+import asyncio
 import json
+import logging
+import os
+import time
 import autogen
 from autogen import register_function
-from collections import deque
+from autogen.logger.file_logger import FileLogger
 from functools import wraps
-from google import genai
 from paralegals import tax_paralegal_tools
-from app_logger.ai_service_logger import setup_logger, log_function_call
+from app_logger.ai_service_logger import setup_logger, log_function_call, rotating_file_handler
+from app_logger.metrics import metrics
+from app_logger.tracing import current_span, traced, tracer
 from ai_service.agent_schema import IndividualAgentResponse, IndividualAgentUserQuery, AgentResponse
+from ai_service.structured_output import parse_structured, parse_structured_or_reformat
+from ai_service.resilience import remaining_budget
+from ai_service.model_policy import model_policy
+from ai_service.llm_client import gemini_client, thread_call_scope
+from ai_service.autogen_client import SharedGeminiModelClient, shared_llm_client
+from pinecone_service import pinecone_service
+from semantic_cache import semantic_cache
+from cache_store import cache_store
+from domain_router import domain_router
+from corpora import CORPORA
 
+from .agent_pool import AgentGraph, AgentGraphPool
+from .conversation_memory import ConversationMemory
+from .session_store import Session, SessionStore
+from .pipeline import EventSink, legal_pipeline
 from .prompts import LegalParalegalPrompt, TaxParalegalPrompt,  ResponseAgentPrompt, QuestionFormulationPrompt, InformationRetrievalPrompt, user_proxy_agent_prompt
 
 # Configure logging
 logger = setup_logger("legal_paralegal")
-logging_session_id = autogen.runtime_logging.start(logger_type="file", config={"filename": "legal_paralegal.log"})
+
+# Values of PARALEGAL_MODE and of a question's mode
+PARALEGAL_MODES = ("pipeline", "group_chat")
+
+question_seconds = metrics.histogram("lawgpt_question_seconds", "End-to-end time to answer one question by mode and outcome (answered, cached, error, cancelled)")
+
+
+def start_runtime_logging(filename: str) -> str:
+    """Start autogen's file runtime logging, rotated like the module logs instead of growing unbounded"""
+    runtime_logger = FileLogger(config={"filename": filename})
+    log_file = os.path.abspath(runtime_logger.log_file)
+    for handler in list(runtime_logger.logger.handlers):
+        if isinstance(handler, logging.FileHandler) and handler.baseFilename == log_file:
+            runtime_logger.logger.removeHandler(handler)
+            handler.close()
+    runtime_logger.logger.addHandler(rotating_file_handler(log_file))
+    return autogen.runtime_logging.start(logger=runtime_logger)
+
+
+def stop_runtime_logging() -> None:
+    """Stop autogen's runtime logging (at shutdown; it is shared by every group chat)"""
+    autogen.runtime_logging.stop()
+
+
+logging_session_id = start_runtime_logging("legal_paralegal.log")
 
 F = TypeVar("F", bound=Callable[..., Any])
 
+# Agents whose turns are cheap stages (routing, reformulation) run on those stages' model tiers
+AGENT_STAGES = {
+    LegalParalegalPrompt.NAME: "route",
+    TaxParalegalPrompt.NAME: "route",
+    QuestionFormulationPrompt.NAME: "reformulate",
+}
+
 # Base prompts for all legal domains
 class LegalParalegal:
-    MAX_MESSAGES = 10  # Maximum number of messages to keep
-
     def __init__(self, context_variables: Optional[Dict] = None):
         logger.info("Initializing LegalParalegal")
         # self.llm = Gemini(api_key=settings.GEMENI_API_KEY, model_name="models/gemini-2.0-flash")
+        # Shared by the pooled agent graphs (system prompts); per-client state lives in sessions
         self.context_variables = context_variables or {}
+        self.sessions = SessionStore(factory=self.__new_session)
         
-        # Initialize cache
-        if self.context_variables.get("chat_id"):
-            self.cache = autogen.Cache.disk(cache_seed=self.context_variables.get("chat_id"))
-        else:
-            self.cache = autogen.Cache.disk(cache_seed=Exception("Chat Id not found in context variables"))
-        
-        self.__setup_cache()
-        self.__initialize_context_variables()
-        
-        # Configure Gemini for Autogen
-    #     config={
-    #     'response_mime_type': 'application/json',
-    #     'response_schema': list[Recipe],
-    # },
-        self.llm_config = {
-            "config_list": [{
-                "model": "gemini-2.0-flash",  # Simplified model name that Gemini API recognizes
-                "api_key": settings.GEMENI_API_KEY,
-                "api_type": "google",
-                # "response_schema":IndividualAgentResponse
-            }],
+        # Configure Gemini for Autogen from the model policy: the manager's speaker selection runs on
+        # the cheapest tier, each agent on its stage's tier with stronger tiers as fallbacks
+        self.llm_config = model_policy.llm_config("manager")
+        # Agents answer with schema-validated IndividualAgentResponse JSON (Gemini response_schema);
+        # the manager keeps the plain config because its speaker selection expects free text
+        self.agent_llm_config = model_policy.llm_config("agent", response_format=IndividualAgentResponse)
+        self.stage_llm_configs = {
+            stage: model_policy.llm_config(stage, response_format=IndividualAgentResponse)
+            for stage in set(AGENT_STAGES.values())
         }
+        # LLM clients shared by every agent of every pooled graph, all backed by the shared gemini_client
+        self.llm_client = shared_llm_client(self.llm_config)
+        self.agent_llm_client = shared_llm_client(self.agent_llm_config)
+        self.stage_llm_clients = {stage: shared_llm_client(config) for stage, config in self.stage_llm_configs.items()}
+        try:
+            domain_router.load_or_build(pinecone_service.embeddings.embed_documents)
+        except Exception as e:
+            logger.warning(f"Domain router unavailable, routing falls back to keywords and the LLM: {str(e)}")
+        self.agent_pool = AgentGraphPool(
+            builder=self.__register_all_agents,
+            max_size=settings.AGENT_POOL_SIZE,
+            warm_size=settings.AGENT_POOL_WARM_SIZE,
+        )
 
-    @log_function_call(logger)
-    def __setup_cache(self):
-        """Setup cache by ensuring the conversation history stored as 'carryover' is maintained up to MAX_MESSAGES."""
-        carryover = self.cache.get("carryover", [])
-        carryover = list(deque(carryover, maxlen=self.MAX_MESSAGES))
-        self.cache.set("carryover", carryover)
-
-    @log_function_call(logger)
-    def __initialize_context_variables(self):
-        """Initialize context_variables with chat history from cache."""
-        logger.debug("Initializing context variables with chat history")
-        carryover = self.cache.get("carryover", [])
-        if len(carryover) > self.MAX_MESSAGES:
-            carryover = carryover[-self.MAX_MESSAGES:]
-        self.context_variables["chat_history"] = deque(carryover, maxlen=self.MAX_MESSAGES)
+    def __new_session(self, session_id: Optional[str]) -> Session:
+        """Session state for one client, its conversation memory restored from the shared cache."""
+        memory = ConversationMemory(summarizer=tax_paralegal_tools.summarize_conversation)
+        if session_id is None:
+            return Session(None, memory)
+        logger.debug(f"Opening session {session_id}")
+        return Session(session_id, memory, cache_store.conversation(session_id))
 
     def context_wrapper(self, func: F) -> F:
         @wraps(func)
@@ -89,8 +132,8 @@ class LegalParalegal:
         logger.debug("Registering legal paralegal agent")
         try:
             contextual_assistant = self.agent_context_wrapper(autogen.AssistantAgent)
-            self.legal_paralegal_agent = contextual_assistant(
-                llm_config=self.llm_config,
+            legal_paralegal_agent = contextual_assistant(
+                llm_config=self.agent_llm_config,
                 name=LegalParalegalPrompt.NAME,
                 system_message=LegalParalegalPrompt.get_system_prompt(self.context_variables),
                 description=LegalParalegalPrompt.DESCRIPTION,
@@ -99,6 +142,7 @@ class LegalParalegal:
                 code_execution_config=False,
             )
             logger.info("Successfully registered legal paralegal agent")
+            return legal_paralegal_agent
         except Exception as e:
             logger.error(f"Failed to register legal paralegal agent: {str(e)}", exc_info=True)
             raise
@@ -109,8 +153,8 @@ class LegalParalegal:
         logger.debug("Registering tax paralegal agent")
         try:
             contextual_assistant = self.agent_context_wrapper(autogen.AssistantAgent)
-            self.tax_paralegal_agent = contextual_assistant(
-                llm_config=self.llm_config,
+            tax_paralegal_agent = contextual_assistant(
+                llm_config=self.agent_llm_config,
                 name=TaxParalegalPrompt.NAME,
                 system_message=TaxParalegalPrompt.get_system_prompt(self.context_variables),
                 description=TaxParalegalPrompt.DESCRIPTION,
@@ -119,6 +163,7 @@ class LegalParalegal:
                 code_execution_config=False,
             )
             logger.info("Successfully registered tax paralegal agent")
+            return tax_paralegal_agent
         except Exception as e:
             logger.error(f"Failed to register tax paralegal agent: {str(e)}", exc_info=True)
             raise
@@ -140,8 +185,8 @@ When you receive a tax question:
 3. Format your response as a properly structured JSON following the IndividualAgentResponse format
 """
             
-            self.question_formulation_agent = contextual_assistant(
-                llm_config=self.llm_config,
+            question_formulation_agent = contextual_assistant(
+                llm_config=self.agent_llm_config,
                 name=QuestionFormulationPrompt.NAME,
                 system_message=system_prompt,
                 description=QuestionFormulationPrompt.DESCRIPTION,
@@ -150,6 +195,7 @@ When you receive a tax question:
                 code_execution_config=False,
             )
             logger.info("Successfully registered question formulation agent")
+            return question_formulation_agent
             
         except Exception as e:
             logger.error(f"Failed to register question formulation agent: {str(e)}", exc_info=True)
@@ -172,8 +218,8 @@ When you receive a reformulated question:
 3. Format your response as a properly structured JSON following the IndividualAgentResponse format
 """
             
-            self.information_retrieval_agent = contextual_assistant(
-                llm_config=self.llm_config,
+            information_retrieval_agent = contextual_assistant(
+                llm_config=self.agent_llm_config,
                 name=InformationRetrievalPrompt.NAME,
                 system_message=system_prompt,
                 description=InformationRetrievalPrompt.DESCRIPTION,
@@ -182,11 +228,12 @@ When you receive a reformulated question:
                 code_execution_config=False,
             )
             logger.info("Successfully registered information retrieval agent")
+            return information_retrieval_agent
         # TODO: Uncomment this when u figure out tool use from gemeni
         #     register_function(
         #     self.context_wrapper(tax_paralegal_tools.semantic_search),
-        #     caller=self.information_retrieval_agent,
-        #     executor=self.information_retrieval_agent,
+        #     caller=information_retrieval_agent,
+        #     executor=information_retrieval_agent,
         #     name="semantic_search",
         #     description="Use this tool to search tax law documents based on the question",
         # )
@@ -212,8 +259,8 @@ When you receive search results:
 3. Format your response as a properly structured JSON following the IndividualAgentResponse format
 """
             
-            self.response_agent = contextual_assistant(
-                llm_config=self.llm_config,
+            response_agent = contextual_assistant(
+                llm_config=self.agent_llm_config,
                 name=ResponseAgentPrompt.NAME,
                 system_message=system_prompt,
                 description=ResponseAgentPrompt.DESCRIPTION,
@@ -222,6 +269,7 @@ When you receive search results:
                 code_execution_config=False,
             )
             logger.info("Successfully registered response agent")
+            return response_agent
             
         except Exception as e:
             logger.error(f"Failed to register response agent: {str(e)}", exc_info=True)
@@ -233,8 +281,8 @@ When you receive search results:
         logger.debug("Registering user proxy agent")
         try:
             contextual_assistant = self.agent_context_wrapper(autogen.AssistantAgent)
-            self.user_proxy_agent = contextual_assistant(
-                llm_config=self.llm_config,
+            user_proxy_agent = contextual_assistant(
+                llm_config=self.agent_llm_config,
                 name="user_proxy_agent",
                 system_message=user_proxy_agent_prompt.system_prompt,
                 description="Proxies user questions to the legal paralegal system.",
@@ -243,39 +291,54 @@ When you receive search results:
                 code_execution_config=False,
             )
             logger.info("Successfully registered user proxy agent")
+            return user_proxy_agent
         except Exception as e:
             logger.error(f"Failed to register user proxy agent: {str(e)}", exc_info=True)
             raise
 
     @log_function_call(logger)
-    def __register_all_agents(self):
-        """Register all agents."""
+    def __register_all_agents(self) -> AgentGraph:
+        """Register all agents and wire them into a group chat (one pooled agent graph)."""
         logger.info("Registering all agents")
         try:
-            # Register main legal agent first
-            self.__register_legal_paralegal_agent()
-            
-            # Tax domain agents
-            self.__register_tax_paralegal_agent()
-            self.__register_question_formulation_agent()
-            self.__register_information_retrieval_agent()
-            self.__register_response_agent()
-            
-            # User proxy agent
-            self.__register_user_proxy_agent()
-            
+            agents = {
+                # Register main legal agent first
+                LegalParalegalPrompt.NAME: self.__register_legal_paralegal_agent(),
+                # Tax domain agents
+                TaxParalegalPrompt.NAME: self.__register_tax_paralegal_agent(),
+                QuestionFormulationPrompt.NAME: self.__register_question_formulation_agent(),
+                InformationRetrievalPrompt.NAME: self.__register_information_retrieval_agent(),
+                ResponseAgentPrompt.NAME: self.__register_response_agent(),
+                # User proxy agent
+                "user_proxy_agent": self.__register_user_proxy_agent(),
+            }
+            group_chat = self.__setup_group_chat(agents)
+            manager = self.__setup_chat_manager(group_chat)
+
+            # All graphs talk to Gemini through shared clients instead of one per agent
+            for name, agent in agents.items():
+                agent.client = self.stage_llm_clients.get(AGENT_STAGES.get(name), self.agent_llm_client)
+            manager.client = self.llm_client
+
             logger.info("Successfully registered all agents")
+            return AgentGraph(agents, group_chat, manager)
         except Exception as e:
             logger.error(f"Failed to register all agents: {str(e)}", exc_info=True)
             raise
 
     @log_function_call(logger)
-    def __update_chat_history(self, new_message: dict):
-        """Update the chat_history in context_variables with the new message."""
-        logger.debug("Updating chat history")
-        if "chat_history" not in self.context_variables:
-            self.context_variables["chat_history"] = deque(maxlen=self.MAX_MESSAGES)
-        self.context_variables["chat_history"].append(new_message)
+    async def __remember_turn(self, session: Session, question: str, answer: str):
+        """Record the user-visible question and answer and compact memory to its token budget."""
+        if session.cache is None:
+            # Transient session: there is no next question to remember it for
+            return
+        logger.debug("Updating conversation memory")
+        # Questions of one client may finish concurrently; fold them in one at a time
+        async with session.lock:
+            session.memory.add_turn(question, answer)
+            await session.memory.compact()
+            session.context_variables["conversation"] = session.memory.render()
+            session.cache.set("conversation_memory", session.memory.to_dict())
 
     @log_function_call(logger)
     def __create_error_response(self, question, error_msg):
@@ -286,66 +349,48 @@ When you receive search results:
             agent_history={"error": error_msg}
         )
 
-    async def __setup_group_chat(self):
+    def __setup_group_chat(self, agents: Dict[str, autogen.ConversableAgent]):
         """Set up the group chat with allowed transitions between agents."""
         logger.debug("Setting up group chat")
+        user_proxy_agent = agents["user_proxy_agent"]
+        legal_paralegal_agent = agents[LegalParalegalPrompt.NAME]
+        tax_paralegal_agent = agents[TaxParalegalPrompt.NAME]
+        question_formulation_agent = agents[QuestionFormulationPrompt.NAME]
+        information_retrieval_agent = agents[InformationRetrievalPrompt.NAME]
+        response_agent = agents[ResponseAgentPrompt.NAME]
         allowed_transitions = {
-            self.user_proxy_agent: [self.legal_paralegal_agent,self.response_agent],
-            self.legal_paralegal_agent: [self.tax_paralegal_agent],  # Add other domain agents here
-            self.tax_paralegal_agent: [self.question_formulation_agent],
-            self.question_formulation_agent: [self.information_retrieval_agent],
-            self.information_retrieval_agent: [self.response_agent],
-            self.response_agent: [self.user_proxy_agent],
+            # Questions the local domain router is confident about skip the legal paralegal hop
+            user_proxy_agent: [legal_paralegal_agent, tax_paralegal_agent, response_agent],
+            legal_paralegal_agent: [tax_paralegal_agent],  # Add other domain agents here
+            tax_paralegal_agent: [question_formulation_agent],
+            question_formulation_agent: [information_retrieval_agent],
+            information_retrieval_agent: [response_agent],
+            response_agent: [user_proxy_agent],
         }
 
         def custom_speaker_selection(last_speaker: autogen.Agent, groupchat: autogen.GroupChat):
             message = groupchat.messages[-1]
             try:
-                next_speaker_mapping = {
-                    "user_proxy_agent": self.user_proxy_agent,
-                    "legal_paralegal_agent": self.legal_paralegal_agent,
-                    "tax_paralegal_agent": self.tax_paralegal_agent,
-                    "question_formulation_agent": self.question_formulation_agent,
-                    "information_retrieval_agent": self.information_retrieval_agent,
-                    "response_agent": self.response_agent,
-                }
+                next_speaker_mapping = agents
                 
                 # Log the received message to help with debugging
                 logger.debug(f"Received message content: {message.get('content', '')}")
                 
-                # Try to extract next_speaker from message content
+                # Try to extract next_speaker from message content (repairing almost-valid JSON locally)
                 content = message.get("content", "{}")
-                # Check if it's already a JSON object
-                if isinstance(content, dict) and "next_speaker" in content:
-                    next_speaker = content.get("next_speaker")
-                    if next_speaker in next_speaker_mapping:
-                        return next_speaker_mapping[next_speaker]
-                    return "auto"
-                
-                # Try to parse as JSON
-                try:
-                    data = json.loads(content)
-                    if isinstance(data, dict):
-                        if "next_speaker" in data:
-                            next_speaker = data.get("next_speaker")
-                            if next_speaker in next_speaker_mapping:
-                                return next_speaker_mapping[next_speaker]
-                        elif isinstance(data.get("userquery"), dict):
-                            # Create an IndividualAgentResponse from the data
-                            response_obj = IndividualAgentResponse(**data)
-                            next_speaker = response_obj.next_speaker
-                            if next_speaker in next_speaker_mapping:
-                                return next_speaker_mapping[next_speaker]
-                except (json.JSONDecodeError, TypeError) as e:
-                    # Log parsing errors for debugging
-                    logger.warning(f"Error parsing message as JSON: {str(e)}")
+                response_obj = parse_structured(content, IndividualAgentResponse)
+                if response_obj is not None:
+                    if response_obj.next_speaker in next_speaker_mapping:
+                        return next_speaker_mapping[response_obj.next_speaker]
+                elif isinstance(content, str):
+                    logger.warning("Could not parse message as IndividualAgentResponse")
                     # If the content isn't JSON or can't be parsed, handle manually
-                    if "Question Formulation" in message.get("content", ""):
-                        return self.question_formulation_agent
-                    elif "Information Retrieval" in message.get("content", ""):
-                        return self.information_retrieval_agent
-                    elif "Response Agent" in message.get("content", ""):
-                        return self.response_agent
+                    if "Question Formulation" in content:
+                        return question_formulation_agent
+                    elif "Information Retrieval" in content:
+                        return information_retrieval_agent
+                    elif "Response Agent" in content:
+                        return response_agent
             except Exception as e:
                 logger.error(f"Error in custom speaker selection: {e}")
             
@@ -358,11 +403,14 @@ When you receive search results:
             allowed_or_disallowed_speaker_transitions=allowed_transitions,
             speaker_transitions_type="allowed",
             speaker_selection_method=custom_speaker_selection,
+            # The "auto" fallback builds its own selector agent; keep it on the shared client too
+            select_speaker_auto_model_client_cls=SharedGeminiModelClient,
+            select_speaker_auto_llm_config=self.llm_config,
             max_round=50,
         )
         return group_chat
 
-    async def __setup_chat_manager(self, group_chat):
+    def __setup_chat_manager(self, group_chat):
         """Set up the group chat manager."""
         logger.debug("Setting up chat manager")
         manager = autogen.GroupChatManager(
@@ -376,105 +424,224 @@ When you receive search results:
         )
         return manager
 
-    def __format_query_for_agent(self, query: str) -> dict:
+    def __format_query_for_agent(self, query: str, graph: AgentGraph, query_embedding: Optional[List[float]] = None) -> dict:
         """Format the user query into IndividualAgentUserQuery structure."""
+        next_speaker = LegalParalegalPrompt.NAME
+        workplan = "Will be filled by the legal paralegal agent"
+        prediction = domain_router.route(query_embedding) if query_embedding is not None else None
+        if prediction is not None and prediction.confidence >= settings.DOMAIN_ROUTER_CONFIDENCE:
+            agent = CORPORA[prediction.domain].agent
+            if agent in graph.agents:
+                logger.info(f"Routed locally to {agent} ({prediction.confidence:.2f})")
+                next_speaker = agent
+                workplan = f"Routed to {prediction.domain} law by the local domain router"
+
         user_query = IndividualAgentUserQuery(
             query=query,
-            workplan="Will be filled by the legal paralegal agent"
+            workplan=workplan
         )
         
         initial_message = {
             "userquery": user_query.model_dump(),
             "query_solved": False,
             "proposed_solve": "",
-            "next_speaker": "legal_paralegal_agent",
+            "next_speaker": next_speaker,
             "next_speaker_question": f"Please analyze this legal question: {query}"
         }
         
         return initial_message
 
-    async def ask_legal_paralegal(self, query: str) -> Union[str, AgentResponse]:
+    @traced("paralegal.group_chat")
+    async def __run_group_chat(self, graph: AgentGraph, session: Session, query: str, query_embedding: Optional[List[float]] = None, index_version: str = "") -> AgentResponse:
+        """Run one question through a leased agent graph."""
+        # A follow-up's answer depends on the conversation, so it must not reach the shared cache
+        standalone = not session.context_variables.get("conversation")
+        # Format the query into IndividualAgentUserQuery structure
+        formatted_query = self.__format_query_for_agent(query, graph, query_embedding)
+        
+        # Agent turns run in autogen's worker threads and are submitted back to this loop's shared client
+        gemini_client.attach()
+        # ... and must stay in this question's trace there
+        tracer.propagate_to_executor()
+
+        # Start or resume conversation
+        history_length = 0
+        # Leaving early (cancelled, timed out) also cancels the LLM calls autogen's threads are blocked on
+        with thread_call_scope():
+            if not session.context_variables.get("session_established"):
+                logger.info("Starting new chat session")
+                # Agent turns go through autogen's own client, so the whole chat is bounded by the request budget
+                await asyncio.wait_for(graph.user_proxy_agent.a_initiate_chat(
+                    graph.manager, message=json.dumps(formatted_query), clear_history=False, cache=cache_store.llm()
+                ), remaining_budget(settings.REQUEST_DEADLINE_SECONDS))
+                session.context_variables["session_established"] = True
+            else:
+                logger.info("Resuming chat session")
+                # Replay the summary and recent turns only, never the earlier agent chatter
+                replay = session.memory.replay_messages()
+                history_length = len(replay)
+                if replay:
+                    last_agent, last_message = graph.manager.resume(messages=replay)
+                await asyncio.wait_for(graph.user_proxy_agent.a_initiate_chat(
+                    graph.manager,
+                    message=json.dumps(formatted_query),
+                    clear_history=False,
+                    cache=cache_store.llm(),
+                ), remaining_budget(settings.REQUEST_DEADLINE_SECONDS))
+        
+        # Copy the transcript out of the pooled graph; it is cleared when the graph is reused
+        messages = list(graph.group_chat.messages)
+        
+        # Every message after the opening user message is one LLM turn
+        llm_calls = max(len(messages) - history_length - 1, 0)
+
+        # Extract the final response
+        response_messages = [m for m in messages if m.get("name") == "response_agent"]
+        if response_messages:
+            response_content = response_messages[-1]["content"]
+            # Agents emit schema-validated JSON; the reformat LLM call is only a last resort
+            parsed, reformatted = await parse_structured_or_reformat(response_content, IndividualAgentResponse)
+            llm_calls += int(reformatted)
+            logger.info(f"Group chat answered with {llm_calls} LLM calls")
+            answer = parsed.proposed_solve if parsed else response_content
+            await self.__remember_turn(session, query, answer)
+            solved = parsed is not None and parsed.query_solved and bool(answer)
+            if settings.SEMANTIC_CACHE_ENABLED and standalone and solved and query_embedding is not None:
+                semantic_cache.store(query, query_embedding, answer, self.__group_chat_sources(messages), index_version)
+            return AgentResponse(
+                message=answer,
+                agent_history={"data": messages, "llm_calls": llm_calls}
+            )
+        
+        return AgentResponse(
+            message="I couldn't process your legal question. Please try again with more details.",
+            agent_history={"data": messages, "llm_calls": llm_calls}
+        )
+
+    @staticmethod
+    def __group_chat_sources(messages: List[Dict]) -> List[str]:
+        """Ids of the chunks the information retrieval agent handed to the response agent"""
+        sources = []
+        for message in messages:
+            response = parse_structured(message.get("content") or "", IndividualAgentResponse)
+            if response is None or response.next_speaker != "response_agent":
+                continue
+            try:
+                results = json.loads(response.proposed_solve)
+            except (TypeError, ValueError):
+                continue
+            if isinstance(results, list):
+                sources = [r.get("page_id") for r in results if isinstance(r, dict)]
+        return sources
+
+    async def __run_pipeline(self, session: Session, query: str, query_embedding: List[float], index_version: str, on_event: Optional[EventSink] = None) -> AgentResponse:
+        """Answer one question with the deterministic staged pipeline."""
+        # A follow-up's answer depends on the conversation, so it must not reach the shared cache
+        standalone = not session.context_variables.get("conversation")
+        run = await legal_pipeline.run(query, session.context_variables, on_event=on_event, query_embedding=query_embedding)
+        await self.__remember_turn(session, query, run.answer.answer)
+        if settings.SEMANTIC_CACHE_ENABLED and standalone and run.answer.query_solved:
+            semantic_cache.store(query, query_embedding, run.answer.answer, [r.get("page_id") for r in run.retrieval.results], index_version)
+        return AgentResponse(
+            message=run.answer.answer,
+            agent_history={
+                "mode": "pipeline",
+                "route": run.route.model_dump(),
+                "reformulated_query": run.reformulation.reformulated_query,
+                "speculative_retrieval": run.retrieval.speculative,
+                "sources": [r.get("page_id") for r in run.retrieval.results],
+                "citations": run.answer.citations,
+                "context_tokens": run.answer.context_tokens,
+                "models": {"route": run.route.model, "reformulate": run.reformulation.model, "answer": run.answer.model},
+                "timings_ms": run.timings_ms,
+                "llm_calls": run.llm_calls,
+            }
+        )
+
+    @traced("paralegal.semantic_cache")
+    async def __lookup_cached_answer(self, session: Session, query: str, embedding: List[float], index_version: str, on_event: Optional[EventSink] = None) -> Optional[AgentResponse]:
+        """
+        Serve a paraphrase of an already answered question from the semantic cache.
+
+        Returns:
+            The cached AgentResponse, or None on a miss
+        """
+        cached = semantic_cache.lookup(embedding, index_version)
+        if cached is None:
+            return None
+
+        entry, similarity = cached
+        logger.info(f"Semantic cache hit ({similarity:.3f}) for '{query}' via '{entry.question}'")
+        if on_event is not None:
+            await on_event({"type": "stage", "stage": "cache_hit", "similarity": round(similarity, 3), "cached_question": entry.question})
+            await on_event({"type": "token", "text": entry.answer})
+        await self.__remember_turn(session, query, entry.answer)
+        response = AgentResponse(
+            message=entry.answer,
+            agent_history={
+                "mode": "cache",
+                "similarity": similarity,
+                "cached_question": entry.question,
+                "sources": entry.sources,
+                "llm_calls": 0,
+            }
+        )
+        return response
+
+    @traced("paralegal.ask")
+    async def ask_legal_paralegal(self, query: str, mode: Optional[str] = None, on_event: Optional[EventSink] = None, session_id: Optional[str] = None) -> Union[str, AgentResponse]:
         """
-        Entry point for legal paralegal service using Autogen for orchestration.
+        Entry point for legal paralegal service.
 
         Args:
             query: The user's legal question.
+            mode: "pipeline" for the staged pipeline or "group_chat" for open-ended
+                Autogen orchestration (defaults to PARALEGAL_MODE).
+            on_event: Optional async sink for stage events and answer tokens (pipeline mode only).
+            session_id: Server-issued session the question belongs to; without one it is answered without conversation memory.
 
         Returns:
             A comprehensive legal response.
+
+        Raises:
+            ValueError: Unknown mode
         """
-        logger.info(f"Processing legal query: {query}")
+        mode = mode or settings.PARALEGAL_MODE
+        if mode not in PARALEGAL_MODES:
+            raise ValueError(f"Unknown mode {mode!r}: expected one of {', '.join(PARALEGAL_MODES)}")
+        logger.info(f"Processing legal query ({mode}): {query}")
+        started = time.perf_counter()
+        outcome = "answered"
         try:
-            # Register all agents
-            self.__register_all_agents()
-            
-            # Set up group chat and manager
-            group_chat = await self.__setup_group_chat()
-            manager = await self.__setup_chat_manager(group_chat)
-            
-            # Format the query into IndividualAgentUserQuery structure
-            formatted_query = self.__format_query_for_agent(query)
-            
-            # Start or resume conversation
-            if not self.context_variables.get("session_established"):
-                logger.info("Starting new chat session")
-                await self.user_proxy_agent.a_initiate_chat(
-                    manager, message=json.dumps(formatted_query), clear_history=False
-                )
-                self.context_variables["session_established"] = True
-            else:
-                logger.info("Resuming chat session")
-                prev_messages = list(self.context_variables.get("chat_history", []))
-                flattened_list = [item for sublist in prev_messages for item in sublist]
-                if len(flattened_list) > 2000:
-                    flattened_list = flattened_list[-1000:]
-                last_agent, last_message = manager.resume(messages=flattened_list)
-                await self.user_proxy_agent.a_initiate_chat(
-                    manager,
-                    message=json.dumps(formatted_query),
-                    clear_history=False,
-                )
-            
-            # Update chat history
-            self.__update_chat_history(group_chat.messages)
-            autogen.runtime_logging.stop()
-            
-            # Extract the final response
-            response_messages = [m for m in group_chat.messages if m.get("name") == "response_agent"]
-            if response_messages:
-                try:
-                    # response_content = json.loads(response_messages[-1]["content"])
-                    response_content = response_messages[-1]["content"]
-                    client = genai.Client(api_key=settings.GEMENI_API_KEY)
-                    response = client.models.generate_content(
-                        model='gemini-2.0-flash',
-                        contents=f'format the content according to the provided response_schema + {response_content}',
-                        config={
-                            'response_mime_type': 'application/json',
-                            'response_schema': IndividualAgentResponse,
-                        },
-                    )
-
-                    return AgentResponse(
-                        message=response.parsed.proposed_solve,
-                        agent_history={"data": group_chat.messages}
-                    )
-
-                  
-                except json.JSONDecodeError:
-                    return AgentResponse(
-                        message=response_messages[-1]["content"],
-                        agent_history={"data": group_chat.messages}
-                    )
-            
-            return AgentResponse(
-                message="I couldn't process your legal question. Please try again with more details.",
-                agent_history={"data": group_chat.messages}
-            )
+            async with self.sessions.lease(session_id) as session:
+                # One query embedding serves the semantic cache and the local domain router
+                embedding = await asyncio.to_thread(pinecone_service.embeddings.embed_query, query)
+                index_version = pinecone_service.index_version()
+                # The cache is shared across clients and keyed on the question alone,
+                # so it only answers questions asked outside a conversation
+                if settings.SEMANTIC_CACHE_ENABLED and not session.context_variables.get("conversation"):
+                    cached_response = await self.__lookup_cached_answer(session, query, embedding, index_version, on_event)
+                    if cached_response is not None:
+                        outcome = "cached"
+                        return cached_response
+                if mode == "pipeline":
+                    return await self.__run_pipeline(session, query, embedding, index_version, on_event)
+                async with self.agent_pool.acquire() as graph:
+                    return await self.__run_group_chat(graph, session, query, embedding, index_version)
             
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
         except Exception as e:
+            outcome = "error"
             logger.error(f"Error in ask_legal_paralegal: {str(e)}", exc_info=True)
             return self.__create_error_response(query, str(e))
+        finally:
+            question_seconds.observe(time.perf_counter() - started, mode=mode, outcome=outcome)
+            span = current_span()
+            if span is not None:
+                span.set_attribute("mode", mode)
+                span.set_attribute("outcome", outcome)
   
     
 # Create a singleton instance
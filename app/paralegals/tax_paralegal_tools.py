@@ -1,28 +1,56 @@
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, AsyncIterator, List
 import json
 import os
-from pinecone_service import pinecone_service
-from llama_index.llms.gemini import Gemini
+import re
+from search_router import search_router
 from config import settings
 from llama_index.core.prompts import PromptTemplate
 from app_logger.ai_service_logger import setup_logger, log_function_call
+from app_logger.tracing import traced
 from ai_service.agent_schema import IndividualAgentResponse, IndividualAgentUserQuery
+from ai_service.llm_client import gemini_client
+from ai_service.model_policy import model_policy
+from paralegals.prompts import LegalParalegalPrompt
+from paralegals.conversation_memory import Turn
 
 # Configure logging
 logger = setup_logger("tax_paralegal_tools")
 
-# Initialize the LLM
-llm = Gemini(api_key=settings.GEMENI_API_KEY, model_name="models/gemini-2.0-flash")
-
 # Ensure environment variables are set for the tools
 os.environ["AUTOGEN_USE_DOCKER"] = "True"
 
-async def formulate_tax_questions(query: str, context_variables: Optional[Dict] = None) -> str:
+@traced("tool.route_legal_question")
+async def route_legal_question(query: str, context_variables: Optional[Dict] = None, model: Optional[str] = None) -> str:
+    """
+    Asks the LLM which specialised legal agent should handle the query.
+    
+    Args:
+        query: The user's legal query.
+        model: Gemini model to use (defaults to the route stage's model).
+        
+    Returns:
+        A string in IndividualAgentResponse format whose next_speaker is the chosen agent.
+    """
+    logger.info(f"Routing legal question: {query}")
+    prompt = f"""{LegalParalegalPrompt.get_system_prompt(context_variables)}
+    Question: {query}
+    """
+    try:
+        llm_response = await gemini_client.generate(prompt, model=model or model_policy.model("route"))
+        logger.info(f"Successfully routed legal question: {llm_response.text[:100]}...")
+        return llm_response.text
+    except Exception as e:
+        logger.error(f"Error in route_legal_question: {str(e)}")
+        raise e
+
+@traced("tool.formulate_tax_questions")
+async def formulate_tax_questions(query: str, context_variables: Optional[Dict] = None, model: Optional[str] = None) -> str:
     """
     Formulates tax questions from a given query to improve search results.
     
     Args:
         query: The user's tax-related query.
+        model: Gemini model to use (defaults to the reformulate stage's model).
         
     Returns:
         A reformulated question optimized for vector search.
@@ -35,6 +63,7 @@ async def formulate_tax_questions(query: str, context_variables: Optional[Dict]
         Keep in mind that the user is a ai-agent that has access to the full tax law document in its vector store. You should formulate the question in such a way that will match the vector store. Make sure to keep the question precise and to the point yet covering all the aspects of the question. The question should be maximum 20 more than the original question. 
         Question: {query}
         NOTE: Keep the question direct and remove all kinds of fluff words.
+        If the question covers several distinct topics (for example HRA exemption and 80GG), write one focused question per topic, at most {max_queries}, one per line with no numbering. Otherwise write exactly one question.
         example:
         Question: What is the tax rate for income from salary?
         How to formulate the question:
@@ -57,8 +86,14 @@ async def formulate_tax_questions(query: str, context_variables: Optional[Dict]
             original_query = query
             workplan = "Formulate a precise tax question to improve vector search results"
             
-        prompt = prompt_template.format(query=query)
-        llm_response = llm.complete(prompt)
+        prompt = prompt_template.format(query=query, max_queries=settings.MULTI_QUERY_MAX)
+        if context_variables and context_variables.get("conversation"):
+            # Lets follow-ups ("and for senior citizens?") be resolved against earlier turns
+            prompt += f"""
+        Conversation so far (use it only to resolve references in the question):
+        {context_variables["conversation"]}
+        """
+        llm_response = await gemini_client.generate(prompt, model=model or model_policy.model("reformulate"))
         reformulated_question = llm_response.text
         logger.info(f"Successfully formulated tax questions: {reformulated_question[:100]}...")
 
@@ -82,6 +117,47 @@ async def formulate_tax_questions(query: str, context_variables: Optional[Dict]
         logger.error(f"Error in formulate_tax_questions: {str(e)}")
         raise e
 
+def split_sub_queries(text: str, max_queries: Optional[int] = None) -> List[str]:
+    """
+    Splits a reformulation into its focused sub-queries (one per line).
+    
+    Args:
+        text: Output of formulate_tax_questions.
+        max_queries: Maximum number of sub-queries to keep.
+        
+    Returns:
+        De-duplicated sub-queries in order.
+    """
+    lines = (re.sub(r"^\s*(?:[-*\u2022]|\d+[.)])\s*", "", line).strip() for line in text.splitlines())
+    queries = list(dict.fromkeys(line for line in lines if line))
+    return queries[: max_queries or settings.MULTI_QUERY_MAX]
+
+@traced("tool.summarize_conversation")
+async def summarize_conversation(summary: str, turns: List[Turn]) -> str:
+    """
+    Folds conversation turns into the running conversation summary.
+    
+    Args:
+        summary: The summary so far (may be empty).
+        turns: Turns leaving the verbatim window, oldest first.
+        
+    Returns:
+        The updated summary.
+    """
+    transcript = "\n\n".join(turn.render() for turn in turns)
+    prompt = f"""
+    Update the summary of a conversation between a user and an Indian legal assistant.
+    Keep the facts about the user's situation, the questions asked, the sections cited and the conclusions given. Drop pleasantries.
+    Write at most 120 words of plain text.
+    Current summary: {summary or "(none)"}
+    New turns:
+    {transcript}
+    Updated summary:
+    """
+    response = await gemini_client.generate(prompt, model=model_policy.model("summarize"))
+    return (response.text or "").strip()
+
+@traced("tool.semantic_search")
 async def semantic_search(query: str, context_variables: Optional[Dict] = None) -> str:
     """
     Performs semantic search on the vector store to find relevant tax documents.
@@ -104,15 +180,17 @@ async def semantic_search(query: str, context_variables: Optional[Dict] = None)
                 workplan="Search for relevant tax law documents"
             ).model_dump()
         
-        # Perform search
-        result = pinecone_service.semantic_search(query, 12)
+        # Perform search on the tax shard unless the caller routed elsewhere;
+        # a multi-line query is searched as concurrent sub-queries and fused
+        domains = (context_variables or {}).get("domains") or ["tax"]
+        result = await search_router.search_many(split_sub_queries(query) or [query], settings.SEARCH_TOP_K, domains=domains)
         logger.info("Successfully retrieved search results")
         
         # Create the response in IndividualAgentResponse format
         response = IndividualAgentResponse(
             userquery=user_query_obj,
             query_solved=True if result else False,
-            proposed_solve=result,
+            proposed_solve=json.dumps(result),
             next_speaker="response_agent",
             next_speaker_question="Please synthesize these search results into a comprehensive answer"
         )
@@ -122,25 +200,92 @@ async def semantic_search(query: str, context_variables: Optional[Dict] = None)
         logger.error(f"Error in semantic_search: {str(e)}")
         raise e
 
-async def generate_tax_response(query: str, search_results: str, context_variables: Optional[Dict] = None) -> str:
+# Self-reported certainty line the answer ends with (drives model escalation and caching)
+CONFIDENCE_LINE = re.compile(r"\n?\s*CONFIDENCE:\s*(high|low)\s*$", re.IGNORECASE)
+CONFIDENCE_MARKER = "CONFIDENCE:"
+
+def confidence_tail_start(text: str) -> int:
     """
-    Generates a tax response based on the query and search results.
+    Where a trailing CONFIDENCE line (possibly still partial) starts in a streamed answer.
+    
+    Only the last line is held back, and only while it is, or could still
+    become, a "CONFIDENCE:" line; the word elsewhere in the answer streams as is.
     
     Args:
-        query: The tax-related query.
-        search_results: The search results from the vector store.
+        text: The answer streamed so far.
         
     Returns:
-        A comprehensive tax response in IndividualAgentResponse format.
+        The index of the text that must be held back, len(text) if none.
     """
-    logger.info(f"Generating tax response for: {query}")
-    tax_prompt = f"""
+    stripped = text.rstrip()
+    line_start = stripped.rfind("\n") + 1
+    line = stripped[line_start:].lstrip().upper()
+    if not line or CONFIDENCE_MARKER.startswith(line) or line.startswith(CONFIDENCE_MARKER):
+        held = line_start if line else len(stripped)
+    elif len(stripped) < len(text):
+        # Trailing whitespace: the next fragment may start the CONFIDENCE line
+        held = len(stripped)
+    else:
+        return len(text)
+    # The line break before it goes with it (CONFIDENCE_LINE strips it too)
+    while held > 0 and text[held - 1].isspace():
+        held -= 1
+    return held
+
+def _tax_response_prompt(query: str, search_results: str, report_confidence: bool = False, conversation: Optional[str] = None) -> str:
+    confidence = """
+    After the answer, write a last line "CONFIDENCE: high" if the documents fully answer the question, otherwise "CONFIDENCE: low".""" if report_confidence else ""
+    # Follow-ups ("and for senior citizens?") only make sense against earlier turns
+    history = f"""
+    Conversation so far (use it only to resolve what the question refers to):
+    {conversation}""" if conversation else ""
+    return f"""
     You are an experienced tax lawyer who has been working in the tax law field for more than 20 years. You are given a question and a list of documents, these documents are about tax law.
     You need to answer the question based on the documents. If it contains info about different section you must cite the section in your answer.
+    Each document starts with a citation tag like [1]; cite the documents you rely on with their tags.{confidence}{history}
     Question: {query}
-    Documents: {search_results}
+    Documents:
+    {search_results}
     Answer:
     """
+
+async def stream_tax_response(query: str, search_results: str, context_variables: Optional[Dict] = None, model: Optional[str] = None) -> AsyncIterator[str]:
+    """
+    Streams a plain-text tax answer token by token as Gemini generates it.
+    
+    Args:
+        query: The tax-related query.
+        search_results: The search results from the vector store.
+        model: Gemini model to use (defaults to the answer stage's model).
+        
+    Yields:
+        Fragments of the answer text, ending with the CONFIDENCE line
+        (see confidence_tail_start to hold it back from the client).
+    """
+    logger.info(f"Streaming tax response for: {query}")
+    prompt = _tax_response_prompt(query, search_results, report_confidence=True, conversation=(context_variables or {}).get("conversation"))
+    try:
+        async for fragment in gemini_client.stream(prompt, model=model or model_policy.model("answer")):
+            yield fragment
+    except Exception as e:
+        logger.error(f"Error in stream_tax_response: {str(e)}")
+        raise e
+
+@traced("tool.generate_tax_response")
+async def generate_tax_response(query: str, search_results: str, context_variables: Optional[Dict] = None, model: Optional[str] = None) -> str:
+    """
+    Generates a tax response based on the query and search results.
+    
+    Args:
+        query: The tax-related query.
+        search_results: The search results from the vector store.
+        model: Gemini model to use (defaults to the answer stage's model).
+        
+    Returns:
+        A comprehensive tax response in IndividualAgentResponse format.
+    """
+    logger.info(f"Generating tax response for: {query}")
+    tax_prompt = _tax_response_prompt(query, search_results, report_confidence=True, conversation=(context_variables or {}).get("conversation"))
     try:
         # Extract the original user query and workplan if it exists
         if context_variables and "userquery" in context_variables:
@@ -153,14 +298,16 @@ async def generate_tax_response(query: str, search_results: str, context_variabl
             ).model_dump()
         
         # Generate response
-        llm_response = llm.complete(tax_prompt)
-        response_text = llm_response.text
+        llm_response = await gemini_client.generate(tax_prompt, model=model or model_policy.model("answer"))
+        response_text = llm_response.text or ""
+        confidence = CONFIDENCE_LINE.search(response_text)
+        response_text = CONFIDENCE_LINE.sub("", response_text).strip()
         logger.info(f"Successfully generated tax response: {response_text[:100]}...")
         
         # Create the response in IndividualAgentResponse format
         response = IndividualAgentResponse(
             userquery=user_query_obj,
-            query_solved=True,
+            query_solved=bool(response_text) and not (confidence and confidence.group(1).lower() == "low"),
             proposed_solve=response_text,
             next_speaker="user_proxy_agent",
             next_speaker_question="Here is the final answer to your tax question"
@@ -0,0 +1,168 @@
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+from config import settings
+from token_counter import TOKENS_PER_WORD, count_tokens, truncate_to_tokens
+
+
+class ParentSectionStore:
+    """
+    Local store of full section texts used for small-to-big retrieval.
+
+    Only the small child chunks are embedded and indexed in the vector store;
+    each child carries the id of its enclosing section (parent) in its metadata.
+    The parent texts live here so that expanding a hit to its section costs a
+    dictionary lookup instead of another vector call.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or settings.PARENT_STORE_PATH
+        self.parents: Dict[str, Dict[str, str]] = {}
+        self._load()
+
+    def _load(self) -> None:
+        """Load parents from disk if the store file exists"""
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.parents = json.load(f)
+
+    def save(self) -> None:
+        """Persist parents to disk"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.parents, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def add_sections(self, sections: List[Dict[str, str]], document_id: str) -> None:
+        """
+        Add or replace parent sections and persist the store.
+
+        Args:
+            sections: Sections as produced by LegalDocumentChunker.split_sections
+            document_id: Unique identifier for the document
+        """
+        for section in sections:
+            self.parents[section["parent_id"]] = {
+                "document_id": document_id,
+                "section_id": section["section_id"],
+                "title": section["title"],
+                "text": section["text"],
+            }
+        self.save()
+
+    def get(self, parent_id: str) -> Optional[Dict[str, str]]:
+        return self.parents.get(parent_id)
+
+    def expand(self, child_results: List[Dict], max_tokens: int) -> List[Dict]:
+        """
+        Replace child hits with their de-duplicated parent sections.
+
+        Children are expected in rank order; a parent is placed at the rank of its
+        best child and keeps that child's score. Parents are added whole while they
+        fit in max_tokens. A parent that does not fit (sections of the Act run to
+        tens of thousands of words) is cut to a window around its matched children,
+        sized to its share of the remaining budget; if its best child cannot be found
+        in it or does not fit, its child chunks are used instead. The best hit is never dropped.
+
+        Args:
+            child_results: Formatted search results that carry a parent_id
+            max_tokens: Token cap for the combined parent text
+
+        Returns:
+            List of parent results in rank order
+        """
+        grouped: Dict[str, Dict] = {}
+        for child in child_results:
+            parent_id = child.get("parent_id") or child.get("page_id") or str(id(child))
+            if parent_id in grouped:
+                grouped[parent_id]["matched_chunks"].append(child["content"])
+                continue
+            parent = self.get(parent_id) if child.get("parent_id") else None
+            grouped[parent_id] = {
+                **child,
+                "parent_id": parent_id,
+                "section_id": parent["section_id"] if parent else child.get("section_id", ""),
+                "section_title": parent["title"] if parent else "",
+                # Fall back to the child text if the parent is missing from the local store
+                "content": parent["text"] if parent else child["content"],
+                "matched_chunks": [child["content"]],
+            }
+
+        results = []
+        used_tokens = 0
+        parents = list(grouped.values())
+        for index, result in enumerate(parents):
+            remaining = max_tokens - used_tokens
+            tokens = count_tokens(result["content"])
+            if tokens > remaining:
+                # Share what is left with the parents still to come
+                share = max(remaining // (len(parents) - index), 1)
+                content = self._window(result["content"], result["matched_chunks"], share, remaining)
+                if content is None:
+                    content = self._children_within(result["matched_chunks"], remaining)
+                if content is None:
+                    if results:
+                        continue
+                    content = truncate_to_tokens(result["matched_chunks"][0], remaining)
+                result["content"] = content
+                tokens = count_tokens(content)
+            results.append(result)
+            used_tokens += tokens
+        return results
+
+    @staticmethod
+    def _locate(joined: str, chunk: str) -> Optional[Tuple[int, int]]:
+        """Word span [start, end) of a child chunk inside its parent's words"""
+        needle = " ".join(chunk.split())
+        offset = joined.find(needle) if needle else -1
+        if offset < 0:
+            return None
+        start = joined.count(" ", 0, offset)
+        return start, start + len(needle.split(" "))
+
+    def _window(self, text: str, chunks: List[str], target_tokens: int, max_tokens: int) -> Optional[str]:
+        """
+        The part of a parent around its matched children.
+
+        Starts from the best child's span, takes in the other children while the
+        span stays within target_tokens, then pads it evenly with surrounding text
+        up to target_tokens. None if the best child cannot be found in the parent
+        or does not fit in max_tokens.
+        """
+        words = text.split()
+        joined = " ".join(words)
+        spans = [self._locate(joined, chunk) for chunk in chunks]
+        if not spans or spans[0] is None:
+            return None
+        target_words = int(max(target_tokens, 0) / TOKENS_PER_WORD)
+        max_words = int(max_tokens / TOKENS_PER_WORD)
+        start, end = spans[0]
+        if end - start > max_words:
+            return None
+        for span in spans[1:]:
+            if span is not None and max(end, span[1]) - min(start, span[0]) <= target_words:
+                start, end = min(start, span[0]), max(end, span[1])
+        padding = max(min(target_words, max_words) - (end - start), 0)
+        before = min(padding // 2, start)
+        after = min(padding - before, len(words) - end)
+        before = min(padding - after, start)
+        return " ".join(words[start - before:end + after])
+
+    @staticmethod
+    def _children_within(chunks: List[str], max_tokens: int) -> Optional[str]:
+        """The matched child chunks, best first, that fit in max_tokens (None if the best does not)"""
+        kept = []
+        used = 0
+        for chunk in chunks:
+            tokens = count_tokens(chunk)
+            if used + tokens > max_tokens:
+                break
+            kept.append(chunk)
+            used += tokens
+        return "\n\n".join(kept) if kept else None
+
+
+parent_store = ParentSectionStore()
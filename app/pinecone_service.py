@@ -1,22 +1,41 @@
 import os
-from typing import Dict, List, Callable
+import time
+from typing import Dict, List, Callable, Optional
 import pandas as pd
 from tqdm import tqdm
 from config import settings
+from app_logger.metrics import metrics
+from app_logger.tracing import tracer
+from parent_store import parent_store
+from local_vector_store import NamespacedLocalVectorStore
 from sentence_transformers import SentenceTransformer
 from langchain_core.documents import Document
 from langchain_pinecone import PineconeVectorStore
 
+embedding_seconds = metrics.histogram("lawgpt_embedding_seconds", "Sentence-transformer encoding time by operation (query, documents)")
+embedding_texts = metrics.histogram("lawgpt_embedding_batch_size", "Texts encoded per embedding call", buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512))
+vector_search_seconds = metrics.histogram("lawgpt_vector_search_seconds", "Vector store search time per shard by backend and namespace")
+vector_search_errors_total = metrics.counter("lawgpt_vector_search_errors_total", "Failed vector store searches by backend and namespace")
+
 class SentenceTransformerWrapper:
     """Adapter for SentenceTransformer to match LangChain interface"""
     def __init__(self, model_name: str = 'sentence-transformers/multi-qa-mpnet-base-dot-v1', device: str = 'cpu'):
         self.model = SentenceTransformer(model_name, device=device)
         
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        return self.model.encode(texts, convert_to_tensor=False).tolist()
+        started = time.perf_counter()
+        with tracer.span("embed.documents", attributes={"embed.texts": len(texts)}):
+            embeddings = self.model.encode(texts, convert_to_tensor=False).tolist()
+        embedding_seconds.observe(time.perf_counter() - started, operation="documents")
+        embedding_texts.observe(len(texts))
+        return embeddings
     
     def embed_query(self, text: str) -> List[float]:
-        return self.model.encode(text, convert_to_tensor=False).tolist()
+        started = time.perf_counter()
+        with tracer.span("embed.query"):
+            embedding = self.model.encode(text, convert_to_tensor=False).tolist()
+        embedding_seconds.observe(time.perf_counter() - started, operation="query")
+        return embedding
 
 class PineconeService:
     def __init__(self):
@@ -30,6 +49,7 @@ class PineconeService:
         self.embedding_dimension = 1536  # Dimension for model output
         self.embeddings = self._initialize_embeddings()
         self.vector_store = self._initialize_vector_store()
+        self._index_version = (None, "")
 
     def _initialize_embeddings(self) -> SentenceTransformerWrapper:
         """Initialize Sentence Transformer model with wrapper"""
@@ -40,13 +60,39 @@ class PineconeService:
         )
 
     def _initialize_vector_store(self) -> PineconeVectorStore:
-        """Initialize and return Pinecone vector store"""
+        """Initialize and return Pinecone vector store (or the local store when VECTOR_BACKEND=local)"""
+        if settings.VECTOR_BACKEND == "local":
+            return NamespacedLocalVectorStore(embedding=self.embeddings)
         return PineconeVectorStore(
             pinecone_api_key=settings.PINECONE_API_KEY,
             index_name=settings.PINECONE_INDEX,
             embedding=self.embeddings
         )
 
+    def index_version(self) -> str:
+        """
+        Version of the indexed content, used to invalidate answers cached from an older index.
+
+        Combines INDEX_VERSION (bump it when the Pinecone index is rebuilt elsewhere)
+        with the stamp written by every ingest from this codebase.
+        """
+        try:
+            mtime = os.stat(settings.INDEX_VERSION_PATH).st_mtime_ns
+        except FileNotFoundError:
+            return f"{settings.INDEX_VERSION}:0"
+        if self._index_version[0] != mtime:
+            with open(settings.INDEX_VERSION_PATH, "r", encoding="utf-8") as f:
+                self._index_version = (mtime, f.read().strip())
+        return f"{settings.INDEX_VERSION}:{self._index_version[1]}"
+
+    def _bump_index_version(self) -> None:
+        """Record that the indexed content changed"""
+        directory = os.path.dirname(settings.INDEX_VERSION_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(settings.INDEX_VERSION_PATH, "w", encoding="utf-8") as f:
+            f.write(str(time.time_ns()))
+
     def get_embedding(self, text: str) -> List[float]:
         """
         Get embeddings using Sentence Transformers.
@@ -133,13 +179,14 @@ class PineconeService:
         """Check if the text contains visual content markers"""
         return "DESCRIPTION OF THE IMAGE OR CHART" in text or "TRANSCRIPTION OF THE TABLE" in text
 
-    def semantic_search(self, query: str, top_k: int = 12) -> List[Dict]:
+    def semantic_search(self, query: str, top_k: int = 12, namespace: Optional[str] = None) -> List[Dict]:
         """
         Perform semantic search on stored documents.
         
         Args:
             query: Search query
             top_k: Number of results to return
+            namespace: Corpus shard to search (default namespace if None)
         
         Returns:
             List of search results with metadata
@@ -150,36 +197,108 @@ class PineconeService:
         try:
             results = self.vector_store.similarity_search_with_score(
                 query=query,
-                k=top_k
+                k=top_k,
+                namespace=namespace
             )
             return [self._format_search_result(doc, score) for doc, score in results]
         except Exception as e:
             print(f"Error performing semantic search: {e}")
             raise
 
+    def semantic_search_by_vector(self, embedding: List[float], top_k: int = 12, namespace: Optional[str] = None) -> List[Dict]:
+        """
+        Perform semantic search with a precomputed query embedding, so that one
+        embedding can be reused across several corpus shards.
+
+        Args:
+            embedding: Query embedding (see get_embedding)
+            top_k: Number of results to return
+            namespace: Corpus shard to search (default namespace if None)
+
+        Returns:
+            List of search results with metadata
+        """
+        started = time.perf_counter()
+        try:
+            with tracer.span("vector.search", kind="client", attributes={"vector.backend": settings.VECTOR_BACKEND, "vector.namespace": namespace or "default", "vector.top_k": top_k}):
+                results = self.vector_store.similarity_search_by_vector_with_score(
+                    embedding=embedding,
+                    k=top_k,
+                    namespace=namespace
+                )
+            vector_search_seconds.observe(time.perf_counter() - started, backend=settings.VECTOR_BACKEND, namespace=namespace or "default")
+            return [self._format_search_result(doc, score) for doc, score in results]
+        except Exception as e:
+            vector_search_errors_total.inc(backend=settings.VECTOR_BACKEND, namespace=namespace or "default")
+            print(f"Error performing semantic search in namespace {namespace}: {e}")
+            raise
+
+    @staticmethod
+    def _source_id(metadata: Dict) -> str:
+        """
+        Identifier of the stored page or chunk a hit came from.
+
+        Legal chunks carry no page_number; they are identified by chunk number
+        instead of all sharing a "-page-None" id.
+        """
+        document_id = metadata.get("document_id", "")
+        if metadata.get("page_number") not in (None, ""):
+            return f"{document_id}-page-{metadata['page_number']}"
+        if metadata.get("chunk_number") not in (None, ""):
+            return f"{document_id}-chunk-{metadata['chunk_number']}"
+        return document_id
+
     def _format_search_result(self, doc: Document, score: float) -> Dict:
         """
         Format a search result for return
         
         Args:
             doc: Search result from Pinecone
-            score: Similarity score
+            score: Similarity score (higher is better on every backend)
         
         Returns:
             Dictionary containing formatted search result
         """
         metadata = doc.metadata
-        return {
-            "page_id": f"{metadata.get('document_id')}-page-{metadata.get('page_number')}",
+        result = {
+            "page_id": self._source_id(metadata),
             "user_document_id": metadata.get("document_id", ""),
             "page_number": metadata.get("page_number", ""),
+            "chunk_number": metadata.get("chunk_number", ""),
             "image_path": metadata.get("image_path", ""),
             "has_visual_content": metadata.get("has_visual_content", ""),
             "content": doc.page_content,
-            "similarity_score": 1 - score if score <= 1 else score,
+            "similarity_score": score,
         }
+        if metadata.get("parent_id"):
+            result["parent_id"] = metadata["parent_id"]
+            result["section_id"] = metadata.get("section_id", "")
+        return result
 
-    def store_legal_chunks(self, chunks: List[str], document_id: str, progress_bar: tqdm) -> None:
+    def small_to_big_search(self, query: str, top_k: int = 12, max_tokens: Optional[int] = None, namespace: Optional[str] = None) -> List[Dict]:
+        """
+        Match the query against small child chunks and return their enclosing sections.
+
+        Uses a single vector search; the sections are read from the local parent store,
+        de-duplicated and capped at max_tokens.
+
+        Args:
+            query: Search query
+            top_k: Number of child chunks to match
+            max_tokens: Token cap for the returned section text (defaults to SMALL_TO_BIG_MAX_TOKENS)
+            namespace: Corpus shard to search (default namespace if None)
+
+        Returns:
+            List of section results in rank order
+        """
+        try:
+            child_results = self.semantic_search(query, top_k, namespace=namespace)
+            return parent_store.expand(child_results, max_tokens or settings.SMALL_TO_BIG_MAX_TOKENS)
+        except Exception as e:
+            print(f"Error performing small-to-big search: {e}")
+            raise
+
+    def store_legal_chunks(self, chunks: List[str], document_id: str, progress_bar: tqdm, namespace: Optional[str] = None) -> None:
         """
         Store legal document chunks in Pinecone with progress tracking
         
@@ -187,6 +306,7 @@ class PineconeService:
             chunks: List of text chunks to store
             document_id: Unique identifier for the document
             progress_bar: tqdm progress bar instance
+            namespace: Corpus shard to store the chunks in
         """
         try:
             documents = []
@@ -209,7 +329,8 @@ class PineconeService:
                 progress_bar.update(1)  # Update progress bar
             
             if documents:
-                self.vector_store.add_documents(documents)
+                self.vector_store.add_documents(documents, namespace=namespace)
+                self._bump_index_version()
                 print(f"Successfully stored {len(documents)} legal chunks in Pinecone")
             else:
                 print("No valid chunks to store")
@@ -218,4 +339,45 @@ class PineconeService:
             print(f"Error storing legal chunks in Pinecone: {e}")
             raise
 
+    def store_legal_chunks_hierarchical(self, parents: List[Dict[str, str]], children: List[Dict[str, str]], document_id: str, progress_bar: tqdm, namespace: Optional[str] = None) -> None:
+        """
+        Store child chunks in Pinecone and their parent sections in the local parent store
+
+        Args:
+            parents: Sections as produced by LegalDocumentChunker.chunk_document_hierarchical
+            children: Child chunks carrying the parent_id of their section
+            document_id: Unique identifier for the document
+            progress_bar: tqdm progress bar instance
+            namespace: Corpus shard to store the child chunks in
+        """
+        try:
+            parent_store.add_sections(parents, document_id)
+
+            documents = []
+            for idx, child in enumerate(children):
+                metadata = {
+                    "document_id": document_id,
+                    "chunk_number": str(idx + 1),
+                    "document_type": "legal",
+                    "source": "LegalDocumentChunker",
+                    "parent_id": child["parent_id"],
+                    "section_id": child["section_id"],
+                }
+                documents.append(Document(
+                    page_content=child["text"],
+                    metadata=metadata
+                ))
+                progress_bar.update(1)
+
+            if documents:
+                self.vector_store.add_documents(documents, namespace=namespace)
+                self._bump_index_version()
+                print(f"Successfully stored {len(documents)} child chunks for {len(parents)} sections")
+            else:
+                print("No valid chunks to store")
+
+        except Exception as e:
+            print(f"Error storing hierarchical chunks: {e}")
+            raise
+
 pinecone_service = PineconeService()
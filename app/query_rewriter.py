@@ -0,0 +1,196 @@
+import json
+import os
+import re
+from collections import deque
+from typing import Dict, List, Optional, Sequence, Tuple
+from pydantic import BaseModel, Field
+from config import settings
+from app_logger.ai_service_logger import setup_logger
+
+logger = setup_logger("query_rewriter")
+
+WORD = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+STOPWORDS = {
+    "a", "an", "and", "any", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how", "i", "in",
+    "is", "it", "me", "my", "of", "on", "or", "the", "to", "under", "what", "when", "which", "who", "will", "with",
+}
+# Irregular plurals that occur in section titles
+IRREGULAR = {"premia": "premium", "monies": "money", "allowances": "allowance"}
+
+
+def _stem(word: str) -> str:
+    if word in IRREGULAR:
+        return IRREGULAR[word]
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def normalize_tokens(text: str) -> List[str]:
+    """Lower-case, tokenise and lightly stem text so titles and questions match"""
+    return [_stem(word) for word in WORD.findall(text.lower().replace("’", "'"))]
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick automaton over word tokens.
+
+    Patterns are token sequences, so matches always fall on word boundaries and
+    all dictionary phrases are found in one pass over the query, independent of
+    the dictionary size.
+    """
+
+    def __init__(self):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[List[Tuple[int, int]]] = [[]]  # (pattern id, pattern length)
+
+    def add(self, tokens: Sequence[str], pattern_id: int) -> None:
+        state = 0
+        for token in tokens:
+            if token not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+                self.goto[state][token] = len(self.goto) - 1
+            state = self.goto[state][token]
+        self.output[state].append((pattern_id, len(tokens)))
+
+    def build(self) -> None:
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, child in self.goto[state].items():
+                queue.append(child)
+                if state:
+                    fallback = self.fail[state]
+                    while fallback and token not in self.goto[fallback]:
+                        fallback = self.fail[fallback]
+                    self.fail[child] = self.goto[fallback].get(token, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def search(self, tokens: Sequence[str]) -> List[Tuple[int, int, int]]:
+        """All matches as (start token, end token exclusive, pattern id)"""
+        matches = []
+        state = 0
+        for index, token in enumerate(tokens):
+            while state and token not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(token, 0)
+            for pattern_id, length in self.output[state]:
+                matches.append((index - length + 1, index + 1, pattern_id))
+        return matches
+
+
+class RewriteResult(BaseModel):
+    query: str
+    rewritten: str
+    expansions: Dict[str, str] = Field(default_factory=dict, description="Acronym -> expansion")
+    sections: List[str] = Field(default_factory=list, description="Section hints in order of appearance")
+    matched: List[str] = Field(default_factory=list, description="Dictionary phrases found in the query")
+    confidence: float = Field(default=0.0, description="Share of the query's content words explained by the dictionary (acronyms excluded)")
+
+    @property
+    def confident(self) -> bool:
+        return bool(self.matched) and self.confidence >= settings.QUERY_REWRITE_CONFIDENCE
+
+
+class QueryRewriter:
+    """
+    Deterministic query rewriting from a dictionary mined from the Act (see mine_terms.py).
+
+    Acronyms are expanded in place ("TDS" -> "tax deducted at source (TDS)"),
+    section numbers get their titles, and the sections whose titles or
+    definitions match the question are appended as hints ("Relevant
+    sections: 80C"). Matching is a single Aho-Corasick pass, so a rewrite takes
+    microseconds; the LLM reformulation is only needed when the dictionary
+    explains too little of the question. Expanding an acronym explains
+    nothing about what is asked, so acronyms do not count towards confidence.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or settings.TERM_DICTIONARY_PATH
+        self.entries: List[Dict] = []
+        self.automaton: Optional[AhoCorasick] = None
+        self.load()
+
+    def load(self) -> None:
+        if not os.path.exists(self.path):
+            logger.warning(f"Term dictionary not found at {self.path}; run mine_terms.py to enable local query rewriting")
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            self.entries = json.load(f)["entries"]
+        automaton = AhoCorasick()
+        for pattern_id, entry in enumerate(self.entries):
+            tokens = normalize_tokens(entry["phrase"])
+            if tokens:
+                automaton.add(tokens, pattern_id)
+        automaton.build()
+        self.automaton = automaton
+
+    @staticmethod
+    def _longest_non_overlapping(matches: List[Tuple[int, int, int]]) -> List[Tuple[int, int, int]]:
+        chosen = []
+        taken = set()
+        for start, end, pattern_id in sorted(matches, key=lambda m: (-(m[1] - m[0]), m[0])):
+            if not taken.intersection(range(start, end)):
+                chosen.append((start, end, pattern_id))
+                taken.update(range(start, end))
+        return sorted(chosen)
+
+    def rewrite(self, query: str) -> RewriteResult:
+        """
+        Expand acronyms and add section hints to a query.
+
+        Args:
+            query: The user's question
+
+        Returns:
+            The rewrite with the expansions, section hints and a confidence score
+        """
+        if self.automaton is None:
+            return RewriteResult(query=query, rewritten=query)
+
+        tokens = normalize_tokens(query)
+        matches = self._longest_non_overlapping(self.automaton.search(tokens))
+
+        expansions: Dict[str, str] = {}
+        sections: List[str] = []
+        titles: List[str] = []
+        covered = set()
+        for start, end, pattern_id in matches:
+            entry = self.entries[pattern_id]
+            if entry["kind"] != "acronym":
+                covered.update(range(start, end))
+            if entry["kind"] == "acronym":
+                expansions[entry["phrase"]] = entry["expansion"]
+            elif entry["kind"] == "section":
+                # A bare section number says nothing to the embedding model; its title does
+                titles.append(entry["title"])
+            for section in entry.get("sections", []):
+                if section not in sections:
+                    sections.append(section)
+
+        rewritten = query
+        for acronym, expansion in expansions.items():
+            rewritten = re.sub(rf"\b{re.escape(acronym)}\b", lambda m: f"{expansion} ({m.group(0)})", rewritten, count=1, flags=re.IGNORECASE)
+        if titles:
+            rewritten = f"{rewritten.rstrip()} ({'; '.join(titles)})"
+        if sections:
+            rewritten = f"{rewritten.rstrip()} Relevant sections: {', '.join(sections[:5])}."
+
+        content = [index for index, token in enumerate(tokens) if token not in STOPWORDS]
+        confidence = len(covered.intersection(content)) / len(content) if content else 0.0
+        return RewriteResult(
+            query=query,
+            rewritten=rewritten,
+            expansions=expansions,
+            sections=sections,
+            matched=[self.entries[pattern_id]["phrase"] for _, _, pattern_id in matches],
+            confidence=round(confidence, 3),
+        )
+
+
+query_rewriter = QueryRewriter()
@@ -0,0 +1,250 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+from config import settings
+from app_logger.ai_service_logger import setup_logger
+from app_logger.metrics import metrics
+from ai_service.resilience import deadline_scope
+
+logger = setup_logger("request_scheduler")
+
+queue_wait_seconds = metrics.histogram("lawgpt_scheduler_queue_wait_seconds", "Time requests spent queued before admission")
+service_seconds = metrics.histogram("lawgpt_scheduler_service_seconds", "Time admitted requests held a slot")
+rejections_total = metrics.counter("lawgpt_scheduler_rejections_total", "Requests rejected or shed by the scheduler")
+admitted_total = metrics.counter("lawgpt_scheduler_admitted_total", "Requests admitted by the scheduler")
+queue_depth = metrics.gauge("lawgpt_scheduler_queue_depth", "Requests waiting for a slot")
+in_flight = metrics.gauge("lawgpt_scheduler_in_flight", "Requests currently holding a slot")
+
+# Receives (position in queue, estimated wait in seconds) while a request is queued
+QueueListener = Callable[[int, float], Awaitable[None]]
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is not admitted (queue full or it cannot meet its deadline)"""
+
+    def __init__(self, reason: str, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def parse_deadline(value: Any) -> Optional[float]:
+    """
+    A client-supplied deadline in seconds, capped at REQUEST_DEADLINE_SECONDS.
+
+    Raises:
+        ValueError: The value is not a positive number of seconds
+    """
+    if value is None:
+        return None
+    try:
+        if isinstance(value, bool):
+            raise TypeError
+        seconds = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid deadline {value!r}: expected a number of seconds")
+    if not math.isfinite(seconds) or seconds <= 0:
+        raise ValueError(f"Invalid deadline {value!r}: must be a positive number of seconds")
+    return min(seconds, settings.REQUEST_DEADLINE_SECONDS)
+
+
+class _Waiter:
+    __slots__ = ("client_id", "start_tag", "deadline", "enqueued_at", "future")
+
+    def __init__(self, client_id: str, start_tag: float, deadline: float):
+        self.client_id = client_id
+        self.start_tag = start_tag
+        self.deadline = deadline
+        self.enqueued_at = time.monotonic()
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+def parse_client_weights(spec: str) -> Dict[str, float]:
+    """Parse "client_a:3,client_b:0.5" into a weight map"""
+    weights = {}
+    for item in filter(None, (part.strip() for part in (spec or "").split(","))):
+        client_id, _, weight = item.partition(":")
+        weights[client_id.strip()] = float(weight or 1)
+    return weights
+
+
+class RequestScheduler:
+    """
+    Admission control in front of the LLM-bound paralegal runs.
+
+    At most max_concurrency requests run at once and at most per_client_limit
+    of them for one client. Waiting requests are served with start-time fair
+    queuing: each client's requests get virtual start tags that advance by
+    1/weight per request, and the lowest tag among clients that are under their
+    limit goes next. A client bursting 50 questions therefore gets its weighted
+    share of slots instead of all of them.
+
+    Requests are rejected up front when the queue is full, and shed (at
+    admission or when they reach the head of the queue) when the estimated
+    wait plus service time would overrun their deadline; failing fast is
+    cheaper than spending Gemini quota on an answer nobody will wait for.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        per_client_limit: Optional[int] = None,
+        max_queue_depth: Optional[int] = None,
+        default_deadline: Optional[float] = None,
+        client_weights: Optional[Dict[str, float]] = None,
+    ):
+        self.max_concurrency = max_concurrency or settings.SCHEDULER_MAX_CONCURRENCY
+        self.per_client_limit = per_client_limit or settings.SCHEDULER_PER_CLIENT_LIMIT
+        self.max_queue_depth = max_queue_depth if max_queue_depth is not None else settings.SCHEDULER_MAX_QUEUE_DEPTH
+        self.default_deadline = default_deadline or settings.REQUEST_DEADLINE_SECONDS
+        self.client_weights = client_weights if client_weights is not None else parse_client_weights(settings.SCHEDULER_CLIENT_WEIGHTS)
+
+        self.queues: Dict[str, Deque[_Waiter]] = {}
+        self.finish_tags: Dict[str, float] = {}
+        self.running: Dict[str, int] = {}
+        self.active = 0
+        self.virtual_time = 0.0
+        # EWMA of slot holding time, seeded pessimistically until real runs are observed
+        self.service_estimate = settings.SCHEDULER_INITIAL_SERVICE_SECONDS
+
+    @property
+    def depth(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+
+    def weight(self, client_id: str) -> float:
+        return max(self.client_weights.get(client_id, 1.0), 1e-3)
+
+    def estimated_wait(self, position: int) -> float:
+        """Expected queueing delay for a request with `position` requests ahead of it"""
+        if self.active < self.max_concurrency and position == 0:
+            return 0.0
+        return (position + 1) * self.service_estimate / self.max_concurrency
+
+    def _reject(self, reason: str, message: str, client_id: str, retry_after: Optional[float] = None):
+        rejections_total.inc(reason=reason)
+        logger.warning(f"Rejected request from {client_id}: {message}")
+        raise AdmissionRejected(reason, message, retry_after)
+
+    def _eligible(self, client_id: str) -> bool:
+        return self.running.get(client_id, 0) < self.per_client_limit
+
+    def _dispatch(self) -> None:
+        """Hand free slots to the waiting requests with the lowest virtual start tags"""
+        now = time.monotonic()
+        while self.active < self.max_concurrency:
+            candidates = [queue[0] for client_id, queue in self.queues.items() if queue and self._eligible(client_id)]
+            if not candidates:
+                break
+            waiter = min(candidates, key=lambda w: w.start_tag)
+            self.queues[waiter.client_id].popleft()
+            if not self.queues[waiter.client_id]:
+                del self.queues[waiter.client_id]
+            queue_depth.set(self.depth)
+            if waiter.future.done():
+                continue
+            if now + self.service_estimate > waiter.deadline:
+                rejections_total.inc(reason="deadline")
+                waiter.future.set_exception(AdmissionRejected("deadline", "Request shed: it can no longer finish within its deadline"))
+                continue
+            self.virtual_time = max(self.virtual_time, waiter.start_tag)
+            self.active += 1
+            self.running[waiter.client_id] = self.running.get(waiter.client_id, 0) + 1
+            waiter.future.set_result(None)
+
+    def _discard(self, waiter: _Waiter) -> None:
+        queue = self.queues.get(waiter.client_id)
+        if queue and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del self.queues[waiter.client_id]
+            queue_depth.set(self.depth)
+        self._forget_idle()
+
+    def _forget_idle(self) -> None:
+        """Drop finish tags that no longer affect scheduling, so one-off clients do not accumulate"""
+        if not self.active and not self.queues:
+            # End of a busy period: as in SFQ, virtual time moves on to the last finish tag
+            self.virtual_time = max([self.virtual_time, *self.finish_tags.values()])
+        for client_id in [c for c, tag in self.finish_tags.items() if tag <= self.virtual_time]:
+            # A new request would start at virtual_time anyway
+            if client_id not in self.queues and client_id not in self.running:
+                del self.finish_tags[client_id]
+
+    def _release(self, client_id: str, held_for: float) -> None:
+        self.active -= 1
+        self.running[client_id] -= 1
+        if not self.running[client_id]:
+            del self.running[client_id]
+        self.service_estimate = 0.8 * self.service_estimate + 0.2 * held_for
+        service_seconds.observe(held_for)
+        in_flight.set(self.active)
+        self._dispatch()
+        self._forget_idle()
+
+    @asynccontextmanager
+    async def slot(self, client_id: str, deadline: Optional[float] = None, on_queued: Optional[QueueListener] = None):
+        """
+        Wait for an execution slot for one request.
+
+        Args:
+            client_id: Client the request is accounted to
+            deadline: Seconds the caller is willing to wait for the whole request (at most the default)
+            on_queued: Optional callback told the queue position and estimated wait (backpressure)
+
+        Raises:
+            AdmissionRejected: Queue full, or the request cannot finish within its deadline
+        """
+        deadline = min(deadline, self.default_deadline) if deadline and deadline > 0 else self.default_deadline
+        deadline_at = time.monotonic() + deadline
+        position = self.depth
+        if position >= self.max_queue_depth:
+            self._reject("queue_full", f"Server busy: {position} requests queued", client_id, retry_after=self.estimated_wait(position))
+        wait = self.estimated_wait(position)
+        if time.monotonic() + wait + self.service_estimate > deadline_at:
+            self._reject("deadline", f"Server busy: estimated wait {wait:.0f}s exceeds the request deadline", client_id, retry_after=wait)
+
+        start_tag = max(self.virtual_time, self.finish_tags.get(client_id, 0.0))
+        self.finish_tags[client_id] = start_tag + 1.0 / self.weight(client_id)
+        waiter = _Waiter(client_id, start_tag, deadline_at)
+        self.queues.setdefault(client_id, deque()).append(waiter)
+        queue_depth.set(self.depth)
+        self._dispatch()
+
+        try:
+            if not waiter.future.done() and on_queued is not None:
+                await on_queued(position, wait)
+            await waiter.future
+        except BaseException:
+            if waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None:
+                # Admitted just as the caller went away: give the slot back
+                self._release(client_id, 0.0)
+            else:
+                self._discard(waiter)
+            raise
+
+        queued_for = time.monotonic() - waiter.enqueued_at
+        queue_wait_seconds.observe(queued_for)
+        admitted_total.inc()
+        in_flight.set(self.active)
+        started = time.monotonic()
+        try:
+            # LLM calls made while holding the slot share what is left of the request deadline
+            with deadline_scope(deadline_at - started):
+                yield
+        finally:
+            self._release(client_id, time.monotonic() - started)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "active": self.active,
+            "queued": self.depth,
+            "max_concurrency": self.max_concurrency,
+            "per_client_limit": self.per_client_limit,
+            "service_estimate_s": round(self.service_estimate, 3),
+        }
+
+
+request_scheduler = RequestScheduler()
@@ -1,5 +1,7 @@
 from legal_chunker import legal_chunker as chunker
 from pinecone_service import pinecone_service
+from config import settings
+from corpora import CORPORA
 from tqdm import tqdm
 
 try:
@@ -8,20 +10,38 @@ try:
     with open('income_tax_act_1961.md', 'r') as f:
         content = f.read()
     
-    print("Chunking document...")
-    chunks = chunker.chunk_document(content)
-    print(f"Chunk sizes: {[len(c.split()) for c in chunks]}")
-    print(f"Max chunk size: {max(len(c.split()) for c in chunks)}")
+    if settings.RETRIEVAL_MODE == "small_to_big":
+        # Index small child chunks, keep full sections in the local parent store
+        print("Chunking document into sections and child chunks...")
+        parents, children = chunker.chunk_document_hierarchical(content, "income_tax_act_1961")
+        print(f"Sections: {len(parents)}, child chunks: {len(children)}")
+
+        print(f"\nStoring {len(children)} child chunks in Pinecone...")
+        with tqdm(total=len(children), desc="Uploading child chunks") as pbar:
+            pinecone_service.store_legal_chunks_hierarchical(
+                parents=parents,
+                children=children,
+                document_id="income_tax_act_1961",
+                progress_bar=pbar,
+                namespace=CORPORA["tax"].namespace
+            )
+        print(f"\n✅ Successfully stored {len(children)} child chunks for {len(parents)} sections")
+    else:
+        print("Chunking document...")
+        chunks = chunker.chunk_document(content)
+        print(f"Chunk sizes: {[len(c.split()) for c in chunks]}")
+        print(f"Max chunk size: {max(len(c.split()) for c in chunks)}")
     
-    # Store in Pinecone with progress tracking
-    print(f"\nStoring {len(chunks)} chunks in Pinecone...")
-    with tqdm(total=len(chunks), desc="Uploading chunks") as pbar:
-        pinecone_service.store_legal_chunks(
-            chunks=chunks,
-            document_id="income_tax_act_1961",
-            progress_bar=pbar  # Pass the progress bar directly
-        )
-    print(f"\n✅ Successfully stored {len(chunks)} legal chunks in Pinecone")
+        # Store in Pinecone with progress tracking
+        print(f"\nStoring {len(chunks)} chunks in Pinecone...")
+        with tqdm(total=len(chunks), desc="Uploading chunks") as pbar:
+            pinecone_service.store_legal_chunks(
+                chunks=chunks,
+                document_id="income_tax_act_1961",
+                progress_bar=pbar,  # Pass the progress bar directly
+                namespace=CORPORA["tax"].namespace
+            )
+        print(f"\n✅ Successfully stored {len(chunks)} legal chunks in Pinecone")
 
     # After generating chunks
 
@@ -0,0 +1,112 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Coroutine, Dict, Optional, Tuple
+from config import settings
+from app_logger.ai_service_logger import setup_logger
+from app_logger.metrics import metrics
+
+logger = setup_logger("run_registry")
+
+# (client_id, request_id); request_id is None for clients that send one question at a time
+RunKey = Tuple[str, Optional[str]]
+
+cancelled_total = metrics.counter("lawgpt_runs_cancelled_total", "Paralegal runs cancelled before finishing by reason (disconnect, client_cancel, superseded)")
+cancelled_after_seconds = metrics.histogram("lawgpt_runs_cancelled_after_seconds", "How long a cancelled run had been running")
+active_runs = metrics.gauge("lawgpt_runs_active", "Paralegal runs in flight")
+
+
+class _Run:
+    __slots__ = ("task", "started")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.started = time.monotonic()
+
+
+class RunRegistry:
+    """
+    Cancellable task scope for every paralegal run, keyed by client and request.
+
+    Each run executes as its own task so the caller can keep listening to the
+    client while it works. Cancelling the task propagates through every await
+    below it: queued scheduler slots are given up, pipeline stages, search
+    fan-outs and hedged Gemini attempts are cancelled, and their slots are
+    freed at once instead of when an unread answer completes. Starting a run
+    under a key that is still running supersedes (cancels) the previous run,
+    so a client without request IDs has at most one run.
+    """
+
+    def __init__(self):
+        self.runs: Dict[RunKey, _Run] = {}
+
+    def start(self, client_id: str, work: Coroutine, request_id: Optional[str] = None) -> asyncio.Task:
+        """Run `work` as the client's run for `request_id`, cancelling the run it supersedes"""
+        key = (client_id, request_id)
+        self.cancel(client_id, "superseded", request_id=request_id)
+        task = asyncio.ensure_future(work)
+        self.runs[key] = _Run(task)
+        active_runs.set(len(self.runs))
+        task.add_done_callback(lambda done: self._finished(key, done))
+        return task
+
+    def cancel(self, client_id: str, reason: str, request_id: Optional[str] = None, task: Optional[asyncio.Task] = None) -> bool:
+        """
+        Cancel the client's run for `request_id` if one is in flight.
+
+        Args:
+            client_id: Client whose run to cancel
+            reason: Metric label (disconnect, client_cancel, superseded)
+            request_id: Which of the client's runs (None for single-question clients)
+            task: Only cancel if this is still the run for the key (e.g. a socket cleaning up its own runs)
+
+        Returns:
+            Whether a running task was cancelled
+        """
+        key = (client_id, request_id)
+        run = self.runs.get(key)
+        if run is None or (task is not None and run.task is not task):
+            return False
+        del self.runs[key]
+        active_runs.set(len(self.runs))
+        if run.task.done():
+            return False
+        self._cancel(client_id, run, reason)
+        return True
+
+    def _cancel(self, client_id: str, run: _Run, reason: str) -> None:
+        run.task.cancel()
+        elapsed = time.monotonic() - run.started
+        cancelled_total.inc(reason=reason)
+        cancelled_after_seconds.observe(elapsed)
+        logger.info(f"Cancelled run for {client_id} after {elapsed:.1f}s ({reason})")
+
+    def _finished(self, key: RunKey, task: asyncio.Task) -> None:
+        run = self.runs.get(key)
+        if run is not None and run.task is task:
+            del self.runs[key]
+            active_runs.set(len(self.runs))
+
+    async def run_until_disconnected(self, client_id: str, work: Coroutine, is_disconnected: Callable[[], Awaitable[bool]], interval: Optional[float] = None):
+        """
+        Await `work`, cancelling it once `is_disconnected()` reports the client gone.
+
+        For request/response endpoints, where nothing else notices a dropped client.
+
+        Raises:
+            asyncio.CancelledError: The client disconnected before the run finished
+        """
+        run = _Run(asyncio.ensure_future(work))
+        interval = interval or settings.DISCONNECT_POLL_SECONDS
+        try:
+            while True:
+                done, _ = await asyncio.wait({run.task}, timeout=interval)
+                if done:
+                    return run.task.result()
+                if await is_disconnected():
+                    self._cancel(client_id, run, "disconnect")
+                    raise asyncio.CancelledError()
+        finally:
+            run.task.cancel()
+
+
+run_registry = RunRegistry()
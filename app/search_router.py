@@ -0,0 +1,214 @@
+import asyncio
+import hashlib
+import math
+import re
+from typing import Dict, List, Optional, Tuple
+from config import settings
+from corpora import Corpus, active_corpora
+from pinecone_service import pinecone_service
+from parent_store import parent_store
+from app_logger.ai_service_logger import setup_logger
+from app_logger.tracing import traced
+
+logger = setup_logger("search_router")
+
+
+def result_key(result: Dict) -> str:
+    """Identity of a search result across sub-queries, shards and searches"""
+    if result.get("matched_chunks") is not None and result.get("parent_id"):
+        # Expanded small-to-big result: one entry per section
+        return f"{result.get('corpus')}:{result['parent_id']}"
+    if result.get("chunk_number"):
+        return f"{result.get('corpus')}:{result.get('user_document_id')}:{result['chunk_number']}"
+    return hashlib.sha1(result.get("content", "").encode("utf-8")).hexdigest()
+
+
+def fuse_ranked(ranked_lists: List[List[Dict]], top_k: int, weights: Optional[List[float]] = None) -> List[Dict]:
+    """
+    Fuse ranked result lists with (weighted) reciprocal rank fusion.
+
+    Args:
+        ranked_lists: Result lists, each in rank order
+        top_k: Number of fused results to return
+        weights: Optional weight per list (defaults to 1.0 each)
+
+    Returns:
+        De-duplicated results ordered by fused score; each carries fused_score and matched_queries
+    """
+    weights = weights or [1.0] * len(ranked_lists)
+    fused: Dict[str, Dict] = {}
+    for ranked, weight in zip(ranked_lists, weights):
+        for rank, result in enumerate(ranked):
+            key = result_key(result)
+            contribution = weight / (settings.RRF_K + rank + 1)
+            if key in fused:
+                fused[key]["fused_score"] += contribution
+                fused[key]["matched_queries"] += 1
+                fused[key]["calibrated_score"] = max(fused[key].get("calibrated_score", 0.0), result.get("calibrated_score", 0.0))
+            else:
+                fused[key] = {**result, "fused_score": contribution, "matched_queries": 1}
+    return sorted(fused.values(), key=lambda r: r["fused_score"], reverse=True)[:top_k]
+
+
+class ShardScoreCalibrator:
+    """
+    Running per-shard similarity statistics used to put scores from different
+    corpora on one scale.
+
+    Raw similarities are not comparable across shards (different Acts, chunk
+    lengths and vocabulary shift the whole distribution), so each hit is
+    z-scored against the exponentially weighted mean/std of the scores its
+    shard has returned so far and squashed to (0, 1).
+    """
+
+    def __init__(self, alpha: float = 0.05, prior_mean: float = 0.5, prior_std: float = 0.1):
+        self.alpha = alpha
+        self.prior_mean = prior_mean
+        self.prior_std = prior_std
+        self.stats: Dict[str, Tuple[float, float]] = {}
+
+    def update(self, shard: str, scores: List[float]) -> None:
+        mean, variance = self.stats.get(shard, (self.prior_mean, self.prior_std ** 2))
+        for score in scores:
+            delta = score - mean
+            mean += self.alpha * delta
+            variance = (1 - self.alpha) * (variance + self.alpha * delta * delta)
+        self.stats[shard] = (mean, variance)
+
+    def calibrate(self, shard: str, score: float) -> float:
+        mean, variance = self.stats.get(shard, (self.prior_mean, self.prior_std ** 2))
+        z = (score - mean) / max(math.sqrt(variance), 1e-6)
+        return 1 / (1 + math.exp(-z))
+
+
+class SearchRouter:
+    """
+    Routes a query to the corpus shards that can answer it.
+
+    The query is embedded once. If one corpus clearly matches the question only
+    that shard is searched; otherwise every active shard is searched concurrently
+    and the hits are merged on calibrated scores. Shards that do not answer within
+    SHARD_SEARCH_TIMEOUT are skipped, so latency is bounded by the slowest useful
+    shard rather than by the number of Acts loaded.
+    """
+
+    def __init__(self, confidence: Optional[float] = None, shard_timeout: Optional[float] = None):
+        self.confidence = confidence if confidence is not None else settings.SEARCH_ROUTER_CONFIDENCE
+        self.shard_timeout = shard_timeout if shard_timeout is not None else settings.SHARD_SEARCH_TIMEOUT
+        self.calibrator = ShardScoreCalibrator()
+
+    def route(self, query: str, domains: Optional[List[str]] = None) -> List[Tuple[Corpus, float]]:
+        """
+        Pick the shards to search and a routing weight for each.
+
+        Args:
+            query: User query
+            domains: Explicit corpus names (e.g. from an upstream router); skips keyword scoring
+
+        Returns:
+            List of (corpus, weight) with weights summing to 1
+        """
+        corpora = active_corpora()
+        if not corpora:
+            return []
+        if domains:
+            chosen = [c for c in corpora if c.name in domains]
+            if chosen:
+                return [(c, 1 / len(chosen)) for c in chosen]
+
+        text = f" {re.sub(r'[^a-z0-9]+', ' ', query.lower())} "
+        hits = {c.name: sum(1 for keyword in c.keywords if f" {keyword} " in text) for c in corpora}
+        total = sum(hits.values())
+        if not total:
+            return [(c, 1 / len(corpora)) for c in corpora]
+
+        best = max(corpora, key=lambda c: hits[c.name])
+        if hits[best.name] / total >= self.confidence:
+            return [(best, 1.0)]
+        # Unclear domain: fan out, but keep a floor so no active shard is starved
+        smoothed = {c.name: hits[c.name] + 0.5 for c in corpora}
+        norm = sum(smoothed.values())
+        return [(c, smoothed[c.name] / norm) for c in corpora]
+
+    @traced("search")
+    async def search(self, query: str, top_k: int = 12, domains: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Search the relevant corpus shards and merge the results.
+
+        Args:
+            query: Search query
+            top_k: Number of merged results to return
+            domains: Optional explicit corpus names to restrict the search to
+
+        Returns:
+            List of search results ordered by calibrated score, each tagged with its corpus
+        """
+        routes = self.route(query, domains)
+        logger.info(f"Routing search to shards: {[(c.name, round(w, 2)) for c, w in routes]}")
+        embedding = await asyncio.to_thread(pinecone_service.embeddings.embed_query, query)
+        merged = await self._search_shards(embedding, routes, top_k)
+        return self._finalize(merged[:top_k])
+
+    @traced("search.many")
+    async def search_many(self, queries: List[str], top_k: int = 12, domains: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Search several sub-queries at once and fuse their results.
+
+        All sub-queries are embedded in one batch and every (sub-query, shard)
+        search runs concurrently, so wall-clock time stays close to a single
+        search. The ranked lists are fused with reciprocal rank fusion and
+        de-duplicated, so a chunk found by several sub-queries rises to the top.
+
+        Args:
+            queries: Focused sub-queries (e.g. from query reformulation)
+            top_k: Number of fused results to return
+            domains: Optional explicit corpus names to restrict the search to
+
+        Returns:
+            List of search results ordered by fused score
+        """
+        queries = list(dict.fromkeys(q.strip() for q in queries if q and q.strip()))
+        if len(queries) <= 1:
+            return await self.search(queries[0] if queries else "", top_k, domains)
+
+        routes = self.route(" ".join(queries), domains)
+        logger.info(f"Searching {len(queries)} sub-queries on shards: {[c.name for c, _ in routes]}")
+        embeddings = await asyncio.to_thread(pinecone_service.embeddings.embed_documents, queries)
+        ranked_lists = await asyncio.gather(*(self._search_shards(embedding, routes, top_k) for embedding in embeddings))
+        return self._finalize(fuse_ranked(ranked_lists, top_k))
+
+    def _finalize(self, results: List[Dict]) -> List[Dict]:
+        if settings.RETRIEVAL_MODE == "small_to_big":
+            # Sections are expanded once after merging so the token cap applies to the final result
+            return parent_store.expand(results, settings.SMALL_TO_BIG_MAX_TOKENS)
+        return results
+
+    async def _search_shards(self, embedding: List[float], routes: List[Tuple[Corpus, float]], top_k: int) -> List[Dict]:
+        """Search the routed shards concurrently with one embedding and merge on calibrated score"""
+        tasks = [
+            asyncio.wait_for(
+                asyncio.to_thread(pinecone_service.semantic_search_by_vector, embedding, top_k, corpus.namespace),
+                self.shard_timeout,
+            )
+            for corpus, _ in routes
+        ]
+        shard_results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        merged = []
+        for (corpus, weight), results in zip(routes, shard_results):
+            if isinstance(results, BaseException):
+                logger.warning(f"Shard {corpus.name} skipped: {type(results).__name__}: {results}")
+                continue
+            shard_key = corpus.namespace or corpus.name
+            for result in results:
+                calibrated = self.calibrator.calibrate(shard_key, result["similarity_score"])
+                result["corpus"] = corpus.name
+                result["calibrated_score"] = calibrated * weight if len(routes) > 1 else calibrated
+                merged.append(result)
+            self.calibrator.update(shard_key, [r["similarity_score"] for r in results])
+
+        merged.sort(key=lambda r: r["calibrated_score"], reverse=True)
+        return merged
+
+
+search_router = SearchRouter()
@@ -0,0 +1,175 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from pydantic import BaseModel, Field
+from config import settings
+from app_logger.ai_service_logger import setup_logger
+from app_logger.metrics import metrics
+
+logger = setup_logger("semantic_cache")
+
+semantic_cache_requests_total = metrics.counter("lawgpt_semantic_cache_requests_total", "Semantic answer cache lookups by outcome (hit, miss)")
+
+
+class CachedAnswer(BaseModel):
+    question: str
+    answer: str
+    sources: List[str] = Field(default_factory=list)
+    index_version: str
+    created_at: float = Field(default_factory=time.time)
+    hits: int = 0
+
+
+class SemanticAnswerCache:
+    """
+    Answer cache keyed on question meaning rather than exact text.
+
+    Every answered question is stored with its normalised embedding, the cited
+    chunk ids and the version of the index it was answered from. A new question
+    whose embedding has cosine similarity >= threshold with a cached question
+    gets the cached answer, so "80C limit" and "max deduction under section 80C"
+    cost one embedding instead of a full pipeline run. Entries answered from an
+    older index version are never served and are dropped when seen. Memory is
+    bounded by max_bytes with least-recently-used eviction.
+    """
+
+    def __init__(self, threshold: Optional[float] = None, max_bytes: Optional[int] = None):
+        self.threshold = threshold if threshold is not None else settings.SEMANTIC_CACHE_THRESHOLD
+        self.max_bytes = max_bytes if max_bytes is not None else settings.SEMANTIC_CACHE_MAX_MB * 1024 * 1024
+        self.entries: "OrderedDict[int, Tuple[np.ndarray, CachedAnswer]]" = OrderedDict()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._next_key = 0
+        # Stacked embeddings of all entries, rebuilt lazily after inserts/evictions
+        self._matrix: Optional[np.ndarray] = None
+        self._keys: List[int] = []
+
+    @staticmethod
+    def _normalize(embedding: Iterable[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    @staticmethod
+    def _entry_bytes(vector: np.ndarray, entry: CachedAnswer) -> int:
+        text = len(entry.question) + len(entry.answer) + sum(len(s) for s in entry.sources)
+        # Python strings and the model wrapper carry overhead beyond their characters
+        return vector.nbytes + 2 * text + 512
+
+    def _remove(self, key: int) -> None:
+        vector, entry = self.entries.pop(key)
+        self.size_bytes -= self._entry_bytes(vector, entry)
+        self._matrix = None
+
+    def _index(self) -> Tuple[Optional[np.ndarray], List[int]]:
+        if self._matrix is None and self.entries:
+            self._keys = list(self.entries.keys())
+            self._matrix = np.stack([self.entries[key][0] for key in self._keys])
+        return self._matrix, self._keys
+
+    def lookup(self, embedding: Iterable[float], index_version: str) -> Optional[Tuple[CachedAnswer, float]]:
+        """
+        Find a cached answer for a semantically equivalent question.
+
+        Args:
+            embedding: Embedding of the new question
+            index_version: Current version of the vector index
+
+        Returns:
+            Tuple of (cached answer, similarity) or None on a miss
+        """
+        matrix, keys = self._index()
+        if matrix is None:
+            self.misses += 1
+            semantic_cache_requests_total.inc(outcome="miss")
+            return None
+
+        similarities = matrix @ self._normalize(embedding)
+        for position in np.argsort(-similarities):
+            similarity = float(similarities[position])
+            if similarity < self.threshold:
+                break
+            key = keys[position]
+            entry = self.entries[key][1]
+            if entry.index_version != index_version:
+                # Answered from an older index: stale, drop it and keep looking
+                self._remove(key)
+                continue
+            self.entries.move_to_end(key)
+            entry.hits += 1
+            self.hits += 1
+            semantic_cache_requests_total.inc(outcome="hit")
+            return entry, similarity
+
+        self.misses += 1
+        semantic_cache_requests_total.inc(outcome="miss")
+        return None
+
+    def store(self, question: str, embedding: Iterable[float], answer: str, sources: List[str], index_version: str) -> None:
+        """
+        Cache an answer, evicting least recently used entries beyond the memory bound.
+
+        Args:
+            question: The question as asked
+            embedding: Embedding of the question
+            answer: Final answer text
+            sources: Ids of the chunks the answer was based on
+            index_version: Version of the index the answer was produced from
+        """
+        vector = self._normalize(embedding)
+        entry = CachedAnswer(question=question, answer=answer, sources=sources, index_version=index_version)
+        entry_bytes = self._entry_bytes(vector, entry)
+        if entry_bytes > self.max_bytes:
+            return
+
+        while self.entries and self.size_bytes + entry_bytes > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+
+        self.entries[self._next_key] = (vector, entry)
+        self._next_key += 1
+        self.size_bytes += entry_bytes
+        self._matrix = None
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.size_bytes = 0
+        self._matrix = None
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "size_bytes": self.size_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "threshold": self.threshold,
+        }
+
+
+def suggest_threshold(similarities: List[float], same_meaning: List[bool], min_precision: float = 0.98) -> float:
+    """
+    Pick the lowest similarity threshold that keeps false hits rare.
+
+    Args:
+        similarities: Cosine similarity of labelled question pairs
+        same_meaning: Whether each pair should share an answer
+        min_precision: Required fraction of correct hits among served hits
+
+    Returns:
+        The threshold to use for SEMANTIC_CACHE_THRESHOLD
+    """
+    pairs = sorted(zip(similarities, same_meaning), reverse=True)
+    best = 1.0
+    correct = 0
+    for served, (similarity, same) in enumerate(pairs, start=1):
+        correct += int(same)
+        if correct / served >= min_precision:
+            best = similarity
+    return best
+
+
+semantic_cache = SemanticAnswerCache()
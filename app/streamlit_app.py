@@ -10,9 +10,22 @@ import asyncio
 import websockets
 import json
 
+STAGE_LABELS = {
+    "cache_hit": "Answered from cache (similar to: {cached_question})",
+    "routed": "Routed to {domain}",
+    "reformulated": "Reformulated question: {query}",
+    "retrieved": "Retrieved {count} passages",
+    "answering": "Writing the answer...",
+}
+
 async def websocket_connect(client_id, query, message_container):
-    """Connects to the WebSocket server and sends/receives messages."""
+    """Connects to the WebSocket server and renders stages and answer tokens as they arrive."""
     uri = f"ws://localhost:8000/ws/legal/{client_id}"  # Replace with your WebSocket URI
+    status_container = message_container.container()
+    status = status_container.empty()
+    answer_container = status_container.empty()
+    answer = ""
+
     async with websockets.connect(uri) as websocket:
         await websocket.send(json.dumps({"query": query}))
 
@@ -22,20 +35,31 @@ async def websocket_connect(client_id, query, message_container):
                 message_type = data.get("type")
 
                 if message_type == "connection_established":
-                    message_container.write(f"Connected: {data.get('message')}")
+                    status.write(f"Connected: {data.get('message')}")
                 elif message_type == "processing":
-                    message_container.write(f"Processing: {data.get('message')}")
+                    status.write(f"Processing: {data.get('message')}")
+                elif message_type == "queued":
+                    status.warning(f"Server busy: position {data.get('position')} in queue (about {data.get('estimated_wait_s')}s)")
+                elif message_type == "stage":
+                    label = STAGE_LABELS.get(data.get("stage"), data.get("stage", ""))
+                    status.info(f"{label.format(**data)} ({data.get('elapsed_ms', 0) / 1000:.1f}s)")
+                elif message_type == "token":
+                    answer += data.get("text", "")
+                    answer_container.markdown(answer + " ▌")
                 elif message_type == "result":
-                    message_container.write(f"Response: {data.get('response')}")
+                    status.success("Done")
+                    answer_container.markdown(data.get("response") or answer)
+                    break
                 elif message_type == "error":
-                    message_container.error(f"Error: {data.get('message')}")
+                    status.error(f"Error: {data.get('message')}")
+                    break
                 else:
-                    message_container.write(f"Unknown message: {message}")
+                    status.write(f"Unknown message: {message}")
 
             except json.JSONDecodeError:
-                message_container.write(f"Received non-JSON message: {message}")
+                status.write(f"Received non-JSON message: {message}")
             except Exception as e:
-                message_container.error(f"Error handling message: {e}")
+                status.error(f"Error handling message: {e}")
 
 def main():
     st.title("Legal Chat UI")
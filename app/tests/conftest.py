@@ -0,0 +1,13 @@
+import os
+import tempfile
+
+# Settings are read at import time: keep the tests on local, throwaway state
+_scratch = tempfile.mkdtemp(prefix="lawgpt-tests-")
+os.environ.setdefault("GEMENI_API_KEY", "test-key")
+os.environ.setdefault("VECTOR_BACKEND", "local")
+os.environ.setdefault("LOCAL_VECTOR_STORE_PATH", os.path.join(_scratch, "vectors"))
+os.environ.setdefault("INDEX_VERSION_PATH", os.path.join(_scratch, "index_version"))
+os.environ.setdefault("PARENT_STORE_PATH", os.path.join(_scratch, "parents.json"))
+os.environ.setdefault("DOMAIN_ROUTER_PATH", os.path.join(_scratch, "domain_router.npz"))
+os.environ.setdefault("CACHE_DIR", os.path.join(_scratch, "cache"))
+os.environ.setdefault("TRACE_EXPORTER", "none")
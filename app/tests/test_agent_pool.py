@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+
+from paralegals.agent_pool import AgentGraphPool
+
+
+class StubGraph:
+    def reset(self) -> None:
+        pass
+
+
+async def lease(pool: AgentGraphPool, error: BaseException = None) -> StubGraph:
+    async with pool.acquire() as graph:
+        if error is not None:
+            raise error
+        return graph
+
+
+async def test_graph_is_reused_after_a_finished_or_failed_turn():
+    pool = AgentGraphPool(StubGraph, max_size=1, warm_size=1)
+    graph = await lease(pool)
+
+    with pytest.raises(ValueError):
+        await lease(pool, ValueError("bad agent output"))
+
+    assert await lease(pool) is graph
+    assert pool.size == 1
+
+
+@pytest.mark.parametrize("error", [asyncio.TimeoutError(), asyncio.CancelledError()])
+async def test_graph_of_an_abandoned_turn_is_replaced(error):
+    pool = AgentGraphPool(StubGraph, max_size=1, warm_size=1)
+    graph = await lease(pool)
+
+    with pytest.raises(type(error)):
+        await lease(pool, error)
+
+    replacement = await asyncio.wait_for(lease(pool), 1.0)
+    assert replacement is not graph
+    assert pool.size == 1
@@ -0,0 +1,35 @@
+from langchain_core.documents import Document
+
+import search_router as search_router_module
+from ai_service.model_policy import model_policy
+from corpora import Corpus
+from paralegals.pipeline import answer_start_tier
+from pinecone_service import PineconeService
+from search_router import SearchRouter
+
+TAX = Corpus(name="tax", namespace=None, agent="tax_paralegal_agent", description="Income-tax Act")
+
+
+async def retrieve(scores, monkeypatch):
+    """Results of a search whose vector store (Pinecone-style) returned these similarities"""
+    service = object.__new__(PineconeService)
+    results = [
+        service._format_search_result(Document(page_content=f"chunk {n}", metadata={"document_id": "act", "chunk_number": n}), score)
+        for n, score in enumerate(scores)
+    ]
+    monkeypatch.setattr(search_router_module.pinecone_service, "semantic_search_by_vector", lambda embedding, top_k, namespace: results)
+    return await SearchRouter()._search_shards([1.0, 0.0], [(TAX, 1.0)], top_k=len(scores))
+
+
+async def test_strong_retrieval_starts_on_the_answer_tier(monkeypatch):
+    results = await retrieve([0.92, 0.85, 0.8], monkeypatch)
+    assert answer_start_tier(results) == model_policy.tier_of("answer")
+
+
+async def test_weak_retrieval_escalates_one_tier(monkeypatch):
+    results = await retrieve([0.41, 0.35, 0.3], monkeypatch)
+    assert answer_start_tier(results) == model_policy.tier_of("answer") + 1
+
+
+def test_no_results_escalate():
+    assert answer_start_tier([]) == model_policy.tier_of("answer") + 1
@@ -0,0 +1,26 @@
+import pytest
+
+from paralegals.tax_paralegal_tools import CONFIDENCE_LINE, confidence_tail_start
+
+
+@pytest.mark.parametrize("text, visible", [
+    ("The confidence of the assessee is irrelevant.", "The confidence of the assessee is irrelevant."),
+    ("Answer.\nConfidence in the CONFIDENCE of it", "Answer.\nConfidence in the CONFIDENCE of it"),
+    ("Answer.\nConfidential", "Answer.\nConfidential"),
+    ("Answer.\nCONF", "Answer."),
+    ("Answer.\n  Confid", "Answer."),
+    ("Answer.\nCONFIDENCE: hi", "Answer."),
+    ("Answer.\n\nCONFIDENCE: high\n", "Answer."),
+    ("Answer.\n", "Answer."),
+    ("", ""),
+])
+def test_only_a_trailing_confidence_line_is_held_back(text, visible):
+    assert text[:confidence_tail_start(text)] == visible
+
+
+def test_streamed_prefixes_never_show_the_confidence_line():
+    answer = "Section 80C allows a deduction; confidence in it is high.\nCONFIDENCE: high"
+    sent = 0
+    for end in range(len(answer) + 1):
+        sent = max(sent, confidence_tail_start(answer[:end]))
+    assert answer[:sent] == CONFIDENCE_LINE.sub("", answer)
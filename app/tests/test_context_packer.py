@@ -0,0 +1,33 @@
+from context_packer import ContextPacker
+
+SHARED = "The deduction under section 80GG is limited to five thousand rupees a month."
+
+
+def result(number: int, content: str, score: float) -> dict:
+    return {"corpus": "tax", "chunk_number": number, "page_id": f"p{number}", "content": content, "similarity_score": score}
+
+
+def test_sentences_of_a_skipped_block_stay_available():
+    long_block = " ".join([SHARED] + [f"Clause {i} sets out condition number {i} for the claim." for i in range(60)])
+    results = [
+        result(1, "House rent allowance is exempt under section 10(13A).", 0.9),
+        result(2, long_block, 0.8),
+        result(3, f"{SHARED} The assessee must file Form 10BA. Rent paid must exceed ten percent of income.", 0.7),
+    ]
+
+    packed = ContextPacker(max_tokens=120, sentences_per_chunk=100).pack("80GG deduction limit", results)
+
+    assert [c.page_id for c in packed.citations] == ["p1", "p3"]
+    assert SHARED in packed.text
+
+
+def test_sentences_are_not_repeated_across_packed_blocks():
+    results = [
+        result(1, f"{SHARED} Rent paid must exceed ten percent of income.", 0.9),
+        result(2, f"{SHARED} The assessee must file Form 10BA with the return. No house may be owned at the place of work.", 0.8),
+    ]
+
+    packed = ContextPacker(max_tokens=1000, sentences_per_chunk=100).pack("80GG deduction limit", results)
+
+    assert packed.text.count(SHARED) == 1
+    assert "Form 10BA" in packed.text
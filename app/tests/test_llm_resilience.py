@@ -0,0 +1,146 @@
+import asyncio
+import concurrent.futures
+import socket
+import threading
+import time
+
+import pytest
+import uvicorn
+
+import fake_gemini
+from ai_service.llm_client import GeminiClient, thread_call_scope
+from ai_service.resilience import CircuitBreaker, CircuitOpenError, DeadlineExceeded, deadline_scope, hedges_total, retries_total
+from config import settings
+
+
+@pytest.fixture(scope="module")
+def fake_server():
+    """fake_gemini served from a background thread; tests change its faults in place"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(fake_gemini.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    yield f"http://127.0.0.1:{port}"
+    server.should_exit = True
+    thread.join(timeout=5)
+
+
+@pytest.fixture
+def faults(monkeypatch):
+    faults = fake_gemini.Faults(latency_ms=20, jitter_ms=0, tail_prob=0, error_rate=0)
+    monkeypatch.setattr(fake_gemini, "faults", faults)
+    return faults
+
+
+@pytest.fixture
+def client(fake_server, faults, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGE_ENABLED", False)
+    monkeypatch.setattr(settings, "LLM_MAX_RETRIES", 0)
+    return GeminiClient(api_key="fake", base_url=fake_server, max_concurrency=4)
+
+
+async def test_hedge_fires_after_delay_and_cancels_loser(client, faults, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGE_ENABLED", True)
+    monkeypatch.setattr(settings, "LLM_HEDGE_INITIAL_DELAY_SECONDS", 0.3)
+    monkeypatch.setattr(settings, "LLM_HEDGE_MIN_DELAY_SECONDS", 0.3)
+    hedge_wins = hedges_total.get(winner="hedge")
+    faults.latency_ms = 5000
+
+    started = time.monotonic()
+    call = asyncio.create_task(client.generate("What is section 80C?"))
+    # The primary is already stuck server side; the hedge sent after the delay is fast
+    await asyncio.sleep(0.1)
+    faults.latency_ms = 20
+    response = await call
+    elapsed = time.monotonic() - started
+
+    assert response.text.startswith("Fake answer")
+    assert 0.3 <= elapsed < 2.0
+    assert hedges_total.get(winner="hedge") == hedge_wins + 1
+    await asyncio.sleep(0.05)
+    assert client.in_flight == 0
+
+
+async def test_server_errors_are_retried(client, faults, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_MAX_RETRIES", 2)
+    retries = retries_total.get(operation="generate")
+    faults.error_rate = 1.0
+    faults.error_code = 503
+
+    call = asyncio.create_task(client.generate("What is section 80C?"))
+    # Recover during the first backoff
+    await asyncio.sleep(0.2)
+    faults.error_rate = 0.0
+    response = await call
+
+    assert response.text.startswith("Fake answer")
+    assert retries_total.get(operation="generate") == retries + 1
+
+
+async def test_breaker_opens_probes_and_closes(client, faults):
+    client.breaker = CircuitBreaker(failure_ratio=0.5, min_calls=2, window=60, cooldown=0.3)
+    faults.error_rate = 1.0
+
+    for _ in range(2):
+        with pytest.raises(Exception) as failure:
+            await client.generate("What is section 80C?")
+        assert not isinstance(failure.value, CircuitOpenError)
+    assert client.breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        await client.generate("What is section 80C?")
+
+    # A failed probe opens it again
+    await asyncio.sleep(0.3)
+    assert client.breaker.state == "half_open"
+    with pytest.raises(Exception) as failure:
+        await client.generate("What is section 80C?")
+    assert not isinstance(failure.value, CircuitOpenError)
+    assert client.breaker.state == "open"
+
+    # A successful probe closes it
+    await asyncio.sleep(0.3)
+    faults.error_rate = 0.0
+    response = await client.generate("What is section 80C?")
+    assert response.text.startswith("Fake answer")
+    assert client.breaker.state == "closed"
+
+
+async def test_deadline_expiry_ends_the_call(client, faults):
+    faults.latency_ms = 5000
+
+    started = time.monotonic()
+    with deadline_scope(0.3):
+        with pytest.raises(DeadlineExceeded):
+            await client.generate("What is section 80C?")
+
+    assert time.monotonic() - started < 1.0
+    await asyncio.sleep(0.05)
+    assert client.in_flight == 0
+
+
+async def test_leaving_thread_call_scope_cancels_blocked_calls(client, faults):
+    faults.latency_ms = 5000
+    client.attach()
+
+    def agent_turn():
+        try:
+            client.generate_from_thread("What is section 80C?")
+            return "finished"
+        except concurrent.futures.CancelledError:
+            return "cancelled"
+
+    started = time.monotonic()
+    with thread_call_scope():
+        # to_thread, like autogen's executor, carries the scope into the worker thread
+        turn = asyncio.ensure_future(asyncio.to_thread(agent_turn))
+        await asyncio.sleep(0.2)
+        assert client.in_flight == 1
+
+    assert await asyncio.wait_for(turn, 1.0) == "cancelled"
+    assert time.monotonic() - started < 1.5
+    await asyncio.sleep(0.05)
+    assert client.in_flight == 0
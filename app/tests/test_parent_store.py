@@ -0,0 +1,51 @@
+from parent_store import ParentSectionStore
+from token_counter import count_tokens
+
+
+def words(prefix: str, count: int) -> str:
+    return " ".join(f"{prefix}{i}" for i in range(count))
+
+
+def store_with(tmp_path, sections):
+    store = ParentSectionStore(path=str(tmp_path / "parents.json"))
+    store.add_sections(sections, document_id="income_tax_act_1961")
+    return store
+
+
+def child(parent_id: str, content: str) -> dict:
+    return {"page_id": f"{parent_id}-chunk", "parent_id": parent_id, "content": content, "similarity_score": 0.9}
+
+
+def test_long_parent_is_cut_around_the_matched_child(tmp_path):
+    matched = words("hra", 40)
+    text = f"{words('head', 5000)} {matched} {words('tail', 5000)}"
+    store = store_with(tmp_path, [{"parent_id": "s10", "section_id": "10", "title": "Incomes not included", "text": text}])
+
+    [result] = store.expand([child("s10", matched)], max_tokens=300)
+
+    assert matched in result["content"]
+    assert "head0 " not in result["content"]
+    assert count_tokens(result["content"]) <= 300
+
+
+def test_other_parents_still_get_budget_after_a_long_one(tmp_path):
+    matched = words("hra", 20)
+    store = store_with(tmp_path, [
+        {"parent_id": "s10", "section_id": "10", "title": "Incomes not included", "text": f"{words('head', 5000)} {matched} {words('tail', 5000)}"},
+        {"parent_id": "s80GG", "section_id": "80GG", "title": "Rents paid", "text": words("rent", 30)},
+    ])
+
+    results = store.expand([child("s10", matched), child("s80GG", "rent0 rent1")], max_tokens=300)
+
+    assert [r["parent_id"] for r in results] == ["s10", "s80GG"]
+    assert matched in results[0]["content"]
+    assert sum(count_tokens(r["content"]) for r in results) <= 300
+
+
+def test_child_text_is_used_when_its_window_does_not_fit(tmp_path):
+    # The child was chunked from an older version of the section and cannot be found in it
+    store = store_with(tmp_path, [{"parent_id": "s2", "section_id": "2", "title": "Definitions", "text": words("def", 20000)}])
+
+    [result] = store.expand([child("s2", "assessee means a person")], max_tokens=200)
+
+    assert result["content"] == "assessee means a person"
@@ -0,0 +1,57 @@
+import asyncio
+
+from request_scheduler import RequestScheduler
+
+
+def scheduler(**overrides) -> RequestScheduler:
+    options = dict(max_concurrency=1, per_client_limit=1, max_queue_depth=100, default_deadline=60, client_weights={})
+    return RequestScheduler(**{**options, **overrides})
+
+
+async def test_finish_tags_of_idle_clients_are_dropped():
+    sched = scheduler()
+    for index in range(50):
+        async with sched.slot(f"client-{index}"):
+            pass
+
+    assert sched.finish_tags == {}
+
+
+async def test_finish_tags_of_busy_clients_are_kept():
+    sched = scheduler()
+    release = asyncio.Event()
+
+    async def hold(client_id: str):
+        async with sched.slot(client_id):
+            await release.wait()
+
+    running = asyncio.ensure_future(hold("a"))
+    await asyncio.sleep(0)
+    queued = asyncio.ensure_future(hold("b"))
+    await asyncio.sleep(0)
+    assert set(sched.finish_tags) == {"a", "b"}
+
+    release.set()
+    await asyncio.gather(running, queued)
+    assert sched.finish_tags == {}
+
+
+async def test_bursting_client_still_yields_to_a_newcomer():
+    sched = scheduler()
+    order = []
+    gate = asyncio.Event()
+
+    async def run(client_id: str):
+        async with sched.slot(client_id):
+            order.append(client_id)
+            await gate.wait()
+
+    burst = [asyncio.ensure_future(run("burst")) for _ in range(3)]
+    await asyncio.sleep(0)
+    newcomer = asyncio.ensure_future(run("newcomer"))
+    await asyncio.sleep(0)
+    gate.set()
+    await asyncio.gather(*burst, newcomer)
+
+    assert order.index("newcomer") <= 1
+    assert sched.finish_tags == {}
@@ -0,0 +1,72 @@
+from typing import List
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+import search_router as search_router_module
+from corpora import Corpus
+from local_vector_store import LocalVectorStore
+from pinecone_service import PineconeService
+from search_router import SearchRouter
+
+TAX = Corpus(name="tax", namespace=None, agent="tax_paralegal_agent", description="Income-tax Act")
+
+
+class FixedEmbeddings:
+    """Embeds each known text to a fixed vector"""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.vectors[text] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.vectors[text]
+
+
+def format_results(scored):
+    service = object.__new__(PineconeService)
+    return [service._format_search_result(doc, score) for doc, score in scored]
+
+
+def doc(number: int) -> Document:
+    return Document(page_content=f"chunk {number}", metadata={"document_id": "income_tax_act_1961", "chunk_number": number})
+
+
+def pinecone_results():
+    # Pinecone on a cosine index: similarity, best first
+    return format_results([(doc(1), 0.91), (doc(2), 0.74), (doc(3), 0.42)])
+
+
+def local_results(tmp_path):
+    vectors = {
+        "chunk 1": [1.0, 0.1, 0.0],
+        "chunk 2": [0.6, 0.8, 0.0],
+        "chunk 3": [0.0, 0.2, 1.0],
+        "query": [1.0, 0.0, 0.0],
+    }
+    store = LocalVectorStore(FixedEmbeddings(vectors), path=str(tmp_path), compression="")
+    store.add_documents([doc(3), doc(1), doc(2)])
+    return format_results(store.similarity_search_by_vector_with_score(vectors["query"], k=3))
+
+
+def test_local_store_returns_cosine_similarity(tmp_path):
+    results = local_results(tmp_path)
+    scores = [r["similarity_score"] for r in results]
+    assert [r["chunk_number"] for r in results] == [1, 2, 3]
+    assert scores == sorted(scores, reverse=True)
+    assert scores[0] == pytest.approx(1 / np.linalg.norm([1.0, 0.1, 0.0]), abs=1e-5)
+
+
+@pytest.mark.parametrize("backend", ["pinecone", "local"])
+async def test_merged_results_rank_best_first(backend, tmp_path, monkeypatch):
+    results = pinecone_results() if backend == "pinecone" else local_results(tmp_path)
+    monkeypatch.setattr(search_router_module.pinecone_service, "semantic_search_by_vector", lambda embedding, top_k, namespace: [dict(r) for r in results])
+
+    merged = await SearchRouter()._search_shards([1.0, 0.0, 0.0], [(TAX, 1.0)], top_k=3)
+
+    assert [r["chunk_number"] for r in merged] == [1, 2, 3]
+    calibrated = [r["calibrated_score"] for r in merged]
+    assert calibrated == sorted(calibrated, reverse=True)
@@ -0,0 +1,17 @@
+import numpy as np
+
+from vector_quantization import ScalarQuantizer
+
+
+def test_blocked_int8_scores_match_decoded_vectors():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(1000, 64)).astype(np.float32)
+    query = rng.normal(size=64).astype(np.float32)
+    quantizer = ScalarQuantizer(block_rows=128)
+    quantizer.train(vectors)
+    codes = quantizer.encode(vectors)
+
+    scores = quantizer.inner_product(codes, query)
+
+    assert scores.shape == (1000,)
+    np.testing.assert_allclose(scores, quantizer.decode(codes) @ query, rtol=1e-4, atol=1e-3)
@@ -0,0 +1,27 @@
+import math
+from typing import Iterable
+
+# Legal English averages roughly 1.3 sub-word tokens per whitespace word for
+# the Gemini / OpenAI tokenizers, which is close enough for budgeting prompts.
+TOKENS_PER_WORD = 1.3
+
+
+def count_tokens(text: str) -> int:
+    """Approximate the number of LLM tokens in a piece of text."""
+    if not text:
+        return 0
+    return math.ceil(len(text.split()) * TOKENS_PER_WORD)
+
+
+def count_tokens_many(texts: Iterable[str]) -> int:
+    """Approximate the total number of LLM tokens across several texts."""
+    return sum(count_tokens(text) for text in texts)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text down to roughly max_tokens tokens on a word boundary."""
+    words = text.split()
+    max_words = int(max_tokens / TOKENS_PER_WORD)
+    if len(words) <= max_words:
+        return text
+    return " ".join(words[:max(max_words, 0)])
@@ -0,0 +1,148 @@
+from typing import Dict, Optional
+import numpy as np
+
+
+class ScalarQuantizer:
+    """
+    Per-dimension scalar quantization of float32 vectors to int8 (4x smaller).
+
+    Each dimension is mapped linearly from [min, max] onto [-128, 127]. Inner
+    products with a float32 query are computed directly on the codes:
+        q . x ~= q . min + (codes + 128) . (q * scale)
+    Codes are widened to float32 block_rows at a time, so a query never
+    materialises a float copy of the whole index.
+    """
+
+    name = "int8"
+
+    def __init__(self, block_rows: int = 4096):
+        self.minimum: Optional[np.ndarray] = None
+        self.scale: Optional[np.ndarray] = None
+        self.block_rows = block_rows
+
+    def train(self, vectors: np.ndarray) -> None:
+        self.minimum = vectors.min(axis=0).astype(np.float32)
+        spread = vectors.max(axis=0) - self.minimum
+        self.scale = np.where(spread > 0, spread / 255.0, 1.0).astype(np.float32)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.rint((vectors - self.minimum) / self.scale) - 128
+        return np.clip(codes, -128, 127).astype(np.int8)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return self.minimum + (codes.astype(np.float32) + 128) * self.scale
+
+    def inner_product(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Approximate inner products of the query with every encoded vector"""
+        weights = (query * self.scale).astype(np.float32)
+        # The +128 shift folds into a constant: (codes + 128) . w = codes . w + 128 * sum(w)
+        offset = np.float32(query @ self.minimum + 128 * weights.sum())
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), self.block_rows):
+            block = codes[start:start + self.block_rows]
+            scores[start:start + len(block)] = block.astype(np.float32) @ weights + offset
+        return scores
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {"minimum": self.minimum, "scale": self.scale}
+
+    def load_state(self, state: Dict[str, np.ndarray]) -> None:
+        self.minimum = state["minimum"]
+        self.scale = state["scale"]
+
+    def nbytes(self) -> int:
+        return int(self.minimum.nbytes + self.scale.nbytes)
+
+
+class ProductQuantizer:
+    """
+    Product quantization: split each vector into num_subvectors slices and store
+    the id of the nearest of 256 k-means centroids per slice (one byte each).
+
+    Inner products are estimated with asymmetric distance computation: the query
+    is compared once against every centroid, then each vector's score is the sum
+    of the looked-up slice scores.
+    """
+
+    name = "pq"
+
+    def __init__(self, num_subvectors: int = 64, num_centroids: int = 256, iterations: int = 15, max_training_points: int = 20000, seed: int = 0):
+        if num_centroids > 256:
+            raise ValueError("ProductQuantizer stores codes as uint8, num_centroids must be <= 256")
+        self.num_subvectors = num_subvectors
+        self.num_centroids = num_centroids
+        self.iterations = iterations
+        self.max_training_points = max_training_points
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None  # (num_subvectors, num_centroids, sub_dim)
+
+    def _split(self, vectors: np.ndarray) -> np.ndarray:
+        """Reshape (n, dim) vectors into (n, num_subvectors, sub_dim)"""
+        n, dim = vectors.shape
+        if dim % self.num_subvectors:
+            raise ValueError(f"Embedding dimension {dim} is not divisible by {self.num_subvectors} sub-vectors")
+        return vectors.reshape(n, self.num_subvectors, dim // self.num_subvectors)
+
+    def train(self, vectors: np.ndarray) -> None:
+        rng = np.random.default_rng(self.seed)
+        if len(vectors) > self.max_training_points:
+            vectors = vectors[rng.choice(len(vectors), self.max_training_points, replace=False)]
+        slices = self._split(vectors)
+        num_centroids = min(self.num_centroids, len(vectors))
+        centroids = []
+        for m in range(self.num_subvectors):
+            data = slices[:, m, :]
+            codebook = data[rng.choice(len(data), num_centroids, replace=False)].copy()
+            for _ in range(self.iterations):
+                assignment = self._nearest(data, codebook)
+                sums = np.zeros_like(codebook)
+                np.add.at(sums, assignment, data)
+                counts = np.bincount(assignment, minlength=num_centroids)
+                # Empty clusters keep their previous centroid
+                filled = counts > 0
+                codebook[filled] = sums[filled] / counts[filled][:, None]
+            centroids.append(codebook)
+        self.centroids = np.stack(centroids).astype(np.float32)
+
+    @staticmethod
+    def _nearest(data: np.ndarray, codebook: np.ndarray) -> np.ndarray:
+        distances = (data ** 2).sum(axis=1)[:, None] - 2 * data @ codebook.T + (codebook ** 2).sum(axis=1)[None, :]
+        return distances.argmin(axis=1)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        slices = self._split(vectors)
+        codes = np.empty((len(vectors), self.num_subvectors), dtype=np.uint8)
+        for m in range(self.num_subvectors):
+            codes[:, m] = self._nearest(slices[:, m, :], self.centroids[m])
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        parts = [self.centroids[m][codes[:, m]] for m in range(self.num_subvectors)]
+        return np.concatenate(parts, axis=1)
+
+    def inner_product(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Approximate inner products of the query with every encoded vector"""
+        query_slices = query.reshape(self.num_subvectors, -1)
+        table = np.einsum("md,mcd->mc", query_slices, self.centroids)  # (num_subvectors, num_centroids)
+        return table[np.arange(self.num_subvectors)[None, :], codes].sum(axis=1)
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {"centroids": self.centroids}
+
+    def load_state(self, state: Dict[str, np.ndarray]) -> None:
+        self.centroids = state["centroids"]
+        self.num_subvectors, self.num_centroids = self.centroids.shape[:2]
+
+    def nbytes(self) -> int:
+        return int(self.centroids.nbytes)
+
+
+def create_quantizer(compression: str, num_subvectors: int = 64):
+    """Return the quantizer for a VECTOR_COMPRESSION setting, or None for full float32 vectors"""
+    if compression in (None, "", "none"):
+        return None
+    if compression == "int8":
+        return ScalarQuantizer()
+    if compression == "pq":
+        return ProductQuantizer(num_subvectors=num_subvectors)
+    raise ValueError(f"Unknown vector compression: {compression}")